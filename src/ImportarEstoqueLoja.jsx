@@ -3,6 +3,9 @@ import axios from 'axios';
 import './ImportarProdutos.css';
 import planilhaIcon from './planilha-icon.svg';
 
+const API_URL = 'http://127.0.0.1:8002';
+const INTERVALO_CONSULTA_MS = 1500;
+
 function ImportarEstoqueLoja() {
   const [arquivo, setArquivo] = useState(null);
   const [mensagem, setMensagem] = useState('');
@@ -39,13 +42,28 @@ function ImportarEstoqueLoja() {
 
     try {
       setCarregando(true);
-      const response = await axios.post('http://127.0.0.1:8002/importar-estoque-loja', formData, {
+      const response = await axios.post(`${API_URL}/importar-estoque-loja?assincrono=1`, formData, {
         headers: { 'Content-Type': 'multipart/form-data' },
       });
 
-      const resultado = response.data;
+      // ⏳ A importação roda em segundo plano; acompanha o job até terminar
+      let resultado = response.data;
+      while (resultado.status === 'na_fila' || resultado.status === 'processando') {
+        await new Promise((resolve) => setTimeout(resolve, INTERVALO_CONSULTA_MS));
+        const status = await axios.get(`${API_URL}/importacoes/${resultado.job_id}`);
+        resultado = status.data;
+        if (resultado.status === 'processando') {
+          const total = resultado.total_linhas ? ` de ${resultado.total_linhas}` : '';
+          const eta = resultado.eta_segundos != null ? ` (faltam ~${Math.ceil(resultado.eta_segundos)}s)` : '';
+          setMensagem(`⏳ ${resultado.linhas_processadas}${total} linhas processadas${eta}`);
+        }
+      }
 
-      if (resultado.registros_importados > 0) {
+      if (resultado.status === 'erro') {
+        setMensagem('❌ A importação falhou. Veja os erros abaixo.');
+      } else if (resultado.status === 'cancelado') {
+        setMensagem(`🛑 Importação cancelada após ${resultado.registros_importados || 0} registros.`);
+      } else if (resultado.registros_importados > 0) {
         setMensagem(`✅ ${resultado.registros_importados} registros importados com sucesso!`);
         localStorage.setItem("estoqueLojaImportado", resultado.registros_importados);
       } else {
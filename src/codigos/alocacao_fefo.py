@@ -0,0 +1,137 @@
+from datetime import date, datetime
+
+from src.codigos import repositorio
+from src.codigos.repositorio import eq, gt
+from src.codigos.cache_catalogo import catalogo
+from src.codigos.baixa_atomica import ajustar_saldo_async, SaldoInsuficiente
+from src.codigos.eventos_estoque import criar_evento, publicar_eventos
+
+# 🔁 Se outro pedido consumir um lote entre o plano e a baixa, o plano é refeito
+MAX_REPLANEJAMENTOS = 3
+
+
+class EstoqueInsuficiente(Exception):
+    def __init__(self, disponivel, solicitado):
+        super().__init__(f"Estoque insuficiente. Disponível: {disponivel}, solicitado: {solicitado}")
+        self.disponivel = disponivel
+        self.solicitado = solicitado
+
+
+class ProdutoNaoEncontrado(Exception):
+    pass
+
+
+def _vencido(lote, hoje):
+    return bool(lote.get("validade")) and str(lote["validade"])[:10] < hoje
+
+
+# 🧮 Divide a quantidade pelos lotes em ordem de validade (primeiro que vence, primeiro que sai)
+def planejar(lotes, quantidade, permitir_vencidos=False, hoje=None):
+    hoje = (hoje or date.today()).isoformat()
+    plano = []
+    restante = quantidade
+    disponivel = 0
+    for lote in sorted(lotes, key=lambda l: (str(l.get("validade") or "9999-12-31"), l["id"])):
+        saldo = int(lote.get("quantidade") or 0)
+        if saldo <= 0 or (not permitir_vencidos and _vencido(lote, hoje)):
+            continue
+        disponivel += saldo
+        if restante > 0:
+            retirar = min(saldo, restante)
+            plano.append({"id_estoque": lote["id"], "validade": lote.get("validade"),
+                          "quantidade": retirar, "saldo_lido": saldo, "marca": lote.get("marca")})
+            restante -= retirar
+    if restante > 0:
+        raise EstoqueInsuficiente(disponivel, quantidade)
+    return plano
+
+
+async def _lotes_disponiveis(id_produto):
+    return await repositorio.selecionar(
+        "estoque",
+        filtros={"id_produto": eq(id_produto), "quantidade": gt(0)},
+        ordem="validade.asc,id.asc",
+    )
+
+
+# ⚛️ Baixa um item do plano; devolve None se deu certo ou a exceção (nunca levanta), para que
+# as baixas que já deram certo possam ser desfeitas antes de o erro seguir adiante
+async def _baixar(item):
+    try:
+        item["saldo_restante"] = await ajustar_saldo_async(item["id_estoque"], -item["quantidade"], item["saldo_lido"],
+                                                           coluna="quantidade")
+        return None
+    except Exception as erro:
+        return erro
+
+
+async def _desfazer(itens):
+    await repositorio.em_paralelo(*(
+        ajustar_saldo_async(i["id_estoque"], i["quantidade"], i["saldo_restante"], coluna="quantidade") for i in itens
+    ))
+
+
+# 🧮 Quanto o plano conseguiu alocar: o que foi baixado + o saldo real dos lotes que esvaziaram
+def _alocavel(plano, erros):
+    return sum(item["quantidade"] if erro is None else min(item["quantidade"], erro.disponivel)
+               for item, erro in zip(plano, erros) if erro is None or isinstance(erro, SaldoInsuficiente))
+
+
+def _publico(plano):
+    campos = ("id_estoque", "validade", "quantidade", "saldo_restante")
+    return [{c: item[c] for c in campos if c in item} for item in plano]
+
+
+# 📤 Saída FEFO: planeja, baixa todos os lotes do plano e grava o histórico de uma vez
+async def registrar_saida_fefo(ean, quantidade, usuario_id="sistema", lote=None,
+                               permitir_vencidos=False, simular=False):
+    if quantidade <= 0:
+        raise ValueError("Quantidade deve ser maior que zero")
+    produto = await repositorio.em_thread(catalogo.obter, ean)
+    if not produto:
+        raise ProdutoNaoEncontrado("Produto não encontrado.")
+    id_produto = produto["id_produto"]
+
+    for _ in range(MAX_REPLANEJAMENTOS):
+        plano = planejar(await _lotes_disponiveis(id_produto), quantidade, permitir_vencidos)
+        if simular:
+            return {"ean": ean, "quantidade": quantidade, "simulacao": True, "alocacao": _publico(plano)}
+
+        # ⚛️ Cada lote com compare-and-set, todos ao mesmo tempo
+        erros = await repositorio.em_paralelo(*(_baixar(item) for item in plano))
+        if not any(erros):
+            break
+        # ↩️ Alguma baixa falhou: devolve o que já foi baixado; lote esvaziado no meio do caminho
+        # replaneja, qualquer outro erro (conflito, banco) sobe para quem chamou
+        await _desfazer([item for item, erro in zip(plano, erros) if erro is None])
+        outro = next((erro for erro in erros if erro is not None and not isinstance(erro, SaldoInsuficiente)), None)
+        if outro:
+            raise outro
+    else:
+        raise EstoqueInsuficiente(_alocavel(plano, erros), quantidade)
+
+    agora = datetime.now().isoformat()
+    registros = [{
+        "id_produto": id_produto,
+        "id_estoque": item["id_estoque"],
+        "ean": ean,
+        "quantidade": item["quantidade"],
+        "validade": item["validade"],
+        "lote": lote,
+        "data_saida": agora,
+        "usuario_id": usuario_id,
+    } for item in plano]
+    try:
+        await repositorio.inserir("saida", registros)
+    except Exception:
+        # Sem histórico, as baixas são desfeitas para o saldo continuar consistente
+        await _desfazer(plano)
+        raise
+
+    # 📣 Os ouvintes (razão, índices) gravam de forma síncrona: fora do event loop
+    await repositorio.em_thread(publicar_eventos, [
+        criar_evento("saida", ean, item["validade"], item["quantidade"], item["marca"] or produto.get("marca"),
+                     momento=agora, saldo=item["saldo_restante"], usuario_id=usuario_id)
+        for item in plano
+    ])
+    return {"ean": ean, "quantidade": quantidade, "simulacao": False, "alocacao": _publico(plano)}
@@ -1,8 +1,14 @@
 from fastapi import FastAPI, Request, UploadFile, File, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
 import pandas as pd
 import io
+import os
+import shutil
+import tempfile
+import threading
 
 from src.codigos.estoque import (
     entrada_produto,
@@ -10,6 +16,31 @@ from src.codigos.estoque import (
     consultar_estoque_por_ean,
     listar_estoque_completo
 )
+from src.codigos.importacao_lote import importar_entradas_em_blocos
+from src.codigos.leitura_planilha import ler_em_blocos, contar_linhas
+from src.codigos.validacao_planilha import simular_importacao
+from src.codigos import jobs_importacao
+from src.codigos.cache_catalogo import catalogo
+from src.codigos import repositorio
+from src.codigos.repositorio import eq, ilike
+from src.codigos.eventos_estoque import publicar_movimento
+from src.codigos.rollups_movimentacao import rollups
+from src.codigos.indice_validade import indice_validade
+from src.codigos.paginacao import buscar_pagina, gerar_ndjson, TAMANHO_PAGINA, LIMITE_MAXIMO
+from src.codigos.instrumentacao import middleware_metricas, exportar_metricas
+from src.codigos.baixa_atomica import ajustar_saldo_async, SaldoInsuficiente, ConflitoConcorrencia
+from src.codigos.alocacao_fefo import registrar_saida_fefo, EstoqueInsuficiente, ProdutoNaoEncontrado
+from src.codigos.saida_lote import registrar_saidas_em_lote
+from src.codigos.exportacao import exportar
+from src.codigos.saldo_consolidado import saldo_consolidado
+from src.codigos.transferencia_loja import transferir_para_loja, LoteNaoEncontrado
+from src.codigos.reconciliacao_inventario import reconciliar_inventario, aplicar_ajustes
+from src.codigos import razao_estoque
+from src.codigos.auth import encerrar_produtividade
+from src.codigos import saldo_historico
+from src.codigos.motor_estoque import motor_estoque
+from src.codigos.busca_produtos import indice_busca
+from src.codigos.buffer_gravacao import exportar_metricas as exportar_metricas_buffers
 from src.codigos.config_supabase import supabase
 
 app = FastAPI()
@@ -20,100 +51,162 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+# ⏱️ Server-Timing, histogramas de latência e log estruturado das requisições lentas
+app.middleware("http")(middleware_metricas)
+
+@app.on_event("startup")
+def aquecer_catalogo():
+    # 🔥 Aquece o cache do catálogo sem atrasar a subida da API
+    threading.Thread(target=catalogo.aquecer, name="aquecer-catalogo", daemon=True).start()
+    threading.Thread(target=razao_estoque.garantir_abertura, name="abertura-razao", daemon=True).start()
+    threading.Thread(target=rollups.reconstruir, name="reconstruir-rollups", daemon=True).start()
+    threading.Thread(target=indice_validade.reconstruir, name="reconstruir-validades", daemon=True).start()
+    saldo_consolidado.iniciar_reconciliacao()
+    saldo_historico.iniciar_checkpoints()
+    motor_estoque.iniciar_recarga()
+    indice_busca.iniciar_recarga()
+
+@app.on_event("shutdown")
+async def fechar_conexoes():
+    saldo_consolidado.parar_reconciliacao()
+    saldo_historico.parar_checkpoints()
+    motor_estoque.parar_recarga()
+    indice_busca.parar_recarga()
+    await repositorio.em_thread(razao_estoque.razao.encerrar)
+    await repositorio.em_thread(encerrar_produtividade)
+    await repositorio.fechar()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metricas():
+    return PlainTextResponse(exportar_metricas() + exportar_metricas_buffers(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def raiz():
     return {"mensagem": "🚀 API funcionando com sucesso!"}
 
 @app.post("/importar-planilha")
-async def importar_planilha(file: UploadFile = File(...)):
+async def importar_planilha(file: UploadFile = File(...), assincrono: bool = Query(False),
+                            simular: bool = Query(False)):
     try:
-        contents = await file.read()
-
-        if not contents:
+        arquivo = file.file
+        arquivo.seek(0, io.SEEK_END)
+        if arquivo.tell() == 0:
             return {"erro": "Arquivo vazio ou não enviado."}
+        arquivo.seek(0)
 
-        if file.filename.endswith(".xlsx"):
-            df = pd.read_excel(io.BytesIO(contents), engine="openpyxl")
-        elif file.filename.endswith(".csv"):
-            df = pd.read_csv(io.StringIO(contents.decode("utf-8")))
-        else:
+        if not file.filename.endswith((".xlsx", ".csv")):
             return {"erro": "Formato inválido. Use .csv ou .xlsx"}
 
-        df.columns = [col.lower().strip() for col in df.columns]
-
-        registros_importados = 0
-        erros = []
-
-        for i, linha in df.iterrows():
-            try:
-                ean = str(linha.get("ean", "")).strip()
-                validade_raw = linha.get("validade", "")
-                quantidade_raw = linha.get("quantidade", "")
-                usuario_id = linha.get("usuario_id", "sistema")
-                descricao = str(linha.get("descricao", "Produto sem descrição")).strip()
-                marca = str(linha.get("marca", "Marca desconhecida")).strip()
-
-                if not all([ean, validade_raw, quantidade_raw]):
-                    raise ValueError("Campos obrigatórios ausentes")
+        # 🧪 Simulação: valida a planilha inteira e devolve o relatório sem gravar nada
+        if simular:
+            return await repositorio.em_thread(
+                simular_importacao, ler_em_blocos(arquivo, file.filename), "entrada"
+            )
 
-                quantidade = int(quantidade_raw) if str(quantidade_raw).strip().isdigit() else 0
-                if quantidade <= 0:
-                    raise ValueError("Quantidade inválida ou zero")
+        if assincrono:
+            return await repositorio.em_thread(_enfileirar_importacao, arquivo, file.filename)
 
-                validade = pd.to_datetime(validade_raw, errors="coerce")
-                if pd.isnull(validade):
-                    raise ValueError(f"Data inválida: {validade_raw}")
-                validade = validade.date().isoformat()
-
-                resultado = entrada_produto(
-                    ean, validade, quantidade, usuario_id, descricao, marca
-                )
-
-                if "erro" not in resultado:
-                    registros_importados += 1
-                else:
-                    raise ValueError(resultado["erro"])
-
-            except Exception as erro_item:
-                erros.append(f"Linha {i+1}: {erro_item}")
+        # 🌊 Lê e grava em blocos: a memória não cresce com o tamanho do arquivo
+        resultado = await repositorio.em_thread(
+            importar_entradas_em_blocos, ler_em_blocos(arquivo, file.filename)
+        )
 
         return {
             "mensagem": "Importação concluída",
-            "registros_importados": registros_importados,
-            "erros": erros
+            "registros_importados": resultado["registros_importados"],
+            "erros": resultado["erros"],
+            "avisos": resultado["avisos"]
         }
 
     except Exception as e:
         return {"erro": f"Falha na importação: {str(e)}"}
 
+# 🧵 Copia o upload para um arquivo temporário e entrega a importação ao pool de jobs
+def _enfileirar_importacao(arquivo, nome_arquivo):
+    sufixo = os.path.splitext(nome_arquivo)[1]
+    with tempfile.NamedTemporaryFile(delete=False, suffix=sufixo) as temp:
+        shutil.copyfileobj(arquivo, temp)
+        temp_path = temp.name
+
+    def processar(job):
+        try:
+            with open(temp_path, "rb") as f:
+                importar_entradas_em_blocos(ler_em_blocos(f, nome_arquivo), job=job)
+        finally:
+            os.remove(temp_path)
+
+    job = jobs_importacao.submeter(nome_arquivo, processar, contar_linhas(temp_path, nome_arquivo))
+    return {"mensagem": "Importação enfileirada", "job_id": job.id, "status": job.status}
+
+@app.get("/importacoes/{job_id}")
+async def status_importacao(job_id: str):
+    job = jobs_importacao.obter(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Importação não encontrada.")
+    return job.resumo()
+
+@app.delete("/importacoes/{job_id}")
+async def cancelar_importacao(job_id: str):
+    job = jobs_importacao.cancelar(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Importação não encontrada.")
+    return {"mensagem": "Cancelamento solicitado", "job_id": job.id, "status": job.status}
+
 @app.get("/estoque")
 async def visualizar_estoque(
     ean: str = Query(None),
     marca: str = Query(None),
-    validade: str = Query(None)
+    validade: str = Query(None),
+    validade_de: str = Query(None),
+    validade_ate: str = Query(None),
+    nome: str = Query(None),
+    limite: int = Query(None, ge=1),
+    cursor: str = Query(None),
+    formato: str = Query("json")
 ):
     try:
-        query = supabase.table("estoque").select("*")
-
-        if ean:
-            query = query.eq("ean", ean)
-        if marca:
-            query = query.ilike("marca", f"%{marca}%")
-        if validade:
-            query = query.eq("validade", validade)
-
-        resultado = query.order("validade", desc=False).execute()
-
-        if resultado.data:
-            return {"estoque": resultado.data}
+        # 🌊 NDJSON: as linhas saem conforme cada página é lida
+        if formato == "ndjson":
+            filtros = {}
+            if ean:
+                filtros["ean"] = eq(ean)
+            if marca:
+                filtros["marca"] = ilike(marca)
+            if validade:
+                filtros["validade"] = eq(validade)
+            return StreamingResponse(gerar_ndjson("estoque", filtros, "validade"), media_type="application/x-ndjson")
+
+        # 🧠 Demais consultas saem do motor de estoque em memória (ordem de validade, cursor opcional)
+        if limite or cursor:
+            limite = min(limite or TAMANHO_PAGINA, LIMITE_MAXIMO)
+        dados, proximo = await repositorio.em_thread(
+            motor_estoque.consultar, ean, marca, nome, validade, validade_de, validade_ate, limite, cursor
+        )
+        if limite:
+            return {"estoque": dados, "proximo_cursor": proximo}
+
+        if dados:
+            return {"estoque": dados}
         else:
             return {"estoque": [], "mensagem": "Nenhum item encontrado"}
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         return {"erro": f"Erro ao consultar estoque: {str(e)}"}
 
+@app.get("/estoque/motor/estatisticas")
+def estatisticas_motor_estoque():
+    return motor_estoque.estatisticas()
+
+@app.post("/estoque/motor/recarregar")
+async def recarregar_motor_estoque():
+    lotes = await repositorio.em_thread(motor_estoque.reconstruir)
+    return {"mensagem": "Motor de estoque recarregado", "lotes": lotes}
+
 class ProdutoSchema(BaseModel):
     ean: str
     nome: str
@@ -126,6 +219,41 @@ class SaidaSchema(BaseModel):
     lote: str = None
     usuario_id: str = "sistema"
 
+class SaidaFefoSchema(BaseModel):
+    ean: str
+    quantidade: int
+    lote: str = None
+    usuario_id: str = "sistema"
+    permitir_vencidos: bool = False
+    simular: bool = False
+
+class ItemSaidaSchema(BaseModel):
+    ean: str
+    quantidade: int
+    validade: str = None
+    lote: str = None
+
+class ListaSaidaSchema(BaseModel):
+    itens: List[ItemSaidaSchema]
+    modo: str = "tudo_ou_nada"
+    usuario_id: str = "sistema"
+
+class TransferenciaSchema(BaseModel):
+    ean: str
+    validade: str
+    quantidade: int
+    lote: str = None
+    usuario_id: str = "sistema"
+
+class ItemAjusteSchema(BaseModel):
+    ean: str
+    validade: str
+
+class AjusteInventarioSchema(BaseModel):
+    local: str = "galpao"
+    itens: Optional[List[ItemAjusteSchema]] = None
+    usuario_id: str = "sistema"
+
 class UsuarioSchema(BaseModel):
     nome: str
     email: str
@@ -134,7 +262,7 @@ class UsuarioSchema(BaseModel):
 @app.post("/cadastrar-usuario")
 async def cadastrar_usuario(usuario: UsuarioSchema):
     try:
-        auth_res = supabase.auth.sign_up({
+        auth_res = await repositorio.em_thread(supabase.auth.sign_up, {
             "email": usuario.email,
             "password": usuario.senha
         })
@@ -148,7 +276,7 @@ async def cadastrar_usuario(usuario: UsuarioSchema):
             "email": usuario.email
         }
 
-        supabase.table("usuarios").insert(dados_usuario).execute()
+        await repositorio.inserir("usuarios", dados_usuario)
 
         return {"mensagem": f"Usuário {usuario.nome} cadastrado com sucesso!"}
 
@@ -156,8 +284,7 @@ async def cadastrar_usuario(usuario: UsuarioSchema):
         raise HTTPException(status_code=500, detail=f"Erro ao cadastrar usuário: {str(e)}")
 
 def produto_existe(ean: str):
-    res = supabase.table("produto").select("*").eq("ean", ean).execute()
-    return bool(res.data)
+    return catalogo.obter(ean) is not None
 
 def cadastrar_produto(ean: str, nome: str, marca: str):
     novo = {
@@ -165,7 +292,9 @@ def cadastrar_produto(ean: str, nome: str, marca: str):
         "descricao": nome,
         "marca": marca
     }
-    supabase.table("produto").insert(novo).execute()
+    res = supabase.table("produto").insert(novo).execute()
+    catalogo.invalidar(ean)
+    indice_busca.atualizar(res.data[0] if res.data else novo)
     return {"sucesso": True}
 
 def obter_ou_cadastrar_produto(ean: str, nome: str = None, marca: str = None):
@@ -187,31 +316,109 @@ def api_cadastrar_produto(produto: ProdutoSchema):
 
     return {"id": produto.ean, "mensagem": "Produto cadastrado com sucesso!"}
 
+@app.get("/exportar/{recurso}")
+async def exportar_dados(
+    recurso: str,
+    formato: str = Query("csv"),
+    ean: str = Query(None),
+    tipo: str = Query(None),
+    data_inicio: str = Query(None),
+    data_fim: str = Query(None)
+):
+    # 📤 Exportação em streaming: páginas por cursor, sem carregar o resultado inteiro
+    try:
+        gerador, tipo_conteudo, nome = exportar(recurso, formato, ean=ean, tipo=tipo,
+                                                data_inicio=data_inicio, data_fim=data_fim)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(gerador, media_type=tipo_conteudo,
+                             headers={"Content-Disposition": f'attachment; filename="{nome}"'})
+
+@app.get("/indicadores/movimentacao")
+def indicadores_movimentacao(
+    inicio: str = Query(...),
+    fim: str = Query(...),
+    granularidade: str = Query("dia"),
+    ean: str = Query(None),
+    marca: str = Query(None)
+):
+    try:
+        return rollups.serie(inicio, fim, granularidade, ean, marca)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/indicadores/movimentacao/reconstruir")
+async def reconstruir_indicadores():
+    linhas = await repositorio.em_thread(rollups.reconstruir)
+    return {"mensagem": "Indicadores reconstruídos", "registros_lidos": linhas, "totais": rollups.totais_gerais()}
+
+@app.get("/painel-validade")
+async def painel_validade(
+    limite: int = Query(50, ge=1, le=1000),
+    cursor: str = Query(None),
+    faixa: str = Query(None),
+    marca: str = Query(None)
+):
+    await repositorio.em_thread(indice_validade.garantir_carregado)
+    try:
+        pagina = indice_validade.proximos(limite, cursor, faixa, marca)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**indice_validade.resumo(), "proximos": pagina["dados"], "proximo_cursor": pagina["proximo_cursor"]}
+
+@app.post("/painel-validade/reconstruir")
+async def reconstruir_painel_validade():
+    lotes = await repositorio.em_thread(indice_validade.reconstruir)
+    return {"mensagem": "Índice de validade reconstruído", "lotes_lidos": lotes}
+
+@app.get("/produtos/busca")
+async def buscar_produtos(q: str = Query(...), limite: int = Query(10, ge=1, le=100)):
+    # 🔎 Autocomplete: descrição/marca sem acento, por prefixo (e aproximada), ou prefixo de EAN
+    return await repositorio.em_thread(indice_busca.buscar, q, limite)
+
+@app.get("/produtos/busca/estatisticas")
+def estatisticas_busca():
+    return indice_busca.estatisticas()
+
+@app.post("/produtos/busca/reconstruir")
+async def reconstruir_busca():
+    produtos = await repositorio.em_thread(indice_busca.reconstruir)
+    return {"mensagem": "Índice de busca reconstruído", "produtos": produtos}
+
+@app.get("/catalogo/estatisticas")
+def estatisticas_catalogo():
+    return catalogo.estatisticas()
+
 @app.post("/saida")
-def registrar_saida(saida: SaidaSchema):
+async def registrar_saida(saida: SaidaSchema):
     try:
-        produto_res = supabase.table("produto").select("*").eq("ean", saida.ean).execute()
-        if not produto_res.data:
+        produto = await repositorio.em_thread(catalogo.obter, saida.ean)
+        if not produto:
             raise HTTPException(status_code=404, detail="Produto não encontrado.")
 
-        produto = produto_res.data[0]
         id_produto = produto["id_produto"]
 
-        estoque_res = supabase.table("estoque").select("*")\
-            .eq("id_produto", id_produto)\
-            .eq("validade", saida.validade)\
-            .limit(1)\
-            .execute()
+        estoque_res = await repositorio.selecionar(
+            "estoque",
+            filtros={"id_produto": eq(id_produto), "validade": eq(saida.validade)},
+            limite=1
+        )
 
-        if not estoque_res.data:
+        if not estoque_res:
             raise HTTPException(status_code=404, detail="Estoque com essa validade não encontrado.")
 
-        estoque = estoque_res.data[0]
+        estoque = estoque_res[0]
         id_estoque = estoque["id"]
         quantidade_disponivel = estoque["quantidade"]
 
-        if saida.quantidade > quantidade_disponivel:
-            raise HTTPException(status_code=400, detail=f"Estoque insuficiente. Disponível: {quantidade_disponivel}")
+        # ⚛️ Baixa atômica (compare-and-set): saídas simultâneas do mesmo lote não se perdem
+        try:
+            novo_estoque = await ajustar_saldo_async(id_estoque, -saida.quantidade, quantidade_disponivel,
+                                                     coluna="quantidade")
+        except SaldoInsuficiente as e:
+            raise HTTPException(status_code=400, detail=f"Estoque insuficiente. Disponível: {e.disponivel}")
+        except ConflitoConcorrencia as e:
+            raise HTTPException(status_code=409, detail=str(e))
 
         registro = {
             "id_produto": id_produto,
@@ -224,43 +431,216 @@ def registrar_saida(saida: SaidaSchema):
             "usuario_id": saida.usuario_id
         }
 
-        supabase.table("saida").insert(registro).execute()
+        try:
+            await repositorio.inserir("saida", registro)
+        except Exception:
+            # ↩️ Sem histórico, a baixa é desfeita para o saldo continuar consistente
+            await ajustar_saldo_async(id_estoque, saida.quantidade, novo_estoque, coluna="quantidade")
+            raise
 
-        novo_estoque = quantidade_disponivel - saida.quantidade
-        supabase.table("estoque").update({"quantidade": novo_estoque})\
-            .eq("id", id_estoque)\
-            .execute()
+        # 📣 Os ouvintes (razão, índices) gravam de forma síncrona: fora do event loop
+        await repositorio.em_thread(
+            publicar_movimento, "saida", saida.ean, saida.validade, saida.quantidade,
+            estoque.get("marca") or produto.get("marca"),
+            momento=registro["data_saida"], saldo=novo_estoque, usuario_id=saida.usuario_id)
 
-        return {"mensagem": "✅ Saída registrada com sucesso!"}
+        return {"mensagem": "✅ Saída registrada com sucesso!", "saldo_restante": novo_estoque}
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao registrar saída: {str(e)}")
 
+@app.post("/saida/fefo")
+async def registrar_saida_fefo_api(saida: SaidaFefoSchema):
+    # 📦 Sem validade: a quantidade é distribuída pelos lotes que vencem primeiro
+    try:
+        resultado = await registrar_saida_fefo(saida.ean, saida.quantidade, saida.usuario_id, saida.lote,
+                                               saida.permitir_vencidos, saida.simular)
+    except ProdutoNaoEncontrado as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (EstoqueInsuficiente, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ConflitoConcorrencia as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao registrar saída: {str(e)}")
+
+    if not resultado["simulacao"]:
+        resultado["mensagem"] = "✅ Saída registrada com sucesso!"
+    return resultado
+
+@app.post("/saidas/lote")
+async def registrar_saidas_lote(lista: ListaSaidaSchema):
+    # 📋 Lista de separação: valida tudo antes e grava baixas e histórico em lote
+    try:
+        resultado = await registrar_saidas_em_lote([i.dict() for i in lista.itens], lista.modo, lista.usuario_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao registrar saídas: {str(e)}")
+
+    if lista.modo == "tudo_ou_nada" and not resultado["sucesso"]:
+        raise HTTPException(status_code=400, detail=resultado)
+    return resultado
+
+@app.post("/transferencia-loja")
+async def transferencia_loja(transferencia: TransferenciaSchema):
+    try:
+        saldos = await transferir_para_loja(transferencia.ean, transferencia.validade, transferencia.quantidade,
+                                            transferencia.usuario_id, transferencia.lote)
+    except (ProdutoNaoEncontrado, LoteNaoEncontrado) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except SaldoInsuficiente as e:
+        raise HTTPException(status_code=400, detail=f"Estoque insuficiente. Disponível: {e.disponivel}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ConflitoConcorrencia as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na transferência: {str(e)}")
+    return {"mensagem": "✅ Transferência registrada com sucesso!", **saldos}
+
+@app.get("/saldo-consolidado")
+async def consultar_saldo_consolidado(
+    ean: str = Query(None),
+    marca: str = Query(None),
+    nome: str = Query(None),
+    limite: int = Query(None, ge=1),
+    deslocamento: int = Query(0, ge=0)
+):
+    # 🏬 Galpão + loja por (ean, validade) e totais, servidos do retrato em memória
+    await repositorio.em_thread(saldo_consolidado.garantir_carregado)
+    return saldo_consolidado.consultar(ean, marca, nome, limite, deslocamento)
+
+@app.post("/saldo-consolidado/reconciliar")
+async def reconciliar_saldo_consolidado():
+    resultado = await repositorio.em_thread(saldo_consolidado.reconstruir)
+    return {"mensagem": "Saldo consolidado reconciliado", **resultado}
+
+@app.get("/inventario/reconciliacao")
+async def reconciliacao_inventario(local: str = Query("galpao"), apenas_divergentes: bool = Query(False)):
+    # ⚖️ Contagens x saldo em consultas em lote, sem uma consulta por item contado
+    try:
+        return await repositorio.em_thread(reconciliar_inventario, local, apenas_divergentes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na reconciliação: {str(e)}")
+
+@app.post("/inventario/ajustar")
+async def ajustar_inventario(ajuste: AjusteInventarioSchema):
+    itens = [i.dict() for i in ajuste.itens] if ajuste.itens is not None else None
+    try:
+        return await repositorio.em_thread(aplicar_ajustes, ajuste.local, itens, ajuste.usuario_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao ajustar inventário: {str(e)}")
+
+@app.get("/razao")
+async def consultar_razao(
+    ean: str = Query(None),
+    validade: str = Query(None),
+    local: str = Query(None),
+    tipo: str = Query(None),
+    limite: int = Query(500, ge=1),
+    cursor: str = Query(None)
+):
+    # 📒 Histórico unificado de movimentações, derivado do livro-razão
+    try:
+        dados, proximo = await razao_estoque.historico(ean, validade, local, tipo, limite, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"movimentos": dados, "proximo_cursor": proximo}
+
+@app.get("/razao/saldos")
+async def saldos_razao(ean: str = Query(None), validade: str = Query(None), local: str = Query(None)):
+    return {"saldos": await repositorio.em_thread(razao_estoque.saldos, ean, validade, local)}
+
+@app.get("/razao/produtividade")
+async def produtividade_razao(usuario_id: str = Query(None), inicio: str = Query(None), fim: str = Query(None)):
+    # 📊 Quantidade movimentada por usuário e tipo, derivada do razão
+    return {"produtividade": await repositorio.em_thread(razao_estoque.produtividade, usuario_id, inicio, fim)}
+
+@app.get("/razao/saldo-em")
+async def saldo_em_razao(
+    momento: str = Query(...),
+    ean: str = Query(None),
+    validade: str = Query(None),
+    local: str = Query(None)
+):
+    # 🕰️ Saldo em uma data (fim do dia) ou horário passado: checkpoint + replay curto do razão
+    try:
+        return await repositorio.em_thread(saldo_historico.saldo_em, momento, ean, validade, local)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Momento inválido: {str(e)}")
+
+@app.get("/razao/retrato")
+async def retrato_razao(momento: str = Query(...), local: str = Query(None)):
+    # 📸 Retrato completo (todos os SKUs) em um momento passado
+    try:
+        return await repositorio.em_thread(saldo_historico.saldo_em, momento, None, None, local)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Momento inválido: {str(e)}")
+
+@app.get("/razao/checkpoints")
+async def listar_checkpoints_razao():
+    return {"checkpoints": await repositorio.em_thread(saldo_historico.listar_checkpoints)}
+
+@app.post("/razao/checkpoints")
+async def gerar_checkpoint_razao(data: str = Query(None)):
+    try:
+        return await repositorio.em_thread(saldo_historico.gerar_checkpoint, data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/razao/estatisticas")
+def estatisticas_razao():
+    return razao_estoque.razao.estatisticas()
+
 @app.get("/saidas")
-def listar_saidas(
+async def listar_saidas(
     ean: str = Query(None),
     validade: str = Query(None),
     lote: str = Query(None),
-    usuario_id: str = Query(None)
+    usuario_id: str = Query(None),
+    limite: int = Query(None, ge=1),
+    cursor: str = Query(None),
+    formato: str = Query("json")
 ):
     try:
-        query = supabase.table("saida").select("*")
+        filtros = {}
 
         if ean:
-            query = query.eq("ean", ean)
+            filtros["ean"] = eq(ean)
         if validade:
-            query = query.eq("validade", validade)
+            filtros["validade"] = eq(validade)
         if lote:
-            query = query.eq("lote", lote)
+            filtros["lote"] = eq(lote)
         if usuario_id:
-            query = query.eq("usuario_id", usuario_id)
+            filtros["usuario_id"] = eq(usuario_id)
+
+        if formato == "ndjson":
+            return StreamingResponse(
+                gerar_ndjson("saida", filtros, "data_saida", desc=True), media_type="application/x-ndjson"
+            )
+
+        # 📄 Paginação por cursor, das saídas mais recentes para as mais antigas
+        if limite or cursor:
+            dados, proximo = await buscar_pagina(
+                "saida", filtros, "data_saida", desc=True, limite=limite or TAMANHO_PAGINA, cursor=cursor
+            )
+            return {"saidas": dados, "proximo_cursor": proximo}
 
-        resultado = query.order("data_saida", desc=True).execute()
+        dados = await repositorio.selecionar("saida", filtros=filtros, ordem="data_saida.desc")
 
-        if resultado.data:
-            return {"saidas": resultado.data}
+        if dados:
+            return {"saidas": dados}
         else:
             return {"saidas": [], "mensagem": "Nenhuma saída encontrada"}
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao listar saídas: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,494 @@
+import re
+import sqlite3
+import threading
+
+# 🗄️ Motor local (SQLite) com a mesma interface de consultas do cliente Supabase:
+# cliente.table("estoque").select("*").eq("ean", ean).order("validade").execute().data
+
+_IDENTIFICADOR = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# Tabelas conhecidas: colunas extras enviadas pelo código são criadas sob demanda
+ESQUEMA = {
+    "produto": {
+        "id_produto": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "id": "INTEGER",
+        "ean": "TEXT NOT NULL",
+        "descricao": "TEXT",
+        "marca": "TEXT",
+    },
+    "estoque": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "id_produto": "INTEGER",
+        "ean": "TEXT NOT NULL",
+        "validade": "TEXT",
+        "quantidade": "INTEGER DEFAULT 0",
+        "saldo": "INTEGER DEFAULT 0",
+        "nome": "TEXT",
+        "descricao": "TEXT",
+        "marca": "TEXT",
+    },
+    "estoque_loja": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "id_produto": "INTEGER",
+        "ean": "TEXT NOT NULL",
+        "validade": "TEXT",
+        "quantidade": "INTEGER DEFAULT 0",
+        "descricao": "TEXT",
+        "marca": "TEXT",
+    },
+    "entrada": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "ean": "TEXT",
+        "validade": "TEXT",
+        "quantidade": "INTEGER",
+        "usuario_id": "TEXT",
+        "nome": "TEXT",
+        "marca": "TEXT",
+        "timestamp": "TEXT",
+    },
+    "saida": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "id_produto": "INTEGER",
+        "id_estoque": "INTEGER",
+        "ean": "TEXT",
+        "quantidade": "INTEGER",
+        "validade": "TEXT",
+        "lote": "TEXT",
+        "data_saida": "TEXT",
+        "usuario_id": "TEXT",
+        "timestamp": "TEXT",
+    },
+    "movimentacoes": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "ean": "TEXT",
+        "quantidade": "INTEGER",
+        "tipo": "TEXT",
+        "data_mov": "TEXT",
+        "usuario": "TEXT",
+    },
+    "produtividade": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "usuario_id": "TEXT",
+        "tipo": "TEXT",
+        "quantidade": "INTEGER",
+        "timestamp": "TEXT",
+    },
+    "razao_estoque": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "momento": "TEXT",
+        "tipo": "TEXT",
+        "local": "TEXT",
+        "ean": "TEXT",
+        "validade": "TEXT",
+        "quantidade": "INTEGER",
+        "marca": "TEXT",
+        "usuario_id": "TEXT",
+    },
+    "razao_abertura": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "aberto_em": "TEXT",
+        "linhas": "INTEGER",
+    },
+    "razao_checkpoint": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "data": "TEXT",
+        "gerado_em": "TEXT",
+        "linhas": "INTEGER",
+        "ultimo_id": "INTEGER",
+    },
+    "razao_checkpoint_saldo": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "data": "TEXT",
+        "ean": "TEXT",
+        "validade": "TEXT",
+        "local": "TEXT",
+        "saldo": "INTEGER",
+    },
+    "importacao_arquivo": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "origem": "TEXT",
+        "hash": "TEXT",
+        "linhas": "INTEGER",
+        "importado_em": "TEXT",
+    },
+    "importacao_hash": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "tabela": "TEXT",
+        "hash": "TEXT",
+        "origem": "TEXT",
+        "linhas": "INTEGER",
+        "importado_em": "TEXT",
+    },
+    "importacao_linha": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "origem": "TEXT",
+        "chave": "TEXT",
+        "impressao": "TEXT",
+        "quantidade": "INTEGER",
+        "id_estoque": "INTEGER",
+    },
+    "usuarios": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "id_auth": "TEXT",
+        "nome": "TEXT",
+        "email": "TEXT",
+        "senha_hash": "TEXT",
+        "is_admin": "INTEGER DEFAULT 0",
+    },
+    "cadastro_user": {
+        "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+        "nome": "TEXT",
+        "email": "TEXT",
+        "senha": "TEXT",
+        "criado_em": "TEXT",
+    },
+}
+
+INDICES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_produto_ean ON produto (ean)",
+    "CREATE INDEX IF NOT EXISTS ix_estoque_ean_validade ON estoque (ean, validade)",
+    "CREATE INDEX IF NOT EXISTS ix_estoque_validade ON estoque (validade)",
+    "CREATE INDEX IF NOT EXISTS ix_estoque_id_produto ON estoque (id_produto, validade)",
+    "CREATE INDEX IF NOT EXISTS ix_estoque_loja_ean_validade ON estoque_loja (ean, validade)",
+    "CREATE INDEX IF NOT EXISTS ix_entrada_ean_validade ON entrada (ean, validade)",
+    "CREATE INDEX IF NOT EXISTS ix_saida_data_saida ON saida (data_saida)",
+    "CREATE INDEX IF NOT EXISTS ix_saida_ean_validade ON saida (ean, validade)",
+    "CREATE INDEX IF NOT EXISTS ix_movimentacoes_data_mov ON movimentacoes (data_mov)",
+    "CREATE INDEX IF NOT EXISTS ix_movimentacoes_ean ON movimentacoes (ean, data_mov)",
+    "CREATE INDEX IF NOT EXISTS ix_razao_estoque_ean_validade ON razao_estoque (ean, validade, local)",
+    "CREATE INDEX IF NOT EXISTS ix_razao_estoque_momento ON razao_estoque (momento)",
+    "CREATE INDEX IF NOT EXISTS ix_razao_checkpoint_data ON razao_checkpoint (data)",
+    "CREATE INDEX IF NOT EXISTS ix_razao_checkpoint_saldo ON razao_checkpoint_saldo (data, ean, validade, local)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_importacao_arquivo_origem ON importacao_arquivo (origem)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_importacao_hash_tabela ON importacao_hash (tabela, hash)",
+    "CREATE INDEX IF NOT EXISTS ix_importacao_linha_origem ON importacao_linha (origem, chave)",
+    "CREATE INDEX IF NOT EXISTS ix_usuarios_email ON usuarios (email)",
+    "CREATE INDEX IF NOT EXISTS ix_cadastro_user_email ON cadastro_user (email)",
+]
+
+
+def _nome(identificador):
+    if not _IDENTIFICADOR.match(str(identificador)):
+        raise ValueError(f"Identificador inválido: {identificador}")
+    return f'"{identificador}"'
+
+
+def _valor(valor):
+    if isinstance(valor, bool):
+        return int(valor)
+    return valor
+
+
+_OPERADORES = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "like": "LIKE"}
+
+
+def _dividir_nivel_superior(texto):
+    partes, atual, nivel, aspas = [], "", 0, False
+    for caractere in texto:
+        if caractere == '"':
+            aspas = not aspas
+        elif not aspas and caractere == "(":
+            nivel += 1
+        elif not aspas and caractere == ")":
+            nivel -= 1
+        elif not aspas and nivel == 0 and caractere == ",":
+            partes.append(atual)
+            atual = ""
+            continue
+        atual += caractere
+    if atual:
+        partes.append(atual)
+    return partes
+
+
+# 🧩 Converte a sintaxe de filtros lógicos do PostgREST (ex.: "a.gt.1,and(a.eq.1,id.gt.2)") em SQL
+def _condicao_postgrest(expressao):
+    expressao = expressao.strip()
+    for conector in ("and", "or"):
+        if expressao.startswith(conector + "(") and expressao.endswith(")"):
+            partes = [_condicao_postgrest(p) for p in _dividir_nivel_superior(expressao[len(conector) + 1:-1])]
+            sql = "(" + f" {conector.upper()} ".join(cond for cond, _ in partes) + ")"
+            return sql, [v for _, valores in partes for v in valores]
+    coluna, operador, valor = expressao.split(".", 2)
+    if len(valor) >= 2 and valor[0] == valor[-1] == '"':
+        valor = valor[1:-1].replace('\\"', '"')
+    if operador == "ilike":
+        return f"LOWER({_nome(coluna)}) LIKE LOWER(?)", [valor.replace("*", "%")]
+    if operador == "is":
+        return f"{_nome(coluna)} IS NULL", []
+    if operador == "not" and valor == "is.null":
+        return f"{_nome(coluna)} IS NOT NULL", []
+    return f"{_nome(coluna)} {_OPERADORES[operador]} ?", [valor]
+
+
+class Resposta:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+# 🔎 Construtor de consulta encadeável (select/insert/update/upsert/delete + filtros)
+class ConsultaSQLite:
+    def __init__(self, cliente, tabela):
+        self._cliente = cliente
+        self._tabela = tabela
+        self._operacao = "select"
+        self._colunas = "*"
+        self._dados = None
+        self._on_conflict = None
+        self._filtros = []
+        self._ordem = []
+        self._limite = None
+        self._deslocamento = None
+        self._unico = False
+        self._contar = False
+
+    # Operações
+    def select(self, colunas="*", count=None):
+        self._operacao = "select"
+        self._colunas = colunas
+        self._contar = count is not None
+        return self
+
+    def insert(self, registros):
+        self._operacao = "insert"
+        self._dados = registros if isinstance(registros, list) else [registros]
+        return self
+
+    def update(self, valores):
+        self._operacao = "update"
+        self._dados = valores
+        return self
+
+    def upsert(self, registros, on_conflict="id"):
+        self._operacao = "upsert"
+        self._dados = registros if isinstance(registros, list) else [registros]
+        self._on_conflict = [c.strip() for c in on_conflict.split(",")]
+        return self
+
+    def delete(self):
+        self._operacao = "delete"
+        return self
+
+    # Filtros
+    def _filtro(self, coluna, operador, valor):
+        self._filtros.append((f"{_nome(coluna)} {operador} ?", [_valor(valor)]))
+        return self
+
+    def eq(self, coluna, valor):
+        return self._filtro(coluna, "=", valor)
+
+    def neq(self, coluna, valor):
+        return self._filtro(coluna, "!=", valor)
+
+    def gt(self, coluna, valor):
+        return self._filtro(coluna, ">", valor)
+
+    def gte(self, coluna, valor):
+        return self._filtro(coluna, ">=", valor)
+
+    def lt(self, coluna, valor):
+        return self._filtro(coluna, "<", valor)
+
+    def lte(self, coluna, valor):
+        return self._filtro(coluna, "<=", valor)
+
+    def like(self, coluna, padrao):
+        return self._filtro(coluna, "LIKE", padrao)
+
+    def ilike(self, coluna, padrao):
+        self._filtros.append((f"LOWER({_nome(coluna)}) LIKE LOWER(?)", [padrao]))
+        return self
+
+    def in_(self, coluna, valores):
+        valores = [_valor(v) for v in valores]
+        if not valores:
+            self._filtros.append(("0", []))
+            return self
+        marcadores = ", ".join("?" * len(valores))
+        self._filtros.append((f"{_nome(coluna)} IN ({marcadores})", valores))
+        return self
+
+    def or_(self, filtros):
+        self._filtros.append(_condicao_postgrest(f"or({filtros})"))
+        return self
+
+    def is_(self, coluna, valor):
+        if valor in (None, "null"):
+            self._filtros.append((f"{_nome(coluna)} IS NULL", []))
+            return self
+        return self.eq(coluna, valor)
+
+    # Ordenação e paginação
+    # NULL como no Postgres: por último no ASC, primeiro no DESC (a paginação por cursor depende disso)
+    def order(self, coluna, desc=False):
+        self._ordem.append(f"{_nome(coluna)} {'DESC NULLS FIRST' if desc else 'ASC NULLS LAST'}")
+        return self
+
+    def limit(self, n):
+        self._limite = int(n)
+        return self
+
+    def range(self, inicio, fim):
+        self._deslocamento = int(inicio)
+        self._limite = int(fim) - int(inicio) + 1
+        return self
+
+    def single(self):
+        self._unico = True
+        return self.limit(2)
+
+    def _where(self):
+        if not self._filtros:
+            return "", []
+        parametros = [p for _, valores in self._filtros for p in valores]
+        return " WHERE " + " AND ".join(cond for cond, _ in self._filtros), parametros
+
+    def _projecao(self):
+        if self._colunas.strip() == "*":
+            return "*"
+        return ", ".join(_nome(c.strip()) for c in self._colunas.split(","))
+
+    def execute(self):
+        with self._cliente._trava:
+            return getattr(self, f"_executar_{self._operacao}")()
+
+    def _executar_select(self):
+        where, parametros = self._where()
+        sql = f"SELECT {self._projecao()} FROM {_nome(self._tabela)}{where}"
+        if self._ordem:
+            sql += " ORDER BY " + ", ".join(self._ordem)
+        if self._limite is not None or self._deslocamento:
+            sql += " LIMIT ? OFFSET ?"
+            parametros += [self._limite if self._limite is not None else -1, self._deslocamento or 0]
+        linhas = self._cliente._consultar(sql, parametros)
+        total = None
+        if self._contar:
+            total = self._cliente._consultar(f"SELECT COUNT(*) AS n FROM {_nome(self._tabela)}{where}",
+                                             self._where()[1])[0]["n"]
+        if self._unico:
+            if len(linhas) != 1:
+                raise ValueError("JSON object requested, multiple (or no) rows returned")
+            return Resposta(linhas[0], total)
+        return Resposta(linhas, total)
+
+    def _executar_insert(self):
+        inseridos = []
+        for registro in self._dados:
+            self._cliente._garantir_colunas(self._tabela, registro)
+            colunas = ", ".join(_nome(c) for c in registro)
+            marcadores = ", ".join("?" * len(registro))
+            sql = f"INSERT INTO {_nome(self._tabela)} ({colunas}) VALUES ({marcadores}) RETURNING *"
+            inseridos.extend(self._cliente._consultar(sql, [_valor(v) for v in registro.values()]))
+        self._cliente._confirmar()
+        return Resposta(inseridos)
+
+    def _executar_update(self):
+        self._cliente._garantir_colunas(self._tabela, self._dados)
+        where, parametros = self._where()
+        atribuicoes = ", ".join(f"{_nome(c)} = ?" for c in self._dados)
+        sql = f"UPDATE {_nome(self._tabela)} SET {atribuicoes}{where} RETURNING *"
+        linhas = self._cliente._consultar(sql, [_valor(v) for v in self._dados.values()] + parametros)
+        self._cliente._confirmar()
+        return Resposta(linhas)
+
+    def _executar_upsert(self):
+        gravados = []
+        for registro in self._dados:
+            self._cliente._garantir_colunas(self._tabela, registro)
+            chave = [c for c in self._on_conflict if registro.get(c) is not None]
+            existente = []
+            if len(chave) == len(self._on_conflict):
+                where = " AND ".join(f"{_nome(c)} = ?" for c in chave)
+                existente = self._cliente._consultar(
+                    f"SELECT 1 FROM {_nome(self._tabela)} WHERE {where} LIMIT 1",
+                    [_valor(registro[c]) for c in chave])
+            if existente:
+                atribuicoes = ", ".join(f"{_nome(c)} = ?" for c in registro)
+                sql = f"UPDATE {_nome(self._tabela)} SET {atribuicoes} WHERE {where} RETURNING *"
+                parametros = [_valor(v) for v in registro.values()] + [_valor(registro[c]) for c in chave]
+            else:
+                colunas = ", ".join(_nome(c) for c in registro)
+                marcadores = ", ".join("?" * len(registro))
+                sql = f"INSERT INTO {_nome(self._tabela)} ({colunas}) VALUES ({marcadores}) RETURNING *"
+                parametros = [_valor(v) for v in registro.values()]
+            gravados.extend(self._cliente._consultar(sql, parametros))
+        self._cliente._confirmar()
+        return Resposta(gravados)
+
+    def _executar_delete(self):
+        where, parametros = self._where()
+        linhas = self._cliente._consultar(f"DELETE FROM {_nome(self._tabela)}{where} RETURNING *", parametros)
+        self._cliente._confirmar()
+        return Resposta(linhas)
+
+
+# 💾 Cliente local: WAL, índices e instruções parametrizadas (reaproveitadas pelo cache do sqlite3)
+class ClienteSQLite:
+    def __init__(self, caminho="estoque_local.db"):
+        self.caminho = caminho
+        self._trava = threading.RLock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, cached_statements=512)
+        self._conexao.row_factory = sqlite3.Row
+        self._colunas = {}
+        with self._trava:
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("PRAGMA synchronous=NORMAL")
+            self._conexao.execute("PRAGMA temp_store=MEMORY")
+            self._criar_esquema()
+
+    def _criar_esquema(self):
+        for tabela, colunas in ESQUEMA.items():
+            definicao = ", ".join(f"{_nome(c)} {tipo}" for c, tipo in colunas.items())
+            self._conexao.execute(f"CREATE TABLE IF NOT EXISTS {_nome(tabela)} ({definicao})")
+        for indice in INDICES:
+            self._conexao.execute(indice)
+        self._conexao.commit()
+
+    def _colunas_da_tabela(self, tabela):
+        if tabela not in self._colunas:
+            linhas = self._conexao.execute(f"PRAGMA table_info({_nome(tabela)})").fetchall()
+            if not linhas:
+                self._conexao.execute(
+                    f"CREATE TABLE {_nome(tabela)} (\"id\" INTEGER PRIMARY KEY AUTOINCREMENT)")
+                linhas = self._conexao.execute(f"PRAGMA table_info({_nome(tabela)})").fetchall()
+            self._colunas[tabela] = {linha["name"] for linha in linhas}
+        return self._colunas[tabela]
+
+    def _garantir_colunas(self, tabela, registro):
+        existentes = self._colunas_da_tabela(tabela)
+        for coluna in registro:
+            if coluna not in existentes:
+                self._conexao.execute(f"ALTER TABLE {_nome(tabela)} ADD COLUMN {_nome(coluna)}")
+                existentes.add(coluna)
+
+    def _consultar(self, sql, parametros):
+        return [dict(linha) for linha in self._conexao.execute(sql, parametros).fetchall()]
+
+    def _confirmar(self):
+        self._conexao.commit()
+
+    # 🚚 Carga em massa (executemany, sem RETURNING) para popular réplicas e benchmarks
+    def carregar(self, tabela, registros):
+        registros = list(registros)
+        if not registros:
+            return 0
+        with self._trava:
+            self._garantir_colunas(tabela, registros[0])
+            colunas = list(registros[0])
+            sql = (f"INSERT INTO {_nome(tabela)} ({', '.join(_nome(c) for c in colunas)}) "
+                   f"VALUES ({', '.join('?' * len(colunas))})")
+            self._conexao.executemany(sql, ([_valor(r.get(c)) for c in colunas] for r in registros))
+            self._conexao.commit()
+        return len(registros)
+
+    def table(self, nome):
+        with self._trava:
+            self._colunas_da_tabela(nome)
+        return ConsultaSQLite(self, nome)
+
+    from_ = table
+
+    def fechar(self):
+        with self._trava:
+            self._conexao.close()
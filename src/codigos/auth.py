@@ -1,7 +1,8 @@
+import os
 import bcrypt
 from datetime import datetime
-from supabase import create_client
 from src.codigos.config_supabase import supabase  # arquivo onde você configura seu Supabase
+from src.codigos.buffer_gravacao import BufferGravacao
 
 # 🔐 Cadastrar novo usuário
 def cadastrar_usuario(nome, email, senha, is_admin=False):
@@ -45,7 +46,14 @@ def listar_usuarios():
 
 
 # 📊 Registrar produtividade (movimentações de estoque)
-from datetime import datetime
+# Só alimenta relatórios: fica fora do caminho da operação, numa fila limitada gravada em lote.
+# Com a fila cheia o registro é descartado e contado em estoque_buffer_descartados_total.
+_produtividade = BufferGravacao(
+    "produtividade",
+    intervalo_ms=int(os.getenv("ESTOQUE_PRODUTIVIDADE_INTERVALO_MS", "200")),
+    max_pendentes=int(os.getenv("ESTOQUE_PRODUTIVIDADE_MAX_PENDENTES", "10000")),
+)
+
 
 def registrar_movimentacao(usuario_id, tipo, quantidade):
     entrada = {
@@ -54,4 +62,9 @@ def registrar_movimentacao(usuario_id, tipo, quantidade):
         "quantidade": quantidade,
         "timestamp": datetime.now().isoformat()
     }
-    supabase.table("produtividade").insert(entrada).execute()
\ No newline at end of file
+    return _produtividade.adicionar(entrada)
+
+
+# 🔒 Grava a produtividade pendente (desligamento da API)
+def encerrar_produtividade():
+    _produtividade.encerrar()
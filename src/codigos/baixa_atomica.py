@@ -0,0 +1,73 @@
+import asyncio
+import random
+import time
+
+try:
+    from src.codigos.config_supabase import supabase
+    from src.codigos import repositorio
+    from src.codigos.repositorio import eq
+except ImportError:  # scripts executados de dentro de src/codigos: só a versão síncrona
+    from config_supabase import supabase
+    repositorio = eq = None
+
+# 🔁 Tentativas do compare-and-set antes de desistir por concorrência
+MAX_TENTATIVAS = 8
+ESPERA_BASE_SEGUNDOS = 0.005
+ESPERA_MAXIMA_SEGUNDOS = 0.2
+
+
+class SaldoInsuficiente(Exception):
+    def __init__(self, disponivel):
+        super().__init__(f"Saldo insuficiente. Disponível: {disponivel}")
+        self.disponivel = disponivel
+
+
+class ConflitoConcorrencia(Exception):
+    pass
+
+
+def _espera(tentativa):
+    limite = min(ESPERA_MAXIMA_SEGUNDOS, ESPERA_BASE_SEGUNDOS * (2 ** tentativa))
+    return random.uniform(0, limite)
+
+
+# ⚛️ Ajusta o saldo de um lote com compare-and-set: o UPDATE só vale se o saldo
+# ainda for o que foi lido; senão relê e tenta de novo (nenhuma baixa se perde).
+# `coluna` é obrigatória: o estoque de estoque.py guarda o saldo em "saldo", o da API em "quantidade"
+def ajustar_saldo(id_estoque, delta, saldo_lido, coluna, tabela="estoque"):
+    atual = saldo_lido
+    for tentativa in range(MAX_TENTATIVAS):
+        novo = atual + delta
+        if novo < 0:
+            raise SaldoInsuficiente(atual)
+        res = supabase.table(tabela).update({coluna: novo}) \
+            .eq("id", id_estoque) \
+            .eq(coluna, atual).execute()
+        if res.data:
+            return novo
+        time.sleep(_espera(tentativa))
+        releitura = supabase.table(tabela).select(coluna).eq("id", id_estoque).execute()
+        if not releitura.data:
+            raise ConflitoConcorrencia("Lote removido durante a operação")
+        atual = releitura.data[0][coluna]
+    raise ConflitoConcorrencia("Muitas operações simultâneas no mesmo lote, tente novamente")
+
+
+# ⚛️ Mesma lógica, pelo repositório assíncrono (handlers async da API)
+async def ajustar_saldo_async(id_estoque, delta, saldo_lido, coluna, tabela="estoque"):
+    atual = saldo_lido
+    for tentativa in range(MAX_TENTATIVAS):
+        novo = atual + delta
+        if novo < 0:
+            raise SaldoInsuficiente(atual)
+        atualizado = await repositorio.atualizar(
+            tabela, {coluna: novo}, {"id": eq(id_estoque), coluna: eq(atual)}
+        )
+        if atualizado:
+            return novo
+        await asyncio.sleep(_espera(tentativa))
+        releitura = await repositorio.selecionar(tabela, colunas=coluna, filtros={"id": eq(id_estoque)})
+        if not releitura:
+            raise ConflitoConcorrencia("Lote removido durante a operação")
+        atual = releitura[0][coluna]
+    raise ConflitoConcorrencia("Muitas operações simultâneas no mesmo lote, tente novamente")
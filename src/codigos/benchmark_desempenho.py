@@ -0,0 +1,336 @@
+"""
+Microbenchmarks das funções mais usadas, sobre um Supabase falso em memória.
+
+O cliente falso usa o motor SQLite local, conta cada ida ao banco (round-trip)
+por tabela/operação e pode simular a latência da rede.
+
+Uso (de dentro de src/codigos):
+    python benchmark_desempenho.py --tamanhos 1000 10000 100000 --saida baseline.json
+    python benchmark_desempenho.py --tamanhos 1000 --latencia-ms 20 --comparar baseline.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+# Nunca acessa a rede: força o backend local antes de importar os módulos do sistema
+os.environ["ESTOQUE_BACKEND"] = "sqlite"
+os.environ["ESTOQUE_SQLITE"] = ":memory:"
+PASTA = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(os.path.dirname(PASTA)), PASTA]
+
+from openpyxl import Workbook  # noqa: E402
+
+from armazenamento_sqlite import ClienteSQLite  # noqa: E402
+import estoque  # noqa: E402
+import importar_cadastro  # noqa: E402
+import importar_estoque_loja_excel  # noqa: E402
+import movimentacao  # noqa: E402
+import painel  # noqa: E402
+
+# Máximo de operações unitárias (entrada/saída) medidas por cenário
+MAX_OPERACOES = 1000
+TOLERANCIA_REGRESSAO = 0.20
+
+
+# 🎭 Cliente Supabase falso: registra cada round-trip e injeta latência
+class ClienteFalso:
+    def __init__(self, latencia_ms=0):
+        self.base = ClienteSQLite(":memory:")
+        self.latencia = latencia_ms / 1000
+        self.idas = Counter()
+        self._trava = threading.Lock()
+
+    def table(self, nome):
+        return _ConsultaFalsa(self, self.base.table(nome), nome)
+
+    from_ = table
+
+    def carregar(self, tabela, registros):
+        return self.base.carregar(tabela, registros)
+
+    def registrar(self, tabela, operacao):
+        with self._trava:
+            self.idas[f"{tabela}.{operacao}"] += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    @property
+    def total_idas(self):
+        return sum(self.idas.values())
+
+
+class _ConsultaFalsa:
+    def __init__(self, cliente, consulta, tabela):
+        self._cliente = cliente
+        self._consulta = consulta
+        self._tabela = tabela
+
+    def __getattr__(self, nome):
+        metodo = getattr(self._consulta, nome)
+
+        def encadear(*args, **kwargs):
+            metodo(*args, **kwargs)
+            return self
+        return encadear
+
+    def execute(self):
+        self._cliente.registrar(self._tabela, self._consulta._operacao)
+        return self._consulta.execute()
+
+
+# 🔌 Troca o cliente em todos os módulos do sistema já importados
+def instalar_cliente(cliente):
+    for modulo in list(sys.modules.values()):
+        atual = getattr(modulo, "supabase", None)
+        # Compara pelo nome: o motor pode ter sido importado como módulo solto e como src.codigos
+        if type(atual).__name__ in ("ClienteSQLite", "ClienteInstrumentado", "ClienteFalso"):
+            modulo.supabase = cliente
+    for nome in ("cache_catalogo", "src.codigos.cache_catalogo"):
+        if nome in sys.modules:
+            sys.modules[nome].catalogo.invalidar()
+    if "src.codigos.indice_validade" in sys.modules:
+        sys.modules["src.codigos.indice_validade"].indice_validade.invalidar()
+
+
+# 🧪 Geradores de dados
+def _ean(i):
+    base = f"789{i:09d}"
+    soma = sum(int(d) * (3 if p % 2 else 1) for p, d in enumerate(base))
+    return base + str((10 - soma % 10) % 10)
+
+
+def _validade(i):
+    return (date.today() + timedelta(days=(i % 720) - 30)).isoformat()
+
+
+def _produtos(n):
+    return ({"ean": _ean(i), "descricao": f"Produto {i}", "marca": f"Marca {i % 50}"} for i in range(n))
+
+
+def _lotes(n):
+    return ({"ean": _ean(i), "validade": _validade(i), "saldo": 1_000_000, "quantidade": 1_000_000,
+             "nome": f"PRODUTO {i}", "marca": f"Marca {i % 50}", "id_produto": i + 1} for i in range(n))
+
+
+# 🕒 Uma movimentação por minuto a partir de INICIO_MOVIMENTOS
+INICIO_MOVIMENTOS = datetime(2024, 1, 1)
+
+
+def _movimentos(n):
+    return ({"ean": _ean(i % 5000), "quantidade": 1 + i % 10, "tipo": "entrada" if i % 3 else "saida",
+             "data_mov": (INICIO_MOVIMENTOS + timedelta(minutes=i)).isoformat()} for i in range(n))
+
+
+def _planilha(linhas, colunas):
+    caminho = tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx").name
+    livro = Workbook(write_only=True)
+    aba = livro.create_sheet()
+    aba.append(colunas)
+    for linha in linhas:
+        aba.append(linha)
+    livro.save(caminho)
+    return caminho
+
+
+# 🏁 Cenários: cada um prepara os dados (fora da medição) e devolve (função, nº de operações)
+def cenario_entrada_produto(cliente, n):
+    cliente.carregar("estoque", _lotes(n))
+    ops = min(n, MAX_OPERACOES)
+
+    def rodar():
+        for i in range(ops):
+            i_ean = i if i % 2 else n + i  # metade atualiza lote existente, metade cria
+            estoque.entrada_produto(_ean(i_ean), _validade(i_ean), 5, "bench", "Produto", "Marca")
+    return rodar, ops
+
+
+def cenario_saida_produto(cliente, n):
+    cliente.carregar("estoque", _lotes(n))
+    ops = min(n, MAX_OPERACOES)
+
+    def rodar():
+        for i in range(ops):
+            estoque.saida_produto(_ean(i % n), _validade(i % n), 1, "bench")
+    return rodar, ops
+
+
+def cenario_saida_concorrente(cliente, n):
+    """Saídas paralelas no mesmo lote: o saldo final precisa refletir todas as baixas."""
+    cliente.carregar("estoque", [{"ean": _ean(0), "validade": _validade(0), "saldo": n, "nome": "P"}])
+    ops = min(n, MAX_OPERACOES)
+
+    def rodar():
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            resultados = list(executor.map(
+                lambda _: estoque.saida_produto(_ean(0), _validade(0), 1, "bench"), range(ops)))
+        saldo = cliente.base.table("estoque").select("saldo").eq("ean", _ean(0)).execute().data[0]["saldo"]
+        sucesso = sum(1 for r in resultados if r.get("sucesso"))
+        perdidas = (n - saldo) - sucesso
+        if perdidas:
+            raise AssertionError(f"{perdidas} baixas perdidas sob concorrência")
+    return rodar, ops
+
+
+def cenario_importar_estoque_excel(cliente, n):
+    cliente.carregar("produto", _produtos(n))
+    caminho = _planilha(
+        ([_ean(i), f"Produto {i}", "Marca", _validade(i), 1 + i % 20] for i in range(n)),
+        ["ean", "descricao", "marca", "validade", "quantidade"])
+
+    def rodar():
+        try:
+            importar_estoque_loja_excel.importar_estoque_excel(caminho)
+        finally:
+            os.remove(caminho)
+    return rodar, n
+
+
+def cenario_reimportar_estoque_excel(cliente, n):
+    cliente.carregar("produto", _produtos(n))
+    linhas = [[_ean(i), f"Produto {i}", "Marca", _validade(i), 1 + i % 20] for i in range(n)]
+    original = _planilha(linhas, ["ean", "descricao", "marca", "validade", "quantidade"])
+    with contextlib.redirect_stdout(io.StringIO()):
+        importar_estoque_loja_excel.importar_estoque_excel(original, origem="loja-1:semanal")
+    os.remove(original)
+    # 1% das linhas corrigidas: a reimportação grava só essas
+    for i in range(0, n, 100):
+        linhas[i][4] += 1
+    caminho = _planilha(linhas, ["ean", "descricao", "marca", "validade", "quantidade"])
+
+    def rodar():
+        try:
+            importar_estoque_loja_excel.importar_estoque_excel(caminho, origem="loja-1:semanal")
+        finally:
+            os.remove(caminho)
+    return rodar, n
+
+
+def cenario_importar_cadastro_excel(cliente, n):
+    cliente.carregar("produto", _produtos(n // 2))
+    caminho = _planilha(([_ean(i), f"Marca {i % 50}", f"Produto {i}"] for i in range(n)),
+                        ["ean", "marca", "descricao"])
+
+    def rodar():
+        try:
+            importar_cadastro.importar_cadastro_excel(caminho)
+        finally:
+            os.remove(caminho)
+    return rodar, n
+
+
+def cenario_painel_validade(cliente, n):
+    cliente.carregar("estoque", _lotes(n))
+    return painel.gerar_painel_validade, 1
+
+
+def cenario_filtrar_movimentacoes(cliente, n):
+    cliente.carregar("movimentacoes", _movimentos(n))
+
+    # Janela com a metade central do período gerado: o filtro sempre encontra linhas, qualquer que seja n
+    data_inicio = (INICIO_MOVIMENTOS + timedelta(minutes=n // 4)).isoformat()
+    data_fim = (INICIO_MOVIMENTOS + timedelta(minutes=3 * n // 4)).isoformat()
+
+    def rodar():
+        movimentacao.filtrar_movimentacoes(tipo="saida", data_inicio=data_inicio, data_fim=data_fim)
+    return rodar, 1
+
+
+CENARIOS = {
+    "entrada_produto": cenario_entrada_produto,
+    "saida_produto": cenario_saida_produto,
+    "saida_concorrente": cenario_saida_concorrente,
+    "importar_estoque_excel": cenario_importar_estoque_excel,
+    "reimportar_estoque_excel": cenario_reimportar_estoque_excel,
+    "importar_cadastro_excel": cenario_importar_cadastro_excel,
+    "gerar_painel_validade": cenario_painel_validade,
+    "filtrar_movimentacoes": cenario_filtrar_movimentacoes,
+}
+
+
+# ⏱️ Mede tempo de parede, pico de memória e round-trips de um cenário
+def medir(nome, n, latencia_ms=0):
+    cliente = ClienteFalso(latencia_ms)
+    instalar_cliente(cliente)
+    rodar, ops = CENARIOS[nome](cliente, n)
+    cliente.idas.clear()
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rodar()
+    tempo = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "cenario": nome,
+        "linhas": n,
+        "operacoes": ops,
+        "tempo_s": round(tempo, 4),
+        "tempo_por_operacao_ms": round(tempo * 1000 / ops, 4),
+        "memoria_pico_mb": round(pico / 2 ** 20, 2),
+        "round_trips": cliente.total_idas,
+        "round_trips_por_operacao": round(cliente.total_idas / ops, 2),
+        "round_trips_por_tabela": dict(cliente.idas),
+    }
+
+
+def comparar(resultados, caminho_baseline, tolerancia=TOLERANCIA_REGRESSAO):
+    with open(caminho_baseline, encoding="utf-8") as f:
+        baseline = {(r["cenario"], r["linhas"]): r for r in json.load(f)["resultados"]}
+    regressoes = []
+    for r in resultados:
+        antes = baseline.get((r["cenario"], r["linhas"]))
+        if not antes:
+            continue
+        for metrica in ("tempo_por_operacao_ms", "memoria_pico_mb", "round_trips_por_operacao"):
+            if antes[metrica] and r[metrica] > antes[metrica] * (1 + tolerancia):
+                regressoes.append(f"{r['cenario']}[{r['linhas']}] {metrica}: {antes[metrica]} → {r[metrica]}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do controle de estoque")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--cenarios", nargs="+", choices=sorted(CENARIOS), default=list(CENARIOS))
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    parser.add_argument("--saida", help="grava os resultados (JSON) para servir de baseline")
+    parser.add_argument("--comparar", help="baseline JSON para detectar regressões")
+    args = parser.parse_args()
+
+    resultados = []
+    for nome in args.cenarios:
+        for n in args.tamanhos:
+            r = medir(nome, n, args.latencia_ms)
+            resultados.append(r)
+            print(f"{nome:<26} {n:>9} linhas  {r['tempo_s']:>9.3f}s  "
+                  f"{r['tempo_por_operacao_ms']:>10.3f} ms/op  {r['memoria_pico_mb']:>8.2f} MB  "
+                  f"{r['round_trips_por_operacao']:>8.2f} idas/op")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({"gerado_em": datetime.now().isoformat(), "latencia_ms": args.latencia_ms,
+                       "resultados": resultados}, f, indent=2, ensure_ascii=False)
+        print(f"📄 Resultados gravados em {args.saida}")
+
+    if args.comparar:
+        regressoes = comparar(resultados, args.comparar)
+        for regressao in regressoes:
+            print(f"🔻 Regressão: {regressao}")
+        if regressoes:
+            sys.exit(1)
+        print("✅ Nenhuma regressão acima da tolerância")
+
+
+if __name__ == "__main__":
+    main()
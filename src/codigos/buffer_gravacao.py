@@ -0,0 +1,204 @@
+import atexit
+import threading
+import time
+from collections import deque
+
+try:
+    from src.codigos.config_supabase import supabase
+except ImportError:  # scripts executados de dentro de src/codigos
+    from config_supabase import supabase
+
+# ⚙️ Padrões do group commit: grava quando junta N registros ou a cada poucos milissegundos.
+# Com intervalo 0 não há espera: o que chega durante uma gravação forma o lote seguinte.
+MAX_LOTE = 500
+INTERVALO_MS = 5
+MAX_TENTATIVAS = 3
+# Com reter_falhas=True, espera máxima entre as rodadas de regravação de um lote retido (segundos)
+ESPERA_MAXIMA_RETIDOS = 5.0
+
+# 📋 Todos os buffers criados, para o /metrics
+BUFFERS = []
+
+
+class ErroGravacao(Exception):
+    pass
+
+
+# 🎫 Aviso de conclusão de uma chamada de adicionar() (pode cobrir vários registros)
+class _Recibo:
+    def __init__(self, registros):
+        self.restantes = registros
+        self.erro = None
+        self._pronto = threading.Event()
+
+    def concluir(self, quantidade, erro=None):
+        self.erro = self.erro or erro
+        self.restantes -= quantidade
+        if self.restantes <= 0:
+            self._pronto.set()
+
+    def aguardar(self, timeout=None):
+        if not self._pronto.wait(timeout):
+            raise ErroGravacao("Tempo esgotado aguardando a gravação")
+        if self.erro:
+            raise ErroGravacao(self.erro)
+
+
+# 📦 Buffer de gravação em lote: várias operações concorrentes dividem um único INSERT
+class BufferGravacao:
+    def __init__(self, tabela, max_lote=MAX_LOTE, intervalo_ms=INTERVALO_MS, max_pendentes=None, gravar=None,
+                 reter_falhas=False):
+        self.tabela = tabela
+        # reter_falhas=True: um lote que esgota as tentativas volta para a fila em vez de ser
+        # descartado (quem aguardava recebe o erro, mas os registros ainda serão gravados)
+        self.reter_falhas = reter_falhas
+        self._rodadas_falhas = 0
+        self.max_lote = max_lote
+        self.intervalo = intervalo_ms / 1000
+        self.max_pendentes = max_pendentes  # None = sem limite (quem chama espera a gravação)
+        self._gravar = gravar or self._inserir
+        self._fila = deque()
+        self._condicao = threading.Condition()
+        self._thread = None
+        self._encerrando = False
+        self._registrado_atexit = False
+        self._em_gravacao = 0
+        self.gravados = 0
+        self.lotes = 0
+        self.descartados = 0
+        self.falhas = 0
+        self.retidos = 0
+        BUFFERS.append(self)
+
+    def _inserir(self, lote):
+        supabase.table(self.tabela).insert(lote).execute()
+
+    def _iniciar(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._encerrando = False
+            self._thread = threading.Thread(target=self._executar, name=f"buffer-{self.tabela}", daemon=True)
+            self._thread.start()
+            if not self._registrado_atexit:
+                atexit.register(self.encerrar)
+                self._registrado_atexit = True
+
+    # ➕ Enfileira registros; com aguardar=True só retorna depois do lote estar gravado
+    def adicionar(self, registros, aguardar=False, timeout=None):
+        registros = list(registros) if isinstance(registros, (list, tuple)) else [registros]
+        if not registros:
+            return True
+        recibo = _Recibo(len(registros))
+        with self._condicao:
+            if self.max_pendentes is not None and len(self._fila) + len(registros) > self.max_pendentes:
+                self.descartados += len(registros)
+                return False
+            self._iniciar()
+            self._fila.extend((r, recibo) for r in registros)
+            self._condicao.notify_all()
+        if aguardar:
+            recibo.aguardar(timeout)
+        return True
+
+    def _proximo_lote(self):
+        with self._condicao:
+            while not self._fila and not self._encerrando:
+                self._condicao.wait()
+            # Janela do group commit: dá tempo para outras operações entrarem no mesmo lote
+            prazo = time.monotonic() + self.intervalo
+            while len(self._fila) < self.max_lote and not self._encerrando:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                self._condicao.wait(restante)
+            tamanho = min(len(self._fila), self.max_lote)
+            self._em_gravacao += tamanho
+            return [self._fila.popleft() for _ in range(tamanho)]
+
+    def _gravar_lote(self, itens):
+        lote = [r for r, _ in itens]
+        erro = None
+        for tentativa in range(MAX_TENTATIVAS):
+            try:
+                self._gravar(lote)
+                erro = None
+                break
+            except Exception as e:
+                erro = str(e)
+                time.sleep(0.05 * (2 ** tentativa))
+        with self._condicao:
+            if erro and self.reter_falhas:
+                # Volta para o início da fila, na mesma ordem; a próxima rodada espera mais
+                self._fila.extendleft(reversed(itens))
+                self.retidos = len(lote)
+                self._rodadas_falhas += 1
+            elif erro:
+                self.falhas += len(lote)
+            else:
+                self.gravados += len(lote)
+                self.lotes += 1
+                self._rodadas_falhas = 0
+                self.retidos = 0
+            self._em_gravacao -= len(lote)
+            self._condicao.notify_all()
+        if erro:
+            print(f"❌ Falha ao gravar {len(lote)} registros em {self.tabela}: {erro}"
+                  + (" (mantidos na fila para nova tentativa)" if self.reter_falhas else ""))
+        recibos = {}
+        for _, recibo in itens:
+            recibos[recibo] = recibos.get(recibo, 0) + 1
+        for recibo, quantidade in recibos.items():
+            recibo.concluir(quantidade, erro)
+        if erro and self.reter_falhas:
+            time.sleep(min(ESPERA_MAXIMA_RETIDOS, 0.1 * (2 ** self._rodadas_falhas)))
+
+    def _executar(self):
+        while True:
+            itens = self._proximo_lote()
+            if itens:
+                self._gravar_lote(itens)
+            elif self._encerrando:
+                return
+
+    # 🚿 Grava tudo o que estiver pendente (sem parar o buffer)
+    def descarregar(self, timeout=None):
+        with self._condicao:
+            self._condicao.notify_all()
+            return self._condicao.wait_for(lambda: not self._fila and not self._em_gravacao, timeout)
+
+    # 🔒 Desligamento: grava o que falta e para a thread
+    def encerrar(self, timeout=10):
+        with self._condicao:
+            self._encerrando = True
+            self._condicao.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def estatisticas(self):
+        with self._condicao:
+            return {
+                "tabela": self.tabela,
+                "pendentes": len(self._fila),
+                "gravados": self.gravados,
+                "lotes": self.lotes,
+                "descartados": self.descartados,
+                "falhas": self.falhas,
+                "retidos": self.retidos,
+            }
+
+
+# 📈 Contadores dos buffers no formato do Prometheus
+def exportar_metricas():
+    series = (
+        ("estoque_buffer_pendentes", "gauge", "Registros aguardando gravação", "pendentes"),
+        ("estoque_buffer_gravados_total", "counter", "Registros gravados", "gravados"),
+        ("estoque_buffer_lotes_total", "counter", "INSERTs em lote executados", "lotes"),
+        ("estoque_buffer_descartados_total", "counter", "Registros descartados com a fila cheia", "descartados"),
+        ("estoque_buffer_falhas_total", "counter", "Registros perdidos após esgotar as tentativas", "falhas"),
+        ("estoque_buffer_retidos", "gauge", "Registros com falha mantidos na fila para regravação", "retidos"),
+    )
+    estatisticas = [b.estatisticas() for b in BUFFERS]
+    linhas = []
+    for nome, tipo, ajuda, campo in series:
+        linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+        linhas += [f'{nome}{{tabela="{e["tabela"]}"}} {e[campo]}' for e in estatisticas]
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,277 @@
+import bisect
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime
+
+try:
+    from src.codigos.config_supabase import supabase
+except ImportError:  # scripts executados de dentro de src/codigos
+    from config_supabase import supabase
+
+TAMANHO_PAGINA = 1000
+LIMITE_PADRAO = 10
+LIMITE_MAXIMO = 100
+# ✂️ Teto de candidatos avaliados por busca (termos muito curtos, como "a", casam com quase tudo)
+MAX_CANDIDATOS = 2000
+# 🔁 Intervalo da recarga completa do índice (segundos): cobre cadastros feitos por outros processos
+INTERVALO_RECARGA = float(os.getenv("ESTOQUE_BUSCA_RECARGA_S", "900"))
+
+# ⚖️ Pontuação: qualidade do casamento do termo x peso do campo (+ bônus se abre a descrição)
+EXATO, PREFIXO, APROXIMADO = 3.0, 2.0, 0.5
+PESO_DESCRICAO, PESO_MARCA = 1.0, 0.8
+PONTOS_EAN_EXATO, PONTOS_EAN_PREFIXO = 100.0, 50.0
+BONUS_INICIO = 0.5
+SIMILARIDADE_MINIMA = 0.3
+# Onde a palavra aparece no produto (bits guardados no índice invertido)
+NA_DESCRICAO, NA_MARCA, ABRE_DESCRICAO = 1, 2, 4
+
+_PALAVRA = re.compile(r"[a-z0-9]+")
+
+
+# 🔤 Minúsculas sem acento: "Nestlé Açúcar" -> "nestle acucar"
+def normalizar(texto):
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    return "".join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def palavras(texto):
+    return _PALAVRA.findall(normalizar(texto))
+
+
+def _trigramas(palavra):
+    marcada = f" {palavra} "
+    return {marcada[i:i + 3] for i in range(len(marcada) - 2)}
+
+
+# 🧮 Nota de cada combinação de bits para uma qualidade de casamento (consulta por tabela no laço)
+def _tabela_notas(qualidade, primeiro_termo):
+    tabela = []
+    for bits in range(8):
+        nota = qualidade * max(PESO_DESCRICAO if bits & NA_DESCRICAO else 0.0,
+                               PESO_MARCA if bits & NA_MARCA else 0.0)
+        if primeiro_termo and bits & ABRE_DESCRICAO and qualidade >= PREFIXO:
+            nota += BONUS_INICIO
+        tabela.append(nota)
+    return tabela
+
+
+# 🔎 Índice de busca do catálogo: prefixo/trecho de palavras de descrição e marca, trigramas
+# para erros de digitação e prefixo de EAN, com ranking e top-k
+class IndiceBusca:
+    def __init__(self):
+        self._trava = threading.RLock()
+        self._limpar()
+        self.carregado = False
+        self.recarregado_em = None
+        self._parar = threading.Event()
+
+    def _limpar(self):
+        self._produtos = {}  # ean -> (ean, descricao, marca, id_produto)
+        self._palavras_produto = {}  # ean -> {palavras da descrição e da marca}
+        self._por_palavra = {}  # palavra -> {ean: bits NA_DESCRICAO/NA_MARCA/ABRE_DESCRICAO}
+        self._vocabulario = []  # palavras ordenadas (busca por prefixo com bisect)
+        self._por_trigrama = {}  # trigrama -> {palavra}
+        self._eans = []  # EANs ordenados (busca por prefixo de EAN)
+
+    # ➕ Inclui ou atualiza um produto (atualização incremental do índice)
+    def atualizar(self, produto, _ordenar=True):
+        ean = str(produto.get("ean") or "").strip()
+        if not ean:
+            return
+        with self._trava:
+            if ean in self._produtos:
+                self._remover(ean)
+            descricao, marca = produto.get("descricao"), produto.get("marca")
+            self._produtos[ean] = (ean, descricao, marca, produto.get("id_produto"))
+            bits_por_palavra = {}
+            for posicao, palavra in enumerate(palavras(descricao)):
+                bits_por_palavra[palavra] = bits_por_palavra.get(palavra, 0) | NA_DESCRICAO | \
+                    (ABRE_DESCRICAO if posicao == 0 else 0)
+            for palavra in palavras(marca):
+                bits_por_palavra[palavra] = bits_por_palavra.get(palavra, 0) | NA_MARCA
+            self._palavras_produto[ean] = set(bits_por_palavra)
+            for palavra, bits in bits_por_palavra.items():
+                eans = self._por_palavra.get(palavra)
+                if eans is None:
+                    eans = self._por_palavra[palavra] = {}
+                    if _ordenar:
+                        bisect.insort(self._vocabulario, palavra)
+                    for trigrama in _trigramas(palavra):
+                        self._por_trigrama.setdefault(trigrama, set()).add(palavra)
+                eans[ean] = bits
+            if _ordenar:
+                bisect.insort(self._eans, ean)
+
+    def _remover(self, ean):
+        self._produtos.pop(ean)
+        for palavra in self._palavras_produto.pop(ean):
+            eans = self._por_palavra[palavra]
+            eans.pop(ean, None)
+            if not eans:
+                del self._por_palavra[palavra]
+                posicao = bisect.bisect_left(self._vocabulario, palavra)
+                if posicao < len(self._vocabulario) and self._vocabulario[posicao] == palavra:
+                    del self._vocabulario[posicao]
+                for trigrama in _trigramas(palavra):
+                    palavras_trigrama = self._por_trigrama[trigrama]
+                    palavras_trigrama.discard(palavra)
+                    if not palavras_trigrama:
+                        del self._por_trigrama[trigrama]
+        posicao = bisect.bisect_left(self._eans, ean)
+        if posicao < len(self._eans) and self._eans[posicao] == ean:
+            del self._eans[posicao]
+
+    def remover(self, ean):
+        with self._trava:
+            if str(ean).strip() in self._produtos:
+                self._remover(str(ean).strip())
+
+    # 🔄 Recarga completa do catálogo em páginas; troca o índice de uma vez
+    def reconstruir(self):
+        novo = IndiceBusca()
+        inicio = 0
+        while True:
+            pagina = supabase.table("produto").select("*").order("ean") \
+                .range(inicio, inicio + TAMANHO_PAGINA - 1).execute().data or []
+            for produto in pagina:
+                novo.atualizar(produto, _ordenar=False)
+            inicio += TAMANHO_PAGINA
+            if len(pagina) < TAMANHO_PAGINA:
+                break
+        novo._vocabulario = sorted(novo._por_palavra)
+        novo._eans = sorted(novo._produtos)
+
+        with self._trava:
+            self._produtos, self._palavras_produto = novo._produtos, novo._palavras_produto
+            self._por_palavra, self._vocabulario = novo._por_palavra, novo._vocabulario
+            self._por_trigrama, self._eans = novo._por_trigrama, novo._eans
+            self.carregado = True
+            self.recarregado_em = datetime.now().isoformat()
+        print(f"🔎 Índice de busca do catálogo com {len(novo._produtos)} produtos")
+        return len(novo._produtos)
+
+    def garantir_carregado(self):
+        if not self.carregado:
+            self.reconstruir()
+
+    # ⏰ Recarga periódica em uma thread de fundo
+    def iniciar_recarga(self, intervalo=INTERVALO_RECARGA):
+        def executar():
+            while not self._parar.is_set():
+                try:
+                    self.reconstruir()
+                except Exception as e:
+                    print(f"⚠️ Erro ao recarregar o índice de busca: {e}")
+                self._parar.wait(intervalo)
+
+        self._parar.clear()
+        threading.Thread(target=executar, name="recarregar-busca", daemon=True).start()
+
+    def parar_recarga(self):
+        self._parar.set()
+
+    def _com_prefixo(self, ordenados, prefixo):
+        inicio = bisect.bisect_left(ordenados, prefixo)
+        fim = bisect.bisect_left(ordenados, prefixo + "\uffff")
+        return ordenados[inicio:fim]
+
+    # 🧩 Palavras do vocabulário parecidas com o termo (trigramas em comum), para erros de digitação
+    def _aproximadas(self, termo, minimo=SIMILARIDADE_MINIMA):
+        trigramas = _trigramas(termo)
+        contagem = {}
+        for trigrama in trigramas:
+            for palavra in self._por_trigrama.get(trigrama, ()):
+                contagem[palavra] = contagem.get(palavra, 0) + 1
+        similares = [(comuns / len(trigramas | _trigramas(p)), p) for p, comuns in contagem.items()]
+        return [p for similaridade, p in sorted(similares, reverse=True) if similaridade >= minimo]
+
+    # 🎯 Palavras do vocabulário que casam com o termo: exata e por prefixo; aproximadas (mais
+    # parecidas primeiro) se nada casar
+    def _palavras_do_termo(self, termo):
+        casadas = [(termo, EXATO)] if termo in self._por_palavra else []
+        casadas += [(p, PREFIXO) for p in self._com_prefixo(self._vocabulario, termo) if p != termo]
+        if not casadas and len(termo) >= 3:
+            casadas = [(p, APROXIMADO) for p in self._aproximadas(termo)]
+        return casadas
+
+    # 🧮 Melhor nota de cada produto para um termo (só entre os candidatos, quando informados)
+    def _notas_termo(self, casadas, primeiro_termo, candidatos=None, teto=None):
+        notas = {}
+        for palavra, qualidade in casadas:
+            tabela = _tabela_notas(qualidade, primeiro_termo)
+            eans = self._por_palavra[palavra]
+            if candidatos is None:
+                # Sem candidatos ainda: para no teto (as palavras vêm da melhor para a pior)
+                pares = itertools.islice(eans.items(), teto - len(notas)) if teto else eans.items()
+            elif len(candidatos) < len(eans):
+                pares = ((ean, eans[ean]) for ean in candidatos if ean in eans)
+            else:
+                pares = ((ean, bits) for ean, bits in eans.items() if ean in candidatos)
+            for ean, bits in pares:
+                nota = tabela[bits]
+                if nota > notas.get(ean, 0.0):
+                    notas[ean] = nota
+            if teto and len(notas) >= teto:
+                break
+        return notas
+
+    # 🏆 Top-k produtos para o texto digitado
+    def buscar(self, texto, limite=LIMITE_PADRAO):
+        self.garantir_carregado()
+        inicio = time.perf_counter()
+        limite = max(1, min(int(limite or LIMITE_PADRAO), LIMITE_MAXIMO))
+        texto = str(texto or "").strip()
+        termos = palavras(texto)
+        pontos = {}
+
+        with self._trava:
+            if termos:
+                # O termo mais seletivo gera os candidatos; os demais só pontuam quem já está na lista.
+                # O teto de candidatos só vale para busca de um termo (com mais, a interseção já corta)
+                teto = MAX_CANDIDATOS if len(termos) == 1 else None
+                por_termo = [(i == 0, self._palavras_do_termo(termo)) for i, termo in enumerate(termos)]
+                por_termo.sort(key=lambda t: sum(len(self._por_palavra[p]) for p, _ in t[1]))
+                for primeiro, casadas in por_termo:
+                    notas = self._notas_termo(casadas, primeiro, pontos if pontos else None, teto)
+                    if not notas:
+                        pontos = {}
+                        break
+                    pontos = {ean: pontos.get(ean, 0.0) + nota for ean, nota in notas.items()}
+
+            # EAN: texto só de dígitos também é buscado como prefixo de EAN
+            digitos = re.sub(r"\D", "", texto)
+            if digitos and len(digitos) == len(texto.replace(" ", "")):
+                for ean in self._com_prefixo(self._eans, digitos)[:MAX_CANDIDATOS]:
+                    pontos[ean] = PONTOS_EAN_EXATO if ean == digitos else PONTOS_EAN_PREFIXO
+
+            produtos = self._produtos
+            melhores = heapq.nsmallest(limite, ((-nota, len(produtos[ean][1] or ""), ean)
+                                                for ean, nota in pontos.items()))
+            resultados = []
+            for nota, _, ean in melhores:
+                _, descricao, marca, id_produto = produtos[ean]
+                resultados.append({"ean": ean, "descricao": descricao, "marca": marca,
+                                   "id_produto": id_produto, "pontuacao": round(-nota, 2)})
+
+        return {
+            "resultados": resultados,
+            "candidatos": len(pontos),
+            "tempo_ms": round((time.perf_counter() - inicio) * 1000, 3),
+        }
+
+    def estatisticas(self):
+        with self._trava:
+            return {
+                "produtos": len(self._produtos),
+                "palavras": len(self._por_palavra),
+                "trigramas": len(self._por_trigrama),
+                "recarregado_em": self.recarregado_em,
+            }
+
+
+indice_busca = IndiceBusca()
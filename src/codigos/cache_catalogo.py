@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from src.codigos.config_supabase import supabase
+except ImportError:  # scripts executados de dentro de src/codigos
+    from config_supabase import supabase
+
+# ⚙️ Limites do cache do catálogo
+MAX_ITENS = 100_000
+TTL_SEGUNDOS = 600
+TTL_NEGATIVO_SEGUNDOS = 60
+TAMANHO_CONSULTA = 200
+TAMANHO_PAGINA = 1000
+
+_AUSENTE = object()
+
+
+# 🗂️ Cache LRU com TTL do catálogo de produtos, indexado por EAN
+class CacheCatalogo:
+    def __init__(self, max_itens=MAX_ITENS, ttl=TTL_SEGUNDOS, ttl_negativo=TTL_NEGATIVO_SEGUNDOS):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.acertos_negativos = 0
+        self.despejos = 0
+
+    def _ler(self, ean):
+        item = self._itens.get(ean)
+        if item is None:
+            return _AUSENTE
+        expira_em, produto = item
+        if expira_em < time.monotonic():
+            del self._itens[ean]
+            return _AUSENTE
+        self._itens.move_to_end(ean)
+        return produto
+
+    def _gravar(self, ean, produto):
+        ttl = self.ttl if produto is not None else self.ttl_negativo
+        self._itens[ean] = (time.monotonic() + ttl, produto)
+        self._itens.move_to_end(ean)
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+            self.despejos += 1
+
+    # 🔍 Produto pelo EAN (None quando não cadastrado; o "não existe" também fica em cache)
+    def obter(self, ean):
+        return self.obter_varios([ean]).get(str(ean).strip())
+
+    # 🔍 Vários EANs de uma vez: os ausentes do cache são buscados com consultas in_
+    def obter_varios(self, eans):
+        eans = {str(e).strip() for e in eans if e not in (None, "")}
+        encontrados, faltantes = {}, []
+        with self._trava:
+            for ean in eans:
+                produto = self._ler(ean)
+                if produto is _AUSENTE:
+                    self.falhas += 1
+                    faltantes.append(ean)
+                else:
+                    self.acertos += 1
+                    if produto is None:
+                        self.acertos_negativos += 1
+                    encontrados[ean] = produto
+
+        faltantes.sort()
+        for inicio in range(0, len(faltantes), TAMANHO_CONSULTA):
+            lote = faltantes[inicio:inicio + TAMANHO_CONSULTA]
+            res = supabase.table("produto").select("*").in_("ean", lote).execute()
+            por_ean = {str(p["ean"]): p for p in (res.data or [])}
+            with self._trava:
+                for ean in lote:
+                    produto = por_ean.get(ean)
+                    self._gravar(ean, produto)
+                    encontrados[ean] = produto
+        return encontrados
+
+    # 🔥 Carrega o catálogo inteiro (até o limite do cache) em páginas
+    def aquecer(self):
+        carregados = 0
+        inicio = 0
+        while carregados < self.max_itens:
+            res = supabase.table("produto").select("*").order("ean") \
+                .range(inicio, inicio + TAMANHO_PAGINA - 1).execute()
+            pagina = res.data or []
+            with self._trava:
+                for produto in pagina:
+                    self._gravar(str(produto["ean"]), produto)
+            carregados += len(pagina)
+            inicio += TAMANHO_PAGINA
+            if len(pagina) < TAMANHO_PAGINA:
+                break
+        print(f"🔥 Cache do catálogo aquecido com {carregados} produtos")
+        return carregados
+
+    # ♻️ Remove um EAN (ou tudo) do cache; chamado sempre que o catálogo é alterado
+    def invalidar(self, ean=None):
+        with self._trava:
+            if ean is None:
+                self._itens.clear()
+            else:
+                self._itens.pop(str(ean).strip(), None)
+
+    def estatisticas(self):
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                "itens": len(self._itens),
+                "max_itens": self.max_itens,
+                "acertos": self.acertos,
+                "acertos_negativos": self.acertos_negativos,
+                "falhas": self.falhas,
+                "despejos": self.despejos,
+                "taxa_acerto": round(self.acertos / consultas, 4) if consultas else 0.0,
+            }
+
+
+# Instância compartilhada pelo processo
+catalogo = CacheCatalogo()
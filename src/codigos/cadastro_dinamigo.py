@@ -1,31 +1,35 @@
-from supabase import create_client
 from config_supabase import supabase
-
-# ✅ Valida se o EAN é um código numérico de 13 dígitos
-def ean_valido(ean):
-    ean = str(ean).strip()
-    return ean.isdigit() and len(ean) == 13
+from cache_catalogo import catalogo
+from busca_produtos import indice_busca
+import eventos_estoque
+import razao_estoque  # assina eventos_estoque: a entrada também vai para o razão
+# ✅ EAN válido: 13 dígitos com dígito verificador GTIN-13 correto
+from validacao_planilha import ean_valido
 
 # 🔍 Verifica se produto está cadastrado na tabela produto
 def produto_cadastrado(ean):
     ean = str(ean).strip()
     try:
-        res = supabase.table("produto").select("id").eq("ean", ean).execute()
-        return bool(res.data)
+        return catalogo.obter(ean) is not None
     except Exception as e:
         print(f"❌ Erro ao verificar produto: {e}")
         return False
 
-# 🆕 Cadastra novo produto
+# 🆕 Cadastra novo produto (só EAN com dígito verificador GTIN-13 correto)
 def cadastrar_produto(ean, descricao, marca):
     ean = str(ean).strip()
+    if not ean_valido(ean):
+        return {"sucesso": False, "erro": "EAN inválido (GTIN-13)"}
     novo = {
         "ean": ean,
         "descricao": descricao,
         "marca": marca
     }
     try:
-        supabase.table("produto").insert(novo).execute()
+        res = supabase.table("produto").insert(novo).execute()
+        # 🔄 Catálogo e busca enxergam o produto novo na hora
+        catalogo.invalidar(ean)
+        indice_busca.atualizar(res.data[0] if res.data else novo)
         return {"sucesso": True}
     except Exception as e:
         print(f"Erro ao cadastrar produto: {e}")
@@ -34,12 +38,12 @@ def cadastrar_produto(ean, descricao, marca):
 # 🚚 Cadastra produto (se necessário) e registra entrada no estoque
 def cadastrar_e_dar_entrada(ean, descricao, marca, validade, quantidade, usuario_id):
     ean = str(ean).strip()
-    if not ean_valido(ean):
-        return {"erro": "EAN inválido"}
 
     try:
-        # Verifica se produto está cadastrado
+        # Verifica se produto está cadastrado (EAN do catálogo é confiável; o GTIN só vale para EAN novo)
         if not produto_cadastrado(ean):
+            if not ean_valido(ean):
+                return {"erro": "EAN inválido"}
             print("⚠️ Produto não cadastrado. Tentando cadastro dinâmico...")
             if descricao and marca:
                 resultado = cadastrar_produto(ean, descricao, marca)
@@ -63,6 +67,8 @@ def cadastrar_e_dar_entrada(ean, descricao, marca, validade, quantidade, usuario
             "usuario_id": usuario_id
         }
         supabase.table("estoque").insert(entrada).execute()
+        # 📣 Avisa índices e razão (motor de estoque, saldos, validade)
+        eventos_estoque.publicar_movimento("entrada", ean, validade, quantidade, marca, usuario_id=usuario_id)
 
         return {"sucesso": True, "mensagem": "Produto cadastrado e entrada registrada"}
 
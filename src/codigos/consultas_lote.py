@@ -0,0 +1,43 @@
+try:
+    from src.codigos.config_supabase import supabase
+except ImportError:  # scripts executados de dentro de src/codigos
+    from config_supabase import supabase
+
+# 📦 Tamanhos padrão dos lotes (consultas com in_ vão na URL, então são menores)
+TAMANHO_CONSULTA = 200
+TAMANHO_ESCRITA = 500
+
+
+# ✂️ Divide uma sequência em lotes de tamanho fixo
+def dividir_em_lotes(itens, tamanho=TAMANHO_ESCRITA):
+    itens = list(itens)
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+# 🔍 Busca todos os registros cujo valor da coluna esteja na lista (várias consultas in_)
+def buscar_por_valores(tabela, coluna, valores, colunas="*", tamanho=TAMANHO_CONSULTA):
+    valores = sorted({str(v) for v in valores if v not in (None, "")})
+    registros = []
+    for lote in dividir_em_lotes(valores, tamanho):
+        res = supabase.table(tabela).select(colunas).in_(coluna, lote).execute()
+        registros.extend(res.data or [])
+    return registros
+
+
+# 📥 Insere registros em lotes
+def inserir_em_lotes(tabela, registros, tamanho=TAMANHO_ESCRITA):
+    total = 0
+    for lote in dividir_em_lotes(registros, tamanho):
+        supabase.table(tabela).insert(lote).execute()
+        total += len(lote)
+    return total
+
+
+# 🔁 Upsert em lotes (atualiza quando a chave já existe)
+def upsert_em_lotes(tabela, registros, on_conflict="id", tamanho=TAMANHO_ESCRITA):
+    total = 0
+    for lote in dividir_em_lotes(registros, tamanho):
+        supabase.table(tabela).upsert(lote, on_conflict=on_conflict).execute()
+        total += len(lote)
+    return total
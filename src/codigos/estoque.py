@@ -1,8 +1,16 @@
 from datetime import datetime
 import json
 from src.codigos.config_supabase import supabase
-from src.codigos.auth import registrar_movimentacao
 from src.codigos.validacao_produto import validar_campos  # usamos apenas validar_campos aqui
+from src.codigos.baixa_atomica import ajustar_saldo, SaldoInsuficiente, ConflitoConcorrencia
+from src.codigos.eventos_estoque import publicar_movimento
+from src.codigos.buffer_gravacao import BufferGravacao
+from src.codigos import razao_estoque  # noqa: F401 (assina o razão nos eventos; a produtividade sai dele)
+from src.codigos.motor_estoque import motor_estoque
+
+# 📦 Históricos em group commit: operações simultâneas dividem o mesmo INSERT
+_historico_entrada = BufferGravacao("entrada", intervalo_ms=0)
+_historico_saida = BufferGravacao("saida", intervalo_ms=0)
 
 # 📥 Entrada de Produtos com validação
 def entrada_produto(ean, validade, quantidade, usuario_id, descricao, marca):
@@ -51,8 +59,6 @@ def entrada_produto(ean, validade, quantidade, usuario_id, descricao, marca):
                 print(str(e))
                 raise e
 
-        registrar_movimentacao(usuario_id, "entrada", produto["quantidade"])
-
         historico = {
             "ean": produto["ean"],
             "validade": validade_formatada,
@@ -62,8 +68,10 @@ def entrada_produto(ean, validade, quantidade, usuario_id, descricao, marca):
             "marca": produto["marca"],
             "timestamp": datetime.now().isoformat()
         }
-        supabase.table("entrada").insert([historico]).execute()
+        _historico_entrada.adicionar(historico, aguardar=True)
 
+        publicar_movimento("entrada", produto["ean"], validade_formatada, produto["quantidade"],
+                           produto["marca"], momento=historico["timestamp"], usuario_id=usuario_id)
         return {"sucesso": True}
 
     except ValueError as ve:
@@ -82,13 +90,14 @@ def saida_produto(ean, validade, quantidade, usuario_id):
             return {"erro": "Produto com EAN e validade não encontrado"}
 
         produto = estoque.data[0]
-        if produto["saldo"] < quantidade:
-            return {"erro": "Saldo insuficiente"}
-
-        novo_saldo = produto["saldo"] - quantidade
-        supabase.table("estoque").update({"saldo": novo_saldo}).eq("id", produto["id"]).execute()
 
-        registrar_movimentacao(usuario_id, "saida", quantidade)
+        # ⚛️ Baixa com compare-and-set: duas saídas do mesmo lote ao mesmo tempo não perdem atualização
+        try:
+            novo_saldo = ajustar_saldo(produto["id"], -quantidade, produto["saldo"], coluna="saldo")
+        except SaldoInsuficiente:
+            return {"erro": "Saldo insuficiente"}
+        except ConflitoConcorrencia as e:
+            return {"erro": str(e)}
 
         historico = {
             "ean": ean,
@@ -97,8 +106,15 @@ def saida_produto(ean, validade, quantidade, usuario_id):
             "usuario_id": usuario_id,
             "timestamp": datetime.now().isoformat()
         }
-        supabase.table("saida").insert([historico]).execute()
-
+        try:
+            _historico_saida.adicionar(historico, aguardar=True)
+        except Exception:
+            # ↩️ Sem histórico, a baixa é desfeita para o saldo continuar consistente
+            ajustar_saldo(produto["id"], quantidade, novo_saldo, coluna="saldo")
+            raise
+
+        publicar_movimento("saida", ean, validade, quantidade, produto.get("marca"),
+                           momento=historico["timestamp"], saldo=novo_saldo, usuario_id=usuario_id)
         return {"sucesso": True}
 
     except Exception as e:
@@ -107,17 +123,13 @@ def saida_produto(ean, validade, quantidade, usuario_id):
 # 📊 Consultar saldo por EAN
 def consultar_estoque_por_ean(ean):
     try:
-        res = supabase.table("estoque").select("*") \
-            .eq("ean", ean) \
-            .order("validade", desc=False).execute()
-        return res.data
+        return motor_estoque.por_ean(ean)
     except Exception as e:
         return {"erro": f"Erro ao consultar estoque: {str(e)}"}
 
 # 📋 Listar todos os produtos em estoque
 def listar_estoque_completo():
     try:
-        res = supabase.table("estoque").select("*").order("validade", desc=False).execute()
-        return res.data
+        return motor_estoque.listar()
     except Exception as e:
         return {"erro": f"Erro ao listar estoque: {str(e)}"}
\ No newline at end of file
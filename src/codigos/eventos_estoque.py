@@ -0,0 +1,46 @@
+from datetime import datetime
+
+# 📣 Avisos de movimentação de estoque para os índices e agregados em memória.
+# Os caminhos de escrita publicam depois de gravar; os ouvintes nunca derrubam a operação.
+
+_ouvintes = []
+
+
+def assinar(funcao):
+    if funcao not in _ouvintes:
+        _ouvintes.append(funcao)
+    return funcao
+
+
+def cancelar_assinatura(funcao):
+    if funcao in _ouvintes:
+        _ouvintes.remove(funcao)
+
+
+def criar_evento(tipo, ean, validade, quantidade, marca=None, local="galpao", momento=None, **extras):
+    return {
+        "tipo": tipo,  # "entrada", "saida", "transferencia" ou "ajuste"
+        "ean": str(ean).strip(),
+        "validade": validade,
+        "quantidade": quantidade,
+        "marca": marca,
+        "local": local,
+        "momento": momento or datetime.now().isoformat(),
+        **extras,
+    }
+
+
+# 📤 Publica vários eventos de uma vez (importações em lote)
+def publicar_eventos(eventos):
+    eventos = list(eventos)
+    if not eventos:
+        return
+    for ouvinte in list(_ouvintes):
+        try:
+            ouvinte(eventos)
+        except Exception as e:
+            print(f"⚠️ Erro no ouvinte {getattr(ouvinte, '__name__', ouvinte)}: {e}")
+
+
+def publicar_movimento(tipo, ean, validade, quantidade, marca=None, local="galpao", momento=None, **extras):
+    publicar_eventos([criar_evento(tipo, ean, validade, quantidade, marca, local, momento, **extras)])
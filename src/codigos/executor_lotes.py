@@ -0,0 +1,141 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# 🚚 Executor de escritas em massa: divide em lotes, grava vários lotes ao mesmo tempo num pool
+# limitado, repete falhas transitórias com espera exponencial e devolve o resultado de cada item
+TAMANHO_LOTE = int(os.getenv("ESTOQUE_LOTE_TAMANHO", "500"))
+CONCORRENCIA = int(os.getenv("ESTOQUE_LOTE_CONCORRENCIA", "4"))
+MAX_TENTATIVAS = int(os.getenv("ESTOQUE_LOTE_TENTATIVAS", "4"))
+ESPERA_BASE_SEGUNDOS = 0.2
+ESPERA_MAXIMA_SEGUNDOS = 5.0
+
+# Respostas HTTP que valem nova tentativa (timeout, excesso de requisições, servidor indisponível)
+STATUS_TRANSITORIOS = {408, 425, 429, 500, 502, 503, 504}
+# Respostas de quem recusou a requisição antes de processá-la (seguras para repetir um INSERT)
+STATUS_NAO_PROCESSADOS = {429, 503}
+# Erros do httpx em que a requisição nem chegou ao servidor (conexão não aberta)
+ERROS_SEM_ENVIO = ("ConnectError", "ConnectTimeout", "PoolTimeout")
+# Códigos do Postgres: cancelamento por timeout, conflito de serialização, deadlock, conexão
+CODIGOS_TRANSITORIOS = {"57014", "40001", "40P01", "08000", "08003", "08006", "53300"}
+
+
+# 🌩️ Falha que pode passar sozinha (rede, timeout, 5xx/429, banco ocupado)?
+def erro_transitorio(erro):
+    if isinstance(erro, (ConnectionError, TimeoutError)):
+        return True
+    if isinstance(erro, sqlite3.OperationalError):
+        return "locked" in str(erro) or "busy" in str(erro)
+    # httpx (cliente do supabase-py): erros de transporte, sem importar o pacote
+    if any(classe.__name__ in ("TransportError", "TimeoutException") for classe in type(erro).__mro__):
+        return True
+    resposta = getattr(erro, "response", None)
+    status = getattr(erro, "status_code", None) or getattr(resposta, "status_code", None)
+    if status in STATUS_TRANSITORIOS:
+        return True
+    return str(getattr(erro, "code", None)) in CODIGOS_TRANSITORIOS
+
+
+# 🛡️ A escrita com certeza não foi aplicada (conexão recusada, 429/503, banco local ocupado)?
+# Só nesses casos uma escrita não idempotente (INSERT) pode ser repetida sem duplicar linhas
+def erro_nao_enviado(erro):
+    if isinstance(erro, ConnectionRefusedError):
+        return True
+    if isinstance(erro, sqlite3.OperationalError):
+        return "locked" in str(erro) or "busy" in str(erro)
+    if any(classe.__name__ in ERROS_SEM_ENVIO for classe in type(erro).__mro__):
+        return True
+    resposta = getattr(erro, "response", None)
+    status = getattr(erro, "status_code", None) or getattr(resposta, "status_code", None)
+    return status in STATUS_NAO_PROCESSADOS
+
+
+def _espera(tentativa):
+    limite = min(ESPERA_MAXIMA_SEGUNDOS, ESPERA_BASE_SEGUNDOS * (2 ** tentativa))
+    return random.uniform(0, limite)
+
+
+# 🔁 Chama `funcao(*args)` repetindo falhas transitórias; devolve (retorno, repetições).
+# Com idempotente=False só repete o que com certeza não chegou a ser aplicado
+def com_tentativas(funcao, *args, tentativas=MAX_TENTATIVAS, idempotente=True):
+    repetir = erro_transitorio if idempotente else erro_nao_enviado
+    for tentativa in range(tentativas):
+        try:
+            return funcao(*args), tentativa
+        except Exception as erro:
+            if tentativa == tentativas - 1 or not repetir(erro):
+                raise
+            time.sleep(_espera(tentativa))
+
+
+# 🚀 Executa `gravar_lote(lote)` para todos os itens, em lotes paralelos
+def executar_em_lotes(itens, gravar_lote, tamanho=None, concorrencia=None, tentativas=None, descricao="itens",
+                      idempotente=True):
+    """
+    `gravar_lote(lote)` grava uma lista de itens e devolve uma lista de retornos alinhada com
+    ela (ex.: `res.data` de um insert) ou None. Um lote que falha de vez (erro permanente ou
+    tentativas esgotadas) é refeito item a item, para que só as linhas com problema fiquem de fora.
+
+    Para escritas que duplicam se repetidas (INSERT sem chave natural), use idempotente=False:
+    só falhas sem envio são repetidas, e um lote com resultado incerto (timeout de leitura, 5xx,
+    conexão caída no meio) não é refeito: todos os itens dele voltam como falha.
+
+    Retorna {"ok": [(indice, retorno)], "falhas": [(indice, mensagem)], "lotes": n, "repeticoes": n},
+    com `indice` = posição do item em `itens`.
+    """
+    itens = list(itens)
+    tamanho = tamanho or TAMANHO_LOTE
+    concorrencia = max(1, concorrencia or CONCORRENCIA)
+    tentativas = max(1, tentativas or MAX_TENTATIVAS)
+    resultado = {"ok": [], "falhas": [], "lotes": 0, "repeticoes": 0}
+    trava = threading.Lock()
+
+    def anotar(ok=(), falhas=(), repeticoes=0):
+        with trava:
+            resultado["ok"].extend(ok)
+            resultado["falhas"].extend(falhas)
+            resultado["repeticoes"] += repeticoes
+
+    def processar(inicio):
+        lote = itens[inicio:inicio + tamanho]
+        try:
+            retornos, repeticoes = com_tentativas(gravar_lote, lote, tentativas=tentativas, idempotente=idempotente)
+            retornos = list(retornos or [])
+            anotar(ok=[(inicio + i, retornos[i] if i < len(retornos) else None) for i in range(len(lote))],
+                   repeticoes=repeticoes)
+            return
+        except Exception as erro:
+            if not idempotente and erro_transitorio(erro) and not erro_nao_enviado(erro):
+                # O lote pode ter sido gravado: refazer duplicaria as linhas
+                mensagem = f"resultado incerto, confira antes de reenviar ({erro})"
+                anotar(falhas=[(inicio + i, mensagem) for i in range(len(lote))])
+                return
+            if len(lote) == 1:
+                anotar(falhas=[(inicio, str(erro))])
+                return
+            print(f"⚠️ Lote de {len(lote)} {descricao} falhou ({erro}); refazendo item a item")
+
+        # 🔍 Isola as linhas com problema: cada item do lote vira um lote de um
+        for i, item in enumerate(lote):
+            try:
+                retornos, repeticoes = com_tentativas(gravar_lote, [item], tentativas=tentativas,
+                                                      idempotente=idempotente)
+                anotar(ok=[(inicio + i, (retornos or [None])[0])], repeticoes=repeticoes)
+            except Exception as erro:
+                anotar(falhas=[(inicio + i, str(erro))])
+
+    inicios = range(0, len(itens), tamanho)
+    resultado["lotes"] = len(inicios)
+    if concorrencia == 1 or len(inicios) <= 1:
+        for inicio in inicios:
+            processar(inicio)
+    else:
+        with ThreadPoolExecutor(max_workers=concorrencia, thread_name_prefix="executor-lotes") as pool:
+            list(pool.map(processar, inicios))
+
+    resultado["ok"].sort(key=lambda par: par[0])
+    resultado["falhas"].sort()
+    return resultado
@@ -0,0 +1,199 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+from openpyxl import Workbook
+
+try:
+    from src.codigos.repositorio import eq, gte, lte
+    from src.codigos.paginacao import percorrer, TAMANHO_PAGINA
+except ImportError:  # scripts executados de dentro de src/codigos
+    from repositorio import eq, gte, lte
+    from paginacao import percorrer, TAMANHO_PAGINA
+
+# 📤 Recursos exportáveis: tabela, coluna de ordenação (keyset), ordem decrescente, coluna de data
+RECURSOS = {
+    "movimentacoes": ("movimentacoes", "data_mov", True, "data_mov"),
+    "entradas": ("entrada", "id", True, "timestamp"),
+    "saidas": ("saida", "id", True, "data_saida"),
+    "razao": ("razao_estoque", "id", True, "momento"),
+    "estoque": ("estoque", "validade", False, "validade"),
+    "estoque_loja": ("estoque_loja", "validade", False, "validade"),
+}
+# Tabelas com a coluna tipo (nas outras o filtro por tipo é ignorado)
+TABELAS_COM_TIPO = {"movimentacoes", "razao_estoque"}
+FORMATOS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+TAMANHO_PEDACO = 64 * 1024
+
+
+# 🧩 Filtros PostgREST comuns a todas as exportações
+def montar_filtros(coluna_data, ean=None, tipo=None, data_inicio=None, data_fim=None):
+    filtros = {}
+    if ean:
+        filtros["ean"] = eq(ean)
+    if tipo:
+        filtros["tipo"] = eq(tipo)
+    if data_inicio and data_fim:
+        filtros["and"] = f"({coluna_data}.gte.{data_inicio},{coluna_data}.lte.{data_fim})"
+    elif data_inicio:
+        filtros[coluna_data] = gte(data_inicio)
+    elif data_fim:
+        filtros[coluna_data] = lte(data_fim)
+    return filtros
+
+
+def _celula(valor):
+    if isinstance(valor, (dict, list)):
+        return str(valor)
+    return valor
+
+
+# 📗 Grava linhas num .xlsx em modo write_only (cada linha vai para o disco, não fica na memória)
+def escrever_xlsx(linhas, caminho, titulo="Dados"):
+    livro = Workbook(write_only=True)
+    aba = livro.create_sheet(titulo)
+    colunas = None
+    total = 0
+    for linha in linhas:
+        if colunas is None:
+            colunas = list(linha)
+            aba.append(colunas)
+        aba.append([_celula(linha.get(c)) for c in colunas])
+        total += 1
+    livro.save(caminho)
+    return total
+
+
+# 📄 CSV em pedaços de texto, uma página de linhas por vez
+async def gerar_csv(tabela, filtros, coluna, desc=False):
+    buffer = io.StringIO()
+    escritor = None
+    pendentes = 0
+    buffer.write("\ufeff")  # BOM para o Excel reconhecer os acentos
+    async for linha in percorrer(tabela, filtros, coluna, desc):
+        if escritor is None:
+            escritor = csv.DictWriter(buffer, fieldnames=list(linha), extrasaction="ignore")
+            escritor.writeheader()
+        escritor.writerow({k: _celula(v) for k, v in linha.items()})
+        pendentes += 1
+        if pendentes >= TAMANHO_PAGINA:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pendentes = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+# 🗜️ Destino do zip sem seek: o zipfile grava em modo streaming e o que já foi comprimido é
+# retirado aos pedaços para a resposta
+class _SaidaZip(io.RawIOBase):
+    def __init__(self):
+        self._pedacos = []
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._pedacos.append(bytes(dados))
+        return len(dados)
+
+    def retirar(self):
+        dados = b"".join(self._pedacos)
+        self._pedacos.clear()
+        return dados
+
+
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_PARTES_FIXAS = {
+    "[Content_Types].xml": _XML + (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    "_rels/.rels": _XML + (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+    "xl/_rels/workbook.xml.rels": _XML + (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'),
+}
+# Caracteres de controle que o XML não aceita (o openpyxl também os recusa)
+_INVALIDOS_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _celula_xml(valor):
+    valor = _celula(valor)
+    if valor is None:
+        return "<c/>"
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        return f"<c><v>{valor}</v></c>"
+    if isinstance(valor, (date, datetime)):
+        valor = valor.isoformat()
+    texto = escape(_INVALIDOS_XML.sub("", str(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linha_xml(valores):
+    return "<row>" + "".join(_celula_xml(v) for v in valores) + "</row>"
+
+
+# 📗 XLSX em fluxo: a planilha (texto inline, sem tabela de strings compartilhadas) é escrita
+# direto no zip conforme as páginas chegam, e cada página comprimida já segue para o cliente
+async def gerar_xlsx(tabela, filtros, coluna, desc=False):
+    saida = _SaidaZip()
+    with zipfile.ZipFile(saida, "w", zipfile.ZIP_DEFLATED) as pacote:
+        for nome, conteudo in _PARTES_FIXAS.items():
+            pacote.writestr(nome, conteudo)
+        pacote.writestr("xl/workbook.xml", _XML + (
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(tabela[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>'))
+        with pacote.open("xl/worksheets/sheet1.xml", "w") as planilha:
+            planilha.write((_XML + '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                            '<sheetData>').encode())
+            colunas = None
+            pendentes = []
+            async for linha in percorrer(tabela, filtros, coluna, desc):
+                if colunas is None:
+                    colunas = list(linha)
+                    pendentes.append(_linha_xml(colunas))
+                pendentes.append(_linha_xml([linha.get(c) for c in colunas]))
+                if len(pendentes) >= TAMANHO_PAGINA:
+                    planilha.write("".join(pendentes).encode())
+                    pendentes = []
+                    pedaco = saida.retirar()
+                    if pedaco:
+                        yield pedaco
+            planilha.write(("".join(pendentes) + "</sheetData></worksheet>").encode())
+    yield saida.retirar()
+
+
+# 🚚 Escolhe o recurso e o formato; devolve (gerador, tipo de conteúdo, nome do arquivo)
+def exportar(recurso, formato="csv", **filtros):
+    if recurso not in RECURSOS:
+        raise ValueError(f"Recurso inválido: {recurso}. Use {', '.join(RECURSOS)}")
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato inválido: {formato}. Use csv ou xlsx")
+    tabela, coluna, desc, coluna_data = RECURSOS[recurso]
+    if tabela not in TABELAS_COM_TIPO:
+        filtros.pop("tipo", None)
+    filtros = montar_filtros(coluna_data, **filtros)
+    gerador = gerar_csv if formato == "csv" else gerar_xlsx
+    return gerador(tabela, filtros, coluna, desc), FORMATOS[formato], f"{recurso}.{formato}"
@@ -0,0 +1,264 @@
+import hashlib
+from collections import Counter
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    from src.codigos.config_supabase import supabase
+    from src.codigos import eventos_estoque
+    from src.codigos.baixa_atomica import ajustar_saldo
+    from src.codigos.consultas_lote import buscar_por_valores, dividir_em_lotes, inserir_em_lotes, upsert_em_lotes
+    from src.codigos.executor_lotes import executar_em_lotes
+except ImportError:  # scripts executados de dentro de src/codigos
+    from config_supabase import supabase
+    import eventos_estoque
+    from baixa_atomica import ajustar_saldo
+    from consultas_lote import buscar_por_valores, dividir_em_lotes, inserir_em_lotes, upsert_em_lotes
+    from executor_lotes import executar_em_lotes
+
+# 🧾 Impressões digitais das importações: hash do arquivo inteiro (reenvio idêntico não faz nada)
+# e, por linha, chave + impressão do conteúdo + id do lote gravado (reenvio alterado vira delta)
+TABELA_ARQUIVOS = "importacao_arquivo"  # último arquivo de cada origem
+TABELA_HASHES = "importacao_hash"  # todo arquivo já importado em cada tabela, com ou sem origem
+TABELA_LINHAS = "importacao_linha"
+TAMANHO_PAGINA = 1000
+# Colunas que definem o conteúdo de uma linha (mudou alguma delas = linha alterada)
+CAMPOS_IMPRESSAO = ("quantidade", "descricao", "marca")
+LOCAIS = {"estoque": "galpao", "estoque_loja": "loja"}
+
+
+# #️⃣ Hash SHA-256 do arquivo, lido em pedaços (não carrega o arquivo inteiro)
+def hash_arquivo(caminho, tamanho=1 << 20):
+    resumo = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for pedaco in iter(lambda: arquivo.read(tamanho), b""):
+            resumo.update(pedaco)
+    return resumo.hexdigest()
+
+
+def _impressao(valores):
+    return hashlib.blake2b("\x1f".join(str(v) for v in valores).encode(), digest_size=12).hexdigest()
+
+
+# 🔁 Estado de uma reimportação: o que já foi gravado desta origem e o que a planilha atual traz.
+# A origem identifica a planilha de verdade (ex.: "loja-12:planilha-semanal") e é escolhida por quem
+# chama, nunca o nome do arquivo. Sem origem, todas as linhas entram como novas (importação simples),
+# mas um arquivo idêntico a um já importado na mesma tabela continua sendo ignorado.
+class ImportacaoIncremental:
+    """
+    Uso:
+        incremental = ImportacaoIncremental(origem, caminho)
+        if incremental.ja_importado(): ...                      # mesmo arquivo: nada a fazer
+        gravadas, inalteradas, erros = incremental.aplicar(validos, montar_item)   # a cada bloco
+        removidas, erros = incremental.remover_ausentes()       # linhas que saíram da planilha
+        incremental.concluir(linhas)                            # só se não houve erro de gravação
+
+    Toda mudança de saldo vira evento em eventos_estoque (entrada para linha nova, ajuste com o
+    delta para linha alterada ou removida). Quantidades alteradas são aplicadas como delta por
+    compare-and-set (baixa_atomica), preservando as saídas feitas desde a importação anterior.
+    """
+
+    def __init__(self, origem, caminho, tabela="estoque"):
+        self.origem = str(origem).strip() if origem is not None else None
+        if origem is not None and not self.origem:
+            raise ValueError("Origem da importação vazia: informe loja + identificador da planilha")
+        self.tabela = tabela
+        self.hash = hash_arquivo(caminho)
+        self._anteriores = None  # chave -> registro de importacao_linha
+        self._ocorrencias = Counter()
+        self._vistas = set()
+
+    # ⏭️ O mesmo conteúdo já foi importado com sucesso? Com origem já importada, compara com o último
+    # arquivo dela (voltar a um arquivo anterior é uma mudança e vira delta); sem origem ou na primeira
+    # importação da origem, com todo arquivo já importado na tabela
+    def ja_importado(self):
+        if self.origem:
+            res = supabase.table(TABELA_ARQUIVOS).select("hash").eq("origem", self.origem).limit(1).execute()
+            if res.data:
+                return res.data[0]["hash"] == self.hash
+        res = supabase.table(TABELA_HASHES).select("id").eq("tabela", self.tabela) \
+            .eq("hash", self.hash).limit(1).execute()
+        return bool(res.data)
+
+    # 🏷️ Como o arquivo aparece nas mensagens
+    @property
+    def descricao(self):
+        return self.origem or f"Arquivo {self.hash[:12]}"
+
+    def _carregar(self):
+        self._anteriores = {}
+        if not self.origem:
+            return
+        inicio = 0
+        while True:
+            pagina = supabase.table(TABELA_LINHAS).select("*").eq("origem", self.origem).order("id") \
+                .range(inicio, inicio + TAMANHO_PAGINA - 1).execute().data or []
+            for registro in pagina:
+                self._anteriores[registro["chave"]] = registro
+            inicio += TAMANHO_PAGINA
+            if len(pagina) < TAMANHO_PAGINA:
+                break
+
+    # 🔀 Separa as linhas válidas de um bloco em novas, alteradas e inalteradas.
+    # Chave = ean|validade|ocorrência (linhas repetidas no arquivo são distinguidas pela ordem)
+    def classificar(self, validos):
+        if self._anteriores is None:
+            self._carregar()
+        validos = validos.copy()
+        anteriores = self._anteriores
+        chaves, impressoes, situacao = [], [], []  # situação: 0 nova, 1 alterada, 2 inalterada
+        for linha in zip(validos["ean"], validos["validade"], *(validos[c] for c in CAMPOS_IMPRESSAO)):
+            base = f"{linha[0]}|{linha[1]}"
+            self._ocorrencias[base] += 1
+            chave = f"{base}|{self._ocorrencias[base]}"
+            impressao = _impressao(linha[2:])
+            anterior = anteriores.get(chave)
+            chaves.append(chave)
+            impressoes.append(impressao)
+            situacao.append(0 if anterior is None else 2 if anterior["impressao"] == impressao else 1)
+        validos["chave"] = chaves
+        validos["impressao"] = impressoes
+        self._vistas.update(chaves)
+
+        situacao = pd.Series(situacao, index=validos.index, dtype="int8")
+        novos = validos[situacao == 0]
+        alterados = validos[situacao == 1].copy()
+        alterados["id_estoque"] = [anteriores[c]["id_estoque"] for c in alterados["chave"]]
+        return novos, alterados, int((situacao == 2).sum())
+
+    def _evento(self, tipo, item, quantidade, tabela):
+        return eventos_estoque.criar_evento(tipo, item.get("ean"), item.get("validade"), quantidade,
+                                            item.get("marca"), local=LOCAIS.get(tabela, "galpao"))
+
+    # 📥 Aplica o delta de um bloco no estoque: insere as linhas novas em lotes paralelos
+    # (executor_lotes), soma a diferença de quantidade das alteradas e guarda as impressões das que
+    # foram gravadas. `montar_item(linha)` monta o registro da tabela estoque.
+    # Devolve (gravadas, inalteradas, erros)
+    def aplicar(self, validos, montar_item, tabela="estoque"):
+        novos, alterados, inalteradas = self.classificar(validos)
+        novos = list(novos.itertuples(index=False))
+        alterados = list(alterados.itertuples(index=False))
+
+        itens_novos = [montar_item(linha) for linha in novos]
+        inseridos = executar_em_lotes(
+            itens_novos,
+            lambda lote: supabase.table(tabela).insert(lote).execute().data,
+            descricao=f"linhas de {tabela}",
+            idempotente=False,
+        )
+        atualizados = self._aplicar_alterados(alterados, montar_item, tabela)
+
+        erros = [(novos[i].linha, mensagem) for i, mensagem in inseridos["falhas"]]
+        erros += [(alterados[i].linha, mensagem) for i, mensagem in atualizados["falhas"]]
+        eventos_estoque.publicar_eventos(
+            [self._evento("entrada", itens_novos[i], itens_novos[i]["quantidade"], tabela)
+             for i, _ in inseridos["ok"]]
+            + [evento for _, evento in atualizados["ok"] if evento]
+        )
+        if self.origem:
+            inserir_em_lotes(TABELA_LINHAS, [
+                {"origem": self.origem, "chave": novos[i].chave, "impressao": novos[i].impressao,
+                 "quantidade": itens_novos[i]["quantidade"], "id_estoque": (registro or {}).get("id")}
+                for i, registro in inseridos["ok"]
+            ])
+            upsert_em_lotes(TABELA_LINHAS, [
+                {**self._anteriores[alterados[i].chave], "impressao": alterados[i].impressao,
+                 "quantidade": int(alterados[i].quantidade)}
+                for i, _ in atualizados["ok"]
+            ])
+        gravadas = len(inseridos["ok"]) + len(atualizados["ok"])
+        return gravadas, inalteradas, [f"Linha {linha}: {mensagem}" for linha, mensagem in sorted(erros)]
+
+    # ✏️ Linha alterada: a quantidade muda pelo delta (nova - importada antes) com compare-and-set
+    # sobre o saldo atual do lote; descrição e marca são atualizadas à parte
+    def _aplicar_alterados(self, alterados, montar_item, tabela):
+        atuais = {r["id"]: r for r in buscar_por_valores(tabela, "id", [l.id_estoque for l in alterados],
+                                                           colunas="id,quantidade,descricao,marca")}
+
+        def aplicar_linha(lote):
+            linha = lote[0]
+            item = montar_item(linha)
+            atual = atuais.get(linha.id_estoque)
+            if atual is None:
+                raise ValueError("lote da importação anterior não existe mais")
+            anterior = int(self._anteriores[linha.chave].get("quantidade") or 0)
+            delta = item["quantidade"] - anterior
+            if delta:
+                ajustar_saldo(linha.id_estoque, delta, int(atual["quantidade"] or 0), coluna="quantidade",
+                              tabela=tabela)
+            campos = {c: item[c] for c in ("descricao", "marca") if item.get(c) != atual.get(c)}
+            if campos:
+                supabase.table(tabela).update(campos).eq("id", linha.id_estoque).execute()
+            return [self._evento("ajuste", item, delta, tabela) if delta else None]
+
+        # Um lote por linha: um delta nunca é reaplicado por causa da falha de outra linha
+        return executar_em_lotes(alterados, aplicar_linha, tamanho=1, tentativas=1,
+                                 descricao=f"linhas alteradas de {tabela}", idempotente=False)
+
+    # 🗑️ Linhas da importação anterior que saíram da planilha: a quantidade que cada uma trouxe sai
+    # do lote (ajuste negativo, limitado ao saldo atual). O lote só é apagado se nunca foi movimentado
+    # (saldo igual ao importado e nenhuma saída registrada). Devolve (removidas, erros)
+    def remover_ausentes(self, tabela="estoque"):
+        if self._anteriores is None:
+            self._carregar()
+        ausentes = [r for chave, r in self._anteriores.items() if chave not in self._vistas]
+        if not ausentes:
+            return 0, []
+        ids = [r["id_estoque"] for r in ausentes if r.get("id_estoque") is not None]
+        try:
+            atuais = {r["id"]: r for r in buscar_por_valores(tabela, "id", ids,
+                                                               colunas="id,ean,validade,marca,quantidade")}
+            movimentados = {r["id_estoque"] for r in buscar_por_valores("saida", "id_estoque", ids,
+                                                                          colunas="id_estoque")}
+        except Exception as e:
+            return 0, [f"Erro ao ler os lotes da importação anterior: {e}"]
+
+        removidas, erros, eventos = [], [], []
+        for registro in ausentes:
+            atual = atuais.get(registro.get("id_estoque"))
+            if atual is None:  # lote já não existe: só esquece a linha
+                removidas.append(registro["id"])
+                continue
+            importada = int(registro.get("quantidade") or 0)
+            saldo = int(atual["quantidade"] or 0)
+            retirar = min(importada, saldo)
+            try:
+                # DELETE condicionado ao saldo lido: uma saída simultânea faz cair no ajuste
+                apagado = saldo == importada and atual["id"] not in movimentados and \
+                    supabase.table(tabela).delete().eq("id", atual["id"]).eq("quantidade", saldo).execute().data
+                if not apagado and retirar:
+                    ajustar_saldo(atual["id"], -retirar, saldo, coluna="quantidade", tabela=tabela)
+            except Exception as e:
+                erros.append(f"Erro ao desfazer a linha {registro['chave']} da importação anterior: {e}")
+                continue
+            removidas.append(registro["id"])
+            if retirar:
+                eventos.append(self._evento("ajuste", atual, -retirar, tabela))
+
+        eventos_estoque.publicar_eventos(eventos)
+        try:
+            for lote in dividir_em_lotes(removidas):
+                supabase.table(TABELA_LINHAS).delete().in_("id", lote).execute()
+        except Exception as e:
+            erros.append(f"Erro ao remover linhas da importação anterior: {e}")
+        return len(removidas), erros
+
+    # ✅ Marca o arquivo como importado (só depois de tudo gravado sem erro)
+    def concluir(self, linhas):
+        agora = datetime.now().isoformat()
+        supabase.table(TABELA_HASHES).upsert({
+            "tabela": self.tabela,
+            "hash": self.hash,
+            "origem": self.origem,
+            "linhas": linhas,
+            "importado_em": agora,
+        }, on_conflict="tabela,hash").execute()
+        if not self.origem:
+            return
+        supabase.table(TABELA_ARQUIVOS).upsert({
+            "origem": self.origem,
+            "hash": self.hash,
+            "linhas": linhas,
+            "importado_em": agora,
+        }, on_conflict="origem").execute()
@@ -0,0 +1,149 @@
+from datetime import datetime
+import pandas as pd
+
+from src.codigos.eventos_estoque import criar_evento, publicar_eventos
+from src.codigos.baixa_atomica import ajustar_saldo
+from src.codigos.executor_lotes import executar_em_lotes
+from src.codigos.validacao_planilha import ValidadorPlanilha
+from src.codigos.consultas_lote import (
+    buscar_por_valores,
+    dividir_em_lotes,
+    inserir_em_lotes,
+)
+
+
+# ✅ Valida e normaliza a planilha inteira de uma vez (pipeline compartilhado com os outros importadores)
+def validar_entradas(df, linha_inicial=1, validador=None):
+    """
+    Retorna (validos, erros). `validos` tem as colunas ean, validade, quantidade,
+    usuario_id, nome, marca e linha; `erros` é a lista de (linha, mensagem).
+    Passe o mesmo `validador` para todos os blocos de um arquivo (duplicados entre blocos).
+    """
+    validador = validador or ValidadorPlanilha("entrada")
+    validos, erros = validador.validar(df, linha_inicial)
+    usuario_id = validos["usuario_id"] if "usuario_id" in validos.columns else "sistema"
+    validos = pd.DataFrame({
+        "ean": validos["ean"],
+        "validade": validos["validade"],
+        "quantidade": validos["quantidade"],
+        "usuario_id": pd.Series(usuario_id, index=validos.index).fillna("sistema").astype(str).str.strip()
+        .replace("", "sistema"),
+        "nome": validos["descricao"].replace("", "GENÉRICO").str.upper(),
+        "marca": validos["marca"].replace("", "Marca desconhecida"),
+        "linha": validos["linha"],
+    })
+    return validos, erros
+
+
+# 📥 Aplica as entradas válidas no estoque com consultas e escritas em lote
+def aplicar_entradas(validos):
+    """
+    Agrupa linhas repetidas de (ean, validade), busca os saldos atuais do arquivo
+    inteiro em poucas consultas, soma a quantidade aos lotes existentes por
+    compare-and-set, insere os lotes novos e grava o histórico em lotes.
+    Retorna (linhas_importadas, erros); linhas_importadas conta o que entrou no saldo,
+    mesmo que o histórico delas tenha falhado (a falha vai para `erros`).
+    """
+    if validos.empty:
+        return 0, []
+
+    grupos = validos.groupby(["ean", "validade"], sort=False).agg(
+        quantidade=("quantidade", "sum"),
+        nome=("nome", "first"),
+        marca=("marca", "first"),
+        linhas=("linha", list),
+    ).reset_index()
+
+    existentes = {}
+    for registro in buscar_por_valores("estoque", "ean", grupos["ean"].unique()):
+        existentes.setdefault((registro["ean"], str(registro["validade"])), registro)
+
+    ajustes, novos = [], []
+    for grupo in grupos.to_dict("records"):
+        atual = existentes.get((grupo["ean"], grupo["validade"]))
+        if atual:
+            ajustes.append({**grupo, "id": atual["id"], "saldo_lido": int(atual.get("saldo") or 0)})
+        else:
+            novos.append(grupo)
+
+    erros = []
+    linhas_gravadas = []
+    # ⚛️ Lotes que já existem: a quantidade entra como delta por compare-and-set, sem sobrescrever
+    # as baixas feitas depois da leitura dos saldos
+    resultado = executar_em_lotes(
+        ajustes,
+        lambda lote: [ajustar_saldo(lote[0]["id"], int(lote[0]["quantidade"]), lote[0]["saldo_lido"],
+                                    coluna="saldo", tabela="estoque")],
+        tamanho=1, tentativas=1, descricao="entradas em lotes existentes", idempotente=False,
+    )
+    for i, _ in resultado["ok"]:
+        linhas_gravadas.extend(ajustes[i]["linhas"])
+    for i, mensagem in resultado["falhas"]:
+        erros.extend((linha, f"Erro inesperado: {mensagem}") for linha in ajustes[i]["linhas"])
+
+    # 🆕 Só as chaves que ainda não existem viram linhas novas
+    for lote in dividir_em_lotes(novos):
+        linhas_lote = [linha for grupo in lote for linha in grupo["linhas"]]
+        try:
+            inserir_em_lotes("estoque", [{
+                "ean": grupo["ean"],
+                "validade": grupo["validade"],
+                "saldo": int(grupo["quantidade"]),
+                "nome": grupo["nome"],
+                "marca": grupo["marca"],
+            } for grupo in lote])
+            linhas_gravadas.extend(linhas_lote)
+        except Exception as e:
+            erros.extend((linha, f"Erro inesperado: {e}") for linha in linhas_lote)
+
+    gravados = validos[validos["linha"].isin(linhas_gravadas)]
+    agora = datetime.now().isoformat()
+    historico = gravados.drop(columns="linha").assign(timestamp=agora)
+    historico["quantidade"] = historico["quantidade"].astype(int)
+    try:
+        # A produtividade sai do razão (eventos abaixo): sem gravação à parte
+        inserir_em_lotes("entrada", historico.to_dict("records"))
+    except Exception as e:
+        # O saldo já foi gravado: as linhas contam como importadas e só o histórico é reportado
+        erros.extend((linha, f"Saldo atualizado, mas o histórico não foi gravado: {e}")
+                     for linha in gravados["linha"])
+
+    publicar_eventos(
+        criar_evento("entrada", r["ean"], r["validade"], r["quantidade"], r["marca"], momento=agora,
+                     usuario_id=r["usuario_id"])
+        for r in historico.to_dict("records")
+    )
+    return len(gravados), erros
+
+
+# 🚀 Importação completa de um DataFrame: validação vetorizada + gravação em lote
+def importar_entradas_em_lote(df, linha_inicial=1, validador=None):
+    validos, erros = validar_entradas(df, linha_inicial, validador)
+    importados, erros_gravacao = aplicar_entradas(validos)
+    erros = sorted(erros + erros_gravacao)
+    return {
+        "registros_importados": importados,
+        "erros": [f"Linha {linha}: {mensagem}" for linha, mensagem in erros],
+    }
+
+
+# 🌊 Importação em fluxo: cada bloco lido passa pela validação e pela gravação
+def importar_entradas_em_blocos(blocos, job=None):
+    """
+    Recebe um iterável de (linha_inicial, DataFrame), como o de `ler_em_blocos`,
+    e acumula apenas os contadores e as mensagens de erro entre os blocos.
+    Com `job` (ver jobs_importacao), o progresso é publicado a cada bloco.
+    """
+    if job:
+        blocos = job.acompanhar(blocos)
+    registros_importados = 0
+    erros = []
+    validador = ValidadorPlanilha("entrada")
+    for linha_inicial, bloco in blocos:
+        resultado = importar_entradas_em_lote(bloco, linha_inicial, validador)
+        registros_importados += resultado["registros_importados"]
+        erros.extend(resultado["erros"])
+        if job:
+            job.registrar_bloco(len(bloco), resultado["registros_importados"], resultado["erros"])
+    return {"registros_importados": registros_importados, "erros": erros,
+            "avisos": validador.relatorio()["avisos"]}
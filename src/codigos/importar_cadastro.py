@@ -1,47 +1,49 @@
 import pandas as pd
 from config_supabase import supabase
+from cache_catalogo import catalogo
+from busca_produtos import indice_busca
+from executor_lotes import executar_em_lotes
+from validacao_planilha import ValidadorPlanilha, simular_importacao
 
-def ean_valido(ean):
-    ean = str(ean).strip()
-    return ean.isdigit() and len(ean) == 13
-
-def importar_cadastro_excel(caminho_arquivo):
+# 📥 Importa o cadastro de produtos; com simular=True só valida e devolve o relatório
+def importar_cadastro_excel(caminho_arquivo, simular=False):
     try:
         df = pd.read_excel(caminho_arquivo)
-        df.columns = [col.lower().strip() for col in df.columns]
-
-        registros_importados = 0
-        registros_duplicados = 0
-        registros_invalidos = 0
-
-        for _, linha in df.iterrows():
-            try:
-                ean = str(linha["ean"]).strip().upper()
-                marca = str(linha["marca"]).strip().title()
-                descricao = str(linha["descricao"]).strip().title()
-
-                if not ean_valido(ean) or not marca or not descricao:
-                    registros_invalidos += 1
-                    continue
-
-                # Verifica se já existe
-                res = supabase.table("produto").select("id").eq("ean", ean).execute()
-                if res.data:
-                    registros_duplicados += 1
-                    continue
-
-                produto = {
-                    "ean": ean,
-                    "marca": marca,
-                    "descricao": descricao
-                }
-
-                supabase.table("produto").insert(produto).execute()
-                registros_importados += 1
 
-            except Exception as item_erro:
-                print(f"❌ Erro ao importar produto: {item_erro}")
-                registros_invalidos += 1
+        if simular:
+            relatorio = simular_importacao([(1, df)], "cadastro")
+            print(f"🧪 Simulação: {relatorio['validas']} produtos novos, "
+                  f"{relatorio['ja_cadastrados']} já cadastrados, {relatorio['invalidas']} inválidos.")
+            return relatorio
+
+        # ✅ Validação vetorizada (GTIN-13, campos obrigatórios, repetidos) e consulta única ao catálogo
+        validador = ValidadorPlanilha("cadastro")
+        validos, _ = validador.validar(df)
+        relatorio = validador.relatorio()
+
+        registros_repetidos = relatorio["erros_por_motivo"].get("Repetido no arquivo", 0)
+        registros_duplicados = relatorio["ja_cadastrados"] + registros_repetidos
+        registros_invalidos = relatorio["invalidas"] - registros_repetidos
+
+        # 🚀 Inserção em lotes paralelos; só repete o que com certeza não chegou ao banco
+        produtos = [
+            {"ean": linha.ean, "marca": linha.marca.title(), "descricao": linha.descricao.title()}
+            for linha in validos.itertuples(index=False)
+        ]
+        resultado = executar_em_lotes(
+            produtos,
+            lambda lote: supabase.table("produto").insert(lote).execute().data,
+            descricao="produtos",
+            idempotente=False,
+        )
+        registros_importados = len(resultado["ok"])
+        # 🔄 Catálogo e busca enxergam os produtos novos na hora
+        for indice, registro in resultado["ok"]:
+            catalogo.invalidar(produtos[indice]["ean"])
+            indice_busca.atualizar(registro or produtos[indice])
+        registros_invalidos += len(resultado["falhas"])
+        for indice, item_erro in resultado["falhas"]:
+            print(f"❌ Erro ao importar produto {produtos[indice]['ean']}: {item_erro}")
 
         print(f"\n✅ Importação finalizada:")
         print(f"📦 {registros_importados} produtos importados")
@@ -49,4 +51,4 @@ def importar_cadastro_excel(caminho_arquivo):
         print(f"⚠️ {registros_invalidos} registros ignorados por erro ou dados inválidos")
 
     except Exception as erro:
-        print(f"❌ Erro geral na importação: {erro}")
\ No newline at end of file
+        print(f"❌ Erro geral na importação: {erro}")
@@ -1,9 +1,38 @@
-import pandas as pd
 import os
-from config_supabase import supabase
-from datetime import datetime
+from leitura_planilha import ler_blocos_xlsx
+from importacao_incremental import ImportacaoIncremental
+import razao_estoque  # assina eventos_estoque: as movimentações da importação entram no razão
+from validacao_planilha import ValidadorPlanilha, simular_importacao
+
+def _montar_item(linha):
+    return {
+        "id_produto": linha.id_produto,
+        "ean": linha.ean,
+        "descricao": linha.descricao,
+        "marca": linha.marca,
+        "validade": linha.validade,
+        "quantidade": int(linha.quantidade),
+    }
+
+# 📦 Importa um bloco de linhas da planilha (linha_inicial = número da 1ª linha do bloco)
+def _importar_bloco(df, linha_inicial, validador, incremental):
+    # ✅ Validação vetorizada do bloco; o catálogo é consultado de uma vez para o bloco inteiro
+    validos, erros_validacao = validador.validar(df, linha_inicial)
+    erros = [f"Linha {linha}: {mensagem}" for linha, mensagem in erros_validacao]
+
+    # 🔀 Só as linhas novas ou alteradas desde a última importação desta planilha são gravadas
+    registros_importados, inalterados, erros_gravacao = incremental.aplicar(validos, _montar_item)
+    erros += erros_gravacao
+    for erro_msg in erros:
+        print(f"❌ {erro_msg}")
+
+    return registros_importados, inalterados, erros, bool(erros_gravacao)
 
-def importar_estoque_excel(caminho_arquivo):
+# 📥 Importa a planilha da loja; com simular=True só valida e devolve o relatório (nada é gravado).
+# Com `origem` (ex.: loja + id da planilha, nunca o nome do arquivo), reimportar aplica só a
+# diferença para a importação anterior; sem ela, todas as linhas entram como novas.
+# Com ou sem origem, um arquivo idêntico a um já importado não é gravado de novo
+def importar_estoque_excel(caminho_arquivo, job=None, simular=False, origem=None):
     if not os.path.exists(caminho_arquivo):
         print(f"❌ Arquivo não encontrado: {caminho_arquivo}")
         return {
@@ -12,59 +41,58 @@ def importar_estoque_excel(caminho_arquivo):
         }
 
     try:
-        df = pd.read_excel(caminho_arquivo, engine="openpyxl")
-        print("✅ Arquivo lido com sucesso. Colunas encontradas:", df.columns.tolist())
-
-        df.columns = [col.lower().strip() for col in df.columns]
-
         registros_importados = 0
         erros = []
 
-        for i, linha in df.iterrows():
-            try:
-                ean = str(linha.get("ean", "")).strip()
-                validade_raw = linha.get("validade", "")
-                quantidade_raw = linha.get("quantidade", "")
-                descricao = str(linha.get("descricao", "")).strip()
-                marca = str(linha.get("marca", "")).strip()
-
-                if not all([ean, validade_raw, quantidade_raw]):
-                    raise ValueError("Campos obrigatórios ausentes")
-
-                quantidade = int(quantidade_raw) if not pd.isnull(quantidade_raw) else 0
-                if quantidade <= 0:
-                    raise ValueError("Quantidade inválida ou zero")
-
-                validade = pd.to_datetime(validade_raw, errors="coerce")
-                if pd.isnull(validade):
-                    raise ValueError(f"Data de validade inválida: {validade_raw}")
-                validade = validade.date().isoformat()
-
-                # 🔍 Buscar id_produto pelo EAN
-                produto_resp = supabase.table("produto").select("id_produto").eq("ean", ean).single().execute()
-                id_produto = produto_resp.data["id_produto"] if produto_resp.data else None
-
-                if not id_produto:
-                    raise ValueError(f"Produto com EAN {ean} não encontrado na tabela 'produto'")
-
-                item = {
-                    "id_produto": id_produto,
-                    "ean": ean,
-                    "descricao": descricao,
-                    "marca": marca,
-                    "validade": validade,
-                    "quantidade": quantidade,
-                }
-
-                supabase.table("estoque").insert(item).execute()
-                registros_importados += 1
-
-            except Exception as erro_item:
-                erro_msg = f"Linha {i+1}: {erro_item}"
-                erros.append(erro_msg)
-                print(f"❌ {erro_msg}")
-
-        print(f"✅ Importação concluída com {registros_importados} registros.")
+        # 🌊 Leitura em blocos: só um bloco de linhas fica em memória por vez
+        blocos = ler_blocos_xlsx(caminho_arquivo)
+        if simular:
+            relatorio = simular_importacao(blocos, "estoque_loja", job=job)
+            print(f"🧪 Simulação: {relatorio['validas']} linhas válidas, {relatorio['invalidas']} inválidas.")
+            return relatorio
+
+        # 🧾 Reenvio do mesmo arquivo: nada a fazer
+        incremental = ImportacaoIncremental(origem, caminho_arquivo)
+        if incremental.ja_importado():
+            print(f"⏭️ {incremental.descricao} já foi importado com este mesmo conteúdo. Nada a fazer.")
+            return {
+                "registros_importados": 0,
+                "inalterados": 0,
+                "removidos": 0,
+                "erros": [],
+                "arquivo_repetido": True
+            }
+
+        validador = ValidadorPlanilha("estoque_loja")
+        inalterados = 0
+        falhou_gravacao = False
+        if job:
+            blocos = job.acompanhar(blocos)
+
+        for linha_inicial, df in blocos:
+            if linha_inicial == 1:
+                print("✅ Arquivo aberto com sucesso. Colunas encontradas:", df.columns.tolist())
+
+            registros, inalterados_bloco, erros_bloco, falhou = _importar_bloco(
+                df, linha_inicial, validador, incremental
+            )
+            registros_importados += registros
+            inalterados += inalterados_bloco
+            falhou_gravacao |= falhou
+            erros.extend(erros_bloco)
+            if job:
+                job.registrar_bloco(len(df), registros, erros_bloco)
+
+        # 🗑️ Linhas que saíram da planilha (só com o arquivo lido até o fim)
+        removidos = 0
+        if not (job and job.cancelado):
+            removidos, erros_remocao = incremental.remover_ausentes()
+            erros.extend(erros_remocao)
+            if not (falhou_gravacao or erros_remocao):
+                incremental.concluir(validador.linhas)
+
+        print(f"✅ Importação concluída com {registros_importados} registros "
+              f"({inalterados} inalterados, {removidos} removidos).")
         if erros:
             print("🛑 Erros encontrados:")
             for erro in erros:
@@ -72,13 +100,18 @@ def importar_estoque_excel(caminho_arquivo):
 
         return {
             "registros_importados": registros_importados,
-            "erros": erros
+            "inalterados": inalterados,
+            "removidos": removidos,
+            "erros": erros,
+            "avisos": validador.relatorio()["avisos"]
         }
 
     except Exception as erro_geral:
         erro_msg = f"Erro geral na importação: {erro_geral}"
         print(f"❌ {erro_msg}")
+        if job:
+            job.falhar(erro_msg)
         return {
             "registros_importados": 0,
             "erros": [erro_msg]
-        }
\ No newline at end of file
+        }
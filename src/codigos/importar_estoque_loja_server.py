@@ -2,10 +2,19 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import tempfile, os
 from importar_estoque_loja_excel import importar_estoque_excel
+from leitura_planilha import contar_linhas
+import jobs_importacao
 
 app = Flask(__name__)
 CORS(app)
 
+def _remover_temporario(temp_path):
+    if temp_path and os.path.exists(temp_path):
+        try:
+            os.remove(temp_path)
+        except Exception as cleanup_error:
+            print(f"⚠️ Erro ao remover arquivo: {cleanup_error}")
+
 @app.route('/importar-estoque-loja', methods=['POST'])
 def importar_estoque_loja():
     if 'file' not in request.files:
@@ -15,30 +24,72 @@ def importar_estoque_loja():
     if file.filename == '' or not file.filename.lower().endswith('.xlsx'):
         return jsonify({"erro": "Arquivo inválido. Envie um .xlsx"}), 400
 
+    assincrono = request.args.get('assincrono', '').lower() in ('1', 'true', 'sim')
+    simular = request.args.get('simular', '').lower() in ('1', 'true', 'sim')
+    # 🧾 Identificador estável da planilha (ex.: loja-12:semanal) para reimportar só a diferença;
+    # sem ele, o mesmo arquivo enviado de novo continua sendo ignorado (hash do arquivo)
+    origem = request.args.get('origem', '').strip() or None
+
     temp_path = None
     try:
         with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as temp:
             file.save(temp.name)
             temp_path = temp.name
 
-        resultado = importar_estoque_excel(temp_path)
+        # 🧪 Simulação: só valida e devolve o relatório, sem gravar
+        if simular:
+            return jsonify(importar_estoque_excel(temp_path, simular=True))
+
+        if assincrono:
+            # 🧵 O arquivo temporário passa a ser do job, que o remove ao terminar
+            caminho = temp_path
+            temp_path = None
+
+            def processar(job):
+                try:
+                    importar_estoque_excel(caminho, job=job, origem=origem)
+                finally:
+                    _remover_temporario(caminho)
+
+            job = jobs_importacao.submeter(file.filename, processar, contar_linhas(caminho))
+            return jsonify({
+                "mensagem": "Importação enfileirada",
+                "job_id": job.id,
+                "status": job.status
+            }), 202
+
+        resultado = importar_estoque_excel(temp_path, origem=origem)
 
         return jsonify({
             "mensagem": "✅ Importação concluída",
             "registros_importados": resultado.get("registros_importados", 0),
-            "erros": resultado.get("erros", [])
+            "inalterados": resultado.get("inalterados", 0),
+            "removidos": resultado.get("removidos", 0),
+            "arquivo_repetido": resultado.get("arquivo_repetido", False),
+            "erros": resultado.get("erros", []),
+            "avisos": resultado.get("avisos", [])
         })
 
     except Exception as e:
         return jsonify({"erro": f"Erro interno: {str(e)}"}), 500
 
     finally:
-        if temp_path and os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except Exception as cleanup_error:
-                print(f"⚠️ Erro ao remover arquivo: {cleanup_error}")
+        _remover_temporario(temp_path)
+
+@app.route('/importacoes/<job_id>', methods=['GET'])
+def status_importacao(job_id):
+    job = jobs_importacao.obter(job_id)
+    if not job:
+        return jsonify({"erro": "Importação não encontrada"}), 404
+    return jsonify(job.resumo())
+
+@app.route('/importacoes/<job_id>', methods=['DELETE'])
+def cancelar_importacao(job_id):
+    job = jobs_importacao.cancelar(job_id)
+    if not job:
+        return jsonify({"erro": "Importação não encontrada"}), 404
+    return jsonify({"mensagem": "Cancelamento solicitado", "job_id": job.id, "status": job.status})
 
 if __name__ == '__main__':
     print("🔥 Servidor rodando na porta 8002")
-    app.run(port=8002)
\ No newline at end of file
+    app.run(port=8002)
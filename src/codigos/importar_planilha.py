@@ -1,9 +1,24 @@
 import pandas as pd
 import os
-from config_supabase import supabase
-from datetime import datetime
+from importacao_incremental import ImportacaoIncremental
+import razao_estoque  # assina eventos_estoque: as movimentações da importação entram no razão
+from validacao_planilha import ValidadorPlanilha, simular_importacao
 
-def importar_estoque_excel(caminho_arquivo):
+def _montar_item(linha):
+    return {
+        "ean": linha.ean,
+        "descricao": linha.descricao,
+        "marca": linha.marca,
+        "validade": linha.validade,
+        "quantidade": int(linha.quantidade),
+    }
+
+
+# 📥 Importa a planilha de estoque; com simular=True só valida e devolve o relatório.
+# Com `origem` (ex.: loja + id da planilha, nunca o nome do arquivo), reimportar aplica só a
+# diferença para a importação anterior; sem ela, todas as linhas entram como novas.
+# Com ou sem origem, um arquivo idêntico a um já importado não é gravado de novo
+def importar_estoque_excel(caminho_arquivo, simular=False, origem=None):
     if not os.path.exists(caminho_arquivo):
         print(f"❌ Arquivo não encontrado: {caminho_arquivo}")
         return
@@ -12,52 +27,40 @@ def importar_estoque_excel(caminho_arquivo):
         df = pd.read_excel(caminho_arquivo, engine="openpyxl")
         print("✅ Arquivo lido com sucesso. Colunas encontradas:", df.columns.tolist())
 
-        df.columns = [col.lower().strip() for col in df.columns]
-
-        registros_importados = 0
-        erros = []
-
-        for i, linha in df.iterrows():
-            try:
-                ean = str(linha.get("ean", "")).strip()
-                validade_raw = linha.get("validade", "")
-                quantidade_raw = linha.get("quantidade", "")
-
-                descricao = str(linha.get("descricao", "")).strip()
-                marca = str(linha.get("marca", "")).strip()
-
-                if not all([ean, validade_raw, quantidade_raw]):
-                    raise ValueError("Campos obrigatórios ausentes")
-
-                quantidade = int(quantidade_raw) if not pd.isnull(quantidade_raw) else 0
-                if quantidade <= 0:
-                    raise ValueError("Quantidade inválida ou zero")
-
-                validade = pd.to_datetime(validade_raw, errors="coerce")
-                if pd.isnull(validade):
-                    raise ValueError(f"Data de validade inválida: {validade_raw}")
-                validade = validade.date().isoformat()
+        if simular:
+            relatorio = simular_importacao([(1, df)], "estoque")
+            print(f"🧪 Simulação: {relatorio['validas']} linhas válidas, {relatorio['invalidas']} inválidas.")
+            return relatorio
 
-                item = {
-                    "ean": ean,
-                    "descricao": descricao,
-                    "marca": marca,
-                    "validade": validade,
-                    "quantidade": quantidade,
-                }
+        # 🧾 Reenvio do mesmo arquivo: nada a fazer
+        incremental = ImportacaoIncremental(origem, caminho_arquivo)
+        if incremental.ja_importado():
+            print(f"⏭️ {incremental.descricao} já foi importado com este mesmo conteúdo. Nada a fazer.")
+            return {"registros_importados": 0, "inalterados": len(df), "removidos": 0, "erros": [],
+                    "arquivo_repetido": True}
 
-                supabase.table("estoque").insert(item).execute()
-                registros_importados += 1
+        validador = ValidadorPlanilha("estoque")
+        validos, erros_validacao = validador.validar(df)
+        erros = [f"Linha {linha}: {mensagem}" for linha, mensagem in erros_validacao]
 
-            except Exception as erro_item:
-                erros.append(f"Linha {i+1}: {erro_item}")
-                print(f"❌ Erro na linha {i+1}: {erro_item}")
+        # 🔀 Só as linhas novas e alteradas são gravadas; as que saíram da planilha são desfeitas
+        registros_importados, inalterados, erros_gravacao = incremental.aplicar(validos, _montar_item)
+        removidos, erros_remocao = incremental.remover_ausentes()
+        erros_gravacao += erros_remocao
+        erros += erros_gravacao
+        if not erros_gravacao:
+            incremental.concluir(len(df))
 
-        print(f"✅ Importação concluída com {registros_importados} registros.")
+        print(f"✅ Importação concluída com {registros_importados} registros "
+              f"({inalterados} inalterados, {removidos} removidos).")
         if erros:
             print("🛑 Erros encontrados:")
             for erro in erros:
                 print(erro)
+        for aviso in validador.relatorio()["avisos"]:
+            print(f"⚠️ {aviso}")
+        return {"registros_importados": registros_importados, "inalterados": inalterados,
+                "removidos": removidos, "erros": erros}
 
     except Exception as erro_geral:
-        print(f"❌ Erro geral na importação: {erro_geral}")
\ No newline at end of file
+        print(f"❌ Erro geral na importação: {erro_geral}")
@@ -0,0 +1,231 @@
+import bisect
+import threading
+from datetime import date, timedelta
+
+import pandas as pd
+
+try:
+    from src.codigos.config_supabase import supabase
+    from src.codigos import eventos_estoque
+    from src.codigos.consultas_lote import buscar_por_valores
+    from src.codigos.paginacao import codificar_cursor, decodificar_cursor
+except ImportError:  # scripts executados de dentro de src/codigos
+    from config_supabase import supabase
+    import eventos_estoque
+    from consultas_lote import buscar_por_valores
+    from paginacao import codificar_cursor, decodificar_cursor
+
+TAMANHO_PAGINA = 1000
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 1000
+
+# 🚦 Faixas do painel: (cor, dias máximos para vencer); a última não tem limite
+FAIXAS = (("🔴", 90), ("🟠", 180), ("🟢", None))
+
+
+def faixa_por_dias(dias):
+    for cor, limite in FAIXAS:
+        if limite is None or dias <= limite:
+            return cor
+
+
+def _saldo_lote(registro):
+    return int(registro.get("quantidade") or registro.get("saldo") or 0)
+
+
+# 🧮 Dias para vencer de várias validades de uma vez (sem strptime linha a linha)
+def calcular_dias(validades, hoje=None):
+    hoje = pd.Timestamp(hoje or date.today())
+    datas = pd.to_datetime(pd.Series(validades, dtype="object"), format="%Y-%m-%d", errors="coerce")
+    return (datas - hoje).dt.days
+
+
+# 📅 Lotes agrupados por data de validade, com as datas em ordem para busca binária
+class IndiceValidade:
+    def __init__(self):
+        self._trava = threading.RLock()
+        self._trava_reconstrucao = threading.Lock()
+        self._pendentes = None  # EANs movimentados durante uma reconstrução (relidos antes da troca)
+        self._limpar()
+        self.carregado = False
+        self.reconstruido_em = None
+
+    def _limpar(self):
+        self._datas = []  # validades ordenadas (ISO), só as que têm lote com saldo
+        self._lotes = {}  # validade -> {ean: {"quantidade", "marca", "nome"}}
+        self._totais = {}  # validade -> quantidade somada dos lotes daquela data
+
+    def _somar(self, ean, validade, quantidade, marca=None, nome=None):
+        validade = str(validade)[:10]
+        balde = self._lotes.get(validade)
+        if balde is None:
+            balde = self._lotes[validade] = {}
+            bisect.insort(self._datas, validade)
+        lote = balde.setdefault(ean, {"quantidade": 0, "marca": marca, "nome": nome})
+        lote["quantidade"] += quantidade
+        self._totais[validade] = self._totais.get(validade, 0) + quantidade
+        lote["marca"] = lote["marca"] or marca
+        lote["nome"] = lote["nome"] or nome
+        if lote["quantidade"] <= 0:
+            self._totais[validade] -= lote["quantidade"]
+            del balde[ean]
+            if not balde:
+                del self._lotes[validade]
+                del self._totais[validade]
+                del self._datas[bisect.bisect_left(self._datas, validade)]
+
+    def _remover_ean(self, ean):
+        for validade in list(self._datas):
+            lote = self._lotes[validade].get(ean)
+            if lote:
+                self._somar(ean, validade, -lote["quantidade"])
+
+    def _carregar_lote(self, r):
+        if r.get("validade"):
+            self._somar(str(r.get("ean", "")).strip(), r["validade"], _saldo_lote(r),
+                        r.get("marca"), r.get("nome") or r.get("descricao"))
+
+    # 📣 Ouvinte de eventos_estoque: entradas somam, saídas descontam do lote
+    def aplicar_eventos(self, eventos):
+        with self._trava:
+            for evento in eventos:
+                if not evento.get("validade") or evento.get("local", "galpao") != "galpao":
+                    continue
+                if self._pendentes is not None:
+                    self._pendentes.add(evento["ean"])
+                sinal = {"entrada": 1, "ajuste": 1, "saida": -1, "transferencia": -1}.get(evento["tipo"])
+                if sinal is None:
+                    continue
+                self._somar(evento["ean"], evento["validade"], sinal * int(evento["quantidade"]),
+                            evento.get("marca"), evento.get("nome"))
+
+    # 🔄 Recarrega todos os lotes do galpão (sob demanda ou na subida da API)
+    def reconstruir(self):
+        with self._trava_reconstrucao:
+            with self._trava:
+                self._pendentes = set()
+            try:
+                return self._reconstruir()
+            finally:
+                with self._trava:
+                    self._pendentes = None
+
+    def _reconstruir(self):
+        novo = IndiceValidade()
+        inicio = 0
+        lotes = 0
+        while True:
+            pagina = supabase.table("estoque").select("*").order("id") \
+                .range(inicio, inicio + TAMANHO_PAGINA - 1).execute().data or []
+            for r in pagina:
+                novo._carregar_lote(r)
+            lotes += len(pagina)
+            inicio += TAMANHO_PAGINA
+            if len(pagina) < TAMANHO_PAGINA:
+                break
+        with self._trava:
+            # 🔁 EANs movimentados durante a leitura: a página lida pode estar velha, então são
+            # relidos antes da troca (os eventos esperam a trava, nenhum se perde nem conta em dobro)
+            if self._pendentes:
+                for ean in self._pendentes:
+                    novo._remover_ean(ean)
+                for r in buscar_por_valores("estoque", "ean", self._pendentes):
+                    novo._carregar_lote(r)
+            self._datas, self._lotes, self._totais = novo._datas, novo._lotes, novo._totais
+            self.carregado = True
+            self.reconstruido_em = pd.Timestamp.now().isoformat()
+        print(f"📅 Índice de validade reconstruído com {lotes} lotes")
+        return lotes
+
+    def garantir_carregado(self):
+        if not self.carregado:
+            self.reconstruir()
+
+    def invalidar(self):
+        with self._trava:
+            self._limpar()
+            self.carregado = False
+
+    def _somar_datas(self, inicio, fim):
+        datas = self._datas[inicio:fim]
+        return {"lotes": sum(len(self._lotes[d]) for d in datas),
+                "quantidade": sum(self._totais[d] for d in datas)}
+
+    # 🚦 Lotes e quantidades por faixa: busca binária nas datas e totais por data, sem varrer lotes
+    def resumo(self, hoje=None):
+        hoje = hoje or date.today()
+        faixas = []
+        with self._trava:
+            inicio = 0
+            for cor, limite in FAIXAS:
+                if limite is None:
+                    fim = len(self._datas)
+                else:
+                    fim = bisect.bisect_right(self._datas, (hoje + timedelta(days=limite)).isoformat())
+                faixas.append({"faixa": cor, "ate_dias": limite, **self._somar_datas(inicio, fim)})
+                inicio = fim
+            vencidos = self._somar_datas(0, bisect.bisect_left(self._datas, hoje.isoformat()))
+        return {"faixas": faixas, "vencidos": vencidos, "atualizado_em": self.reconstruido_em}
+
+    def _intervalo_faixa(self, faixa, hoje):
+        inicio, fim = 0, len(self._datas)
+        anterior = None
+        for cor, limite in FAIXAS:
+            corte = None if limite is None else (hoje + timedelta(days=limite)).isoformat()
+            if cor == faixa:
+                if anterior:
+                    inicio = bisect.bisect_right(self._datas, anterior)
+                if corte:
+                    fim = bisect.bisect_right(self._datas, corte)
+                return inicio, fim
+            anterior = corte
+        raise ValueError(f"Faixa inválida: {faixa}")
+
+    # 📑 Próximos N a vencer a partir do cursor (validade, ean)
+    def proximos(self, limite=LIMITE_PADRAO, cursor=None, faixa=None, marca=None, hoje=None):
+        limite = max(1, min(int(limite), LIMITE_MAXIMO))
+        hoje = hoje or date.today()
+        validade_cursor, ean_cursor = decodificar_cursor(cursor) if cursor else (None, "")
+        linhas = []
+        with self._trava:
+            inicio, fim = self._intervalo_faixa(faixa, hoje) if faixa else (0, len(self._datas))
+            if validade_cursor:
+                inicio = max(inicio, bisect.bisect_left(self._datas, validade_cursor))
+            for validade in self._datas[inicio:fim]:
+                balde = self._lotes[validade]
+                for ean in sorted(balde):
+                    if validade == validade_cursor and ean <= ean_cursor:
+                        continue
+                    if marca and balde[ean]["marca"] != marca:
+                        continue
+                    linhas.append({"ean": ean, "validade": validade, **balde[ean]})
+                    if len(linhas) == limite:
+                        break
+                if len(linhas) == limite:
+                    break
+
+        for linha, dias in zip(linhas, calcular_dias([l["validade"] for l in linhas], hoje)):
+            linha["vencimento_em_dias"] = int(dias)
+            linha["faixa"] = faixa_por_dias(dias)
+
+        proximo = None
+        if len(linhas) == limite:
+            proximo = codificar_cursor(linhas[-1]["validade"], linhas[-1]["ean"])
+        return {"dados": linhas, "proximo_cursor": proximo}
+
+    # 📋 Painel completo ordenado por vencimento (sem consultar o banco)
+    def todos(self, hoje=None):
+        with self._trava:
+            linhas = [{"ean": ean, "validade": validade, **lote}
+                      for validade in self._datas for ean, lote in sorted(self._lotes[validade].items())]
+        if not linhas:
+            return []
+        tabela = pd.DataFrame(linhas)
+        tabela["vencimento_em_dias"] = calcular_dias(tabela["validade"], hoje).astype(int)
+        tabela["faixa"] = pd.cut(tabela["vencimento_em_dias"], bins=[float("-inf"), 90, 180, float("inf")],
+                                 labels=[cor for cor, _ in FAIXAS]).astype(str)
+        return tabela[["ean", "validade", "quantidade", "vencimento_em_dias", "faixa"]].to_dict("records")
+
+
+indice_validade = IndiceValidade()
+eventos_estoque.assinar(indice_validade.aplicar_eventos)
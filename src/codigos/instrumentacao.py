@@ -0,0 +1,214 @@
+import bisect
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+# ⏱️ Requisições acima deste tempo geram um log estruturado
+LIMITE_LENTO_MS = float(os.getenv("ESTOQUE_LIMITE_LENTO_MS", "500"))
+
+BALDES_TEMPO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BALDES_CONSULTAS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 1024)
+
+logger = logging.getLogger("estoque.lento")
+
+
+# 📊 Histograma acumulado no formato do Prometheus
+class Histograma:
+    def __init__(self, nome, ajuda, baldes):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.baldes = baldes
+        self._series = defaultdict(lambda: [[0] * (len(baldes) + 1), 0.0])
+        self._trava = threading.Lock()
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(sorted(rotulos.items()))
+        with self._trava:
+            contagens, _ = serie = self._series[chave]
+            contagens[bisect.bisect_left(self.baldes, valor)] += 1
+            serie[1] += valor
+
+    def exportar(self):
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._trava:
+            for chave, (contagens, soma) in sorted(self._series.items()):
+                rotulos = ",".join(f'{k}="{v}"' for k, v in chave)
+                prefixo = rotulos + "," if rotulos else ""
+                acumulado = 0
+                for limite, qtd in zip(self.baldes, contagens):
+                    acumulado += qtd
+                    linhas.append(f'{self.nome}_bucket{{{prefixo}le="{limite}"}} {acumulado}')
+                acumulado += contagens[-1]
+                linhas.append(f'{self.nome}_bucket{{{prefixo}le="+Inf"}} {acumulado}')
+                linhas.append(f"{self.nome}_sum{{{rotulos}}} {soma}")
+                linhas.append(f"{self.nome}_count{{{rotulos}}} {acumulado}")
+        return "\n".join(linhas)
+
+
+duracao_requisicao = Histograma(
+    "estoque_http_request_duration_seconds", "Tempo total da requisição HTTP", BALDES_TEMPO)
+duracao_banco_requisicao = Histograma(
+    "estoque_http_request_db_seconds", "Tempo gasto no banco por requisição", BALDES_TEMPO)
+consultas_por_requisicao = Histograma(
+    "estoque_http_request_db_queries", "Consultas ao banco por requisição", BALDES_CONSULTAS)
+duracao_consulta = Histograma(
+    "estoque_db_query_duration_seconds", "Tempo de cada consulta ao banco", BALDES_TEMPO)
+
+
+# 🧾 Métricas de banco de uma requisição
+class MetricasRequisicao:
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_banco = 0.0
+        self.por_operacao = defaultdict(lambda: [0, 0.0])
+        self._trava = threading.Lock()
+
+    def registrar(self, tabela, operacao, duracao):
+        with self._trava:
+            self.consultas += 1
+            self.tempo_banco += duracao
+            item = self.por_operacao[f"{tabela}.{operacao}"]
+            item[0] += 1
+            item[1] += duracao
+
+
+_requisicao_atual = contextvars.ContextVar("metricas_requisicao", default=None)
+
+
+def iniciar_requisicao():
+    metricas = MetricasRequisicao()
+    return metricas, _requisicao_atual.set(metricas)
+
+
+def encerrar_requisicao(token):
+    _requisicao_atual.reset(token)
+
+
+# 📌 Ponto único de registro: usado pelo cliente instrumentado e pelo repositório assíncrono
+def registrar_consulta(tabela, operacao, duracao):
+    duracao_consulta.observar(duracao, tabela=tabela, operacao=operacao)
+    metricas = _requisicao_atual.get()
+    if metricas is not None:
+        metricas.registrar(tabela, operacao, duracao)
+
+
+# 🔎 Proxy do construtor de consultas que mede cada execute()
+class _ConsultaInstrumentada:
+    def __init__(self, consulta, tabela):
+        self._consulta = consulta
+        self._tabela = tabela
+        self._operacao = "select"
+
+    def __getattr__(self, nome):
+        atributo = getattr(self._consulta, nome)
+        if not callable(atributo):
+            return atributo
+
+        def encadear(*args, **kwargs):
+            if nome in ("select", "insert", "update", "upsert", "delete"):
+                self._operacao = nome
+            resultado = atributo(*args, **kwargs)
+            if resultado is self._consulta or hasattr(resultado, "execute"):
+                self._consulta = resultado
+                return self
+            return resultado
+        return encadear
+
+    def execute(self):
+        inicio = time.perf_counter()
+        try:
+            return self._consulta.execute()
+        finally:
+            registrar_consulta(self._tabela, self._operacao, time.perf_counter() - inicio)
+
+
+# 🛰️ Envolve o cliente (Supabase ou SQLite) sem mudar a interface usada pelos módulos
+class ClienteInstrumentado:
+    def __init__(self, cliente):
+        self._cliente = cliente
+
+    def table(self, nome):
+        return _ConsultaInstrumentada(self._cliente.table(nome), nome)
+
+    from_ = table
+
+    def __getattr__(self, nome):
+        return getattr(self._cliente, nome)
+
+
+def _rota(request):
+    rota = request.scope.get("route")
+    return getattr(rota, "path", request.url.path)
+
+
+# 📊 Histogramas e log dos lentos com o tempo total da requisição (corpo incluído)
+def _observar(request, rota, status, metricas, total):
+    duracao_requisicao.observar(total, metodo=request.method, rota=rota)
+    duracao_banco_requisicao.observar(metricas.tempo_banco, metodo=request.method, rota=rota)
+    consultas_por_requisicao.observar(metricas.consultas, metodo=request.method, rota=rota)
+
+    if total * 1000 >= LIMITE_LENTO_MS:
+        logger.warning(json.dumps({
+            "evento": "requisicao_lenta",
+            "metodo": request.method,
+            "rota": rota,
+            "status": status,
+            "total_ms": round(total * 1000, 1),
+            "banco_ms": round(metricas.tempo_banco * 1000, 1),
+            "consultas": metricas.consultas,
+            "por_operacao": {k: {"consultas": q, "ms": round(d * 1000, 1)}
+                             for k, (q, d) in metricas.por_operacao.items()},
+        }, ensure_ascii=False))
+
+
+# 🌊 Repassa o corpo da resposta e só mede quando o último pedaço foi enviado
+async def _medir_corpo(corpo, request, rota, status, metricas, inicio):
+    try:
+        async for parte in corpo:
+            yield parte
+    finally:
+        _observar(request, rota, status, metricas, time.perf_counter() - inicio)
+
+
+# 🌐 Middleware HTTP (FastAPI/Starlette): Server-Timing, histogramas e log dos lentos
+async def middleware_metricas(request, call_next):
+    """
+    O corpo das respostas em fluxo (StreamingResponse: NDJSON, exportações) é gerado depois
+    que `call_next` retorna, e as consultas feitas nele continuam contando na requisição.
+    Por isso os histogramas e o log dos lentos são registrados ao fim do corpo. Já o
+    Server-Timing vai nos cabeçalhos, antes do corpo: ele mede só até os cabeçalhos.
+    """
+    metricas, token = iniciar_requisicao()
+    inicio = time.perf_counter()
+    try:
+        resposta = await call_next(request)
+    finally:
+        encerrar_requisicao(token)
+    total = time.perf_counter() - inicio
+
+    partes = [
+        f'db;dur={metricas.tempo_banco * 1000:.1f};desc="{metricas.consultas} consultas"',
+        f"app;dur={(total - metricas.tempo_banco) * 1000:.1f}",
+        f"total;dur={total * 1000:.1f}",
+    ]
+    for chave, (qtd, duracao) in sorted(metricas.por_operacao.items()):
+        partes.append(f'db-{chave.replace(".", "-")};dur={duracao * 1000:.1f};desc="{qtd}x"')
+    resposta.headers["Server-Timing"] = ", ".join(partes)
+
+    rota = _rota(request)
+    corpo = getattr(resposta, "body_iterator", None)
+    if corpo is None:
+        _observar(request, rota, resposta.status_code, metricas, total)
+    else:
+        resposta.body_iterator = _medir_corpo(corpo, request, rota, resposta.status_code, metricas, inicio)
+    return resposta
+
+
+# 📈 Texto do endpoint /metrics
+def exportar_metricas():
+    histogramas = (duracao_requisicao, duracao_banco_requisicao, consultas_por_requisicao, duracao_consulta)
+    return "\n".join(h.exportar() for h in histogramas) + "\n"
@@ -0,0 +1,130 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# ⚙️ Limites do processamento em segundo plano
+MAX_TRABALHADORES = 2
+MAX_JOBS_GUARDADOS = 200
+
+_executor = ThreadPoolExecutor(max_workers=MAX_TRABALHADORES, thread_name_prefix="importacao")
+_jobs = {}
+_trava = threading.Lock()
+
+
+# 📋 Estado de uma importação em andamento (registro em memória, sem broker externo)
+class JobImportacao:
+    def __init__(self, descricao, total_linhas=None):
+        self.id = uuid.uuid4().hex
+        self.descricao = descricao
+        self.status = "na_fila"
+        self.total_linhas = total_linhas
+        self.linhas_processadas = 0
+        self.linhas_com_erro = 0
+        self.registros_importados = 0
+        self.erros = []
+        self.criado_em = time.time()
+        self.iniciado_em = None
+        self.finalizado_em = None
+        self.falhou = False
+        self._cancelar = threading.Event()
+        self._trava = threading.Lock()
+
+    # 🔁 Repassa os blocos de leitura, parando assim que o cancelamento for pedido
+    def acompanhar(self, blocos):
+        for bloco in blocos:
+            if self._cancelar.is_set():
+                return
+            yield bloco
+
+    # 📈 Chamado pelo importador ao terminar cada bloco
+    def registrar_bloco(self, linhas, registros_importados, erros):
+        with self._trava:
+            self.linhas_processadas += linhas
+            self.registros_importados += registros_importados
+            self.linhas_com_erro += len(erros)
+            self.erros.extend(erros)
+
+    # ❌ Para importadores que tratam a própria exceção e devolvem o erro no resultado:
+    # o job termina com status "erro" em vez de "concluido"
+    def falhar(self, mensagem):
+        with self._trava:
+            self.falhou = True
+            self.erros.append(mensagem)
+
+    def cancelar(self):
+        self._cancelar.set()
+
+    @property
+    def cancelado(self):
+        return self._cancelar.is_set()
+
+    def resumo(self):
+        with self._trava:
+            fim = self.finalizado_em or time.time()
+            decorrido = fim - self.iniciado_em if self.iniciado_em else 0
+            vazao = self.linhas_processadas / decorrido if decorrido > 0 else 0
+            eta = None
+            if self.status == "processando" and vazao > 0 and self.total_linhas:
+                eta = max(self.total_linhas - self.linhas_processadas, 0) / vazao
+            return {
+                "job_id": self.id,
+                "descricao": self.descricao,
+                "status": self.status,
+                "total_linhas": self.total_linhas,
+                "linhas_processadas": self.linhas_processadas,
+                "linhas_com_erro": self.linhas_com_erro,
+                "registros_importados": self.registros_importados,
+                "linhas_por_segundo": round(vazao, 1),
+                "eta_segundos": round(eta, 1) if eta is not None else None,
+                "decorrido_segundos": round(decorrido, 1),
+                "erros": list(self.erros) if self.status != "processando" else [],
+            }
+
+
+def _executar(job, funcao):
+    # Mesmo cancelado na fila, `funcao` roda: `acompanhar` não entrega blocos e a limpeza acontece
+    job.status = "processando"
+    job.iniciado_em = time.time()
+    try:
+        funcao(job)
+        if job.falhou:
+            job.status = "erro"
+        else:
+            job.status = "cancelado" if job.cancelado else "concluido"
+    except Exception as e:
+        job.status = "erro"
+        job.erros.append(f"Erro geral na importação: {e}")
+        print(f"❌ Job {job.id} falhou: {e}")
+    finally:
+        job.finalizado_em = time.time()
+
+
+def _descartar_antigos():
+    finalizados = [j for j in _jobs.values() if j.finalizado_em]
+    excesso = len(_jobs) - MAX_JOBS_GUARDADOS
+    for job in sorted(finalizados, key=lambda j: j.finalizado_em)[:max(excesso, 0)]:
+        del _jobs[job.id]
+
+
+# 🚀 Enfileira uma importação; `funcao(job)` roda em um dos trabalhadores do pool
+def submeter(descricao, funcao, total_linhas=None):
+    job = JobImportacao(descricao, total_linhas)
+    with _trava:
+        _descartar_antigos()
+        _jobs[job.id] = job
+    _executor.submit(_executar, job, funcao)
+    return job
+
+
+def obter(job_id):
+    with _trava:
+        return _jobs.get(job_id)
+
+
+# 🛑 Pede o cancelamento; o job para entre um bloco e outro
+def cancelar(job_id):
+    job = obter(job_id)
+    if job:
+        job.cancelar()
+    return job
@@ -0,0 +1,76 @@
+import pandas as pd
+from openpyxl import load_workbook
+
+# 📏 Quantidade de linhas lidas por vez (a memória fica proporcional ao bloco, não ao arquivo)
+TAMANHO_BLOCO = 5000
+
+
+# 📗 Lê um .xlsx em modo somente leitura, linha a linha, entregando blocos de DataFrame
+def ler_blocos_xlsx(arquivo, tamanho=TAMANHO_BLOCO):
+    """
+    Gera tuplas (linha_inicial, DataFrame). `linha_inicial` é o número da primeira
+    linha de dados do bloco (1 = primeira linha após o cabeçalho). Linhas totalmente vazias
+    (que o Excel costuma deixar formatadas no fim da aba) são puladas; como os blocos
+    têm linhas contínuas, uma linha vazia encerra o bloco atual e a numeração segue certa.
+    """
+    planilha = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = planilha.active.iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+        colunas = [str(c).lower().strip() if c is not None else "" for c in cabecalho]
+
+        bloco = []
+        linha_inicial = 1
+        for numero, valores in enumerate(linhas, start=1):
+            valores = tuple(valores[:len(colunas)])
+            if all(v is None for v in valores):
+                if bloco:
+                    yield linha_inicial, pd.DataFrame(bloco, columns=colunas)
+                    bloco = []
+                continue
+            if not bloco:
+                linha_inicial = numero
+            bloco.append(valores + (None,) * (len(colunas) - len(valores)))
+            if len(bloco) >= tamanho:
+                yield linha_inicial, pd.DataFrame(bloco, columns=colunas)
+                bloco = []
+        if bloco:
+            yield linha_inicial, pd.DataFrame(bloco, columns=colunas)
+    finally:
+        planilha.close()
+
+
+# 📄 Lê um .csv em blocos com o leitor incremental do pandas
+def ler_blocos_csv(arquivo, tamanho=TAMANHO_BLOCO):
+    linha_inicial = 1
+    for bloco in pd.read_csv(arquivo, chunksize=tamanho, encoding="utf-8"):
+        bloco.columns = [str(col).lower().strip() for col in bloco.columns]
+        yield linha_inicial, bloco.reset_index(drop=True)
+        linha_inicial += len(bloco)
+
+
+# 🔀 Escolhe o leitor pela extensão do arquivo
+def ler_em_blocos(arquivo, nome_arquivo, tamanho=TAMANHO_BLOCO):
+    nome = nome_arquivo.lower()
+    if nome.endswith(".xlsx"):
+        return ler_blocos_xlsx(arquivo, tamanho)
+    if nome.endswith(".csv"):
+        return ler_blocos_csv(arquivo, tamanho)
+    raise ValueError("Formato inválido. Use .csv ou .xlsx")
+
+
+# 🔢 Conta as linhas de dados sem carregar o arquivo (usado para estimar o ETA)
+def contar_linhas(caminho_arquivo, nome_arquivo=None):
+    nome = (nome_arquivo or caminho_arquivo).lower()
+    if nome.endswith(".xlsx"):
+        planilha = load_workbook(caminho_arquivo, read_only=True)
+        try:
+            total = planilha.active.max_row
+        finally:
+            planilha.close()
+        return total - 1 if total else None
+    with open(caminho_arquivo, "rb") as arquivo:
+        total = sum(bloco.count(b"\n") for bloco in iter(lambda: arquivo.read(1 << 20), b""))
+    return max(total - 1, 0)
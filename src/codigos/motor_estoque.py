@@ -0,0 +1,320 @@
+import bisect
+import itertools
+import os
+import re
+import threading
+from datetime import datetime
+from operator import attrgetter
+
+from src.codigos.config_supabase import supabase
+from src.codigos import eventos_estoque
+from src.codigos.consultas_lote import buscar_por_valores
+from src.codigos.paginacao import codificar_cursor, decodificar_cursor
+
+TABELA = "estoque"
+TAMANHO_PAGINA = 1000
+# 🔁 Intervalo da recarga completa (segundos): cobre escritas de outros processos, como os scripts de importação
+INTERVALO_RECARGA = float(os.getenv("ESTOQUE_MOTOR_RECARGA_S", "300"))
+# Campos guardados em slots; outras colunas da tabela vão para "extras"
+CAMPOS = ("id", "ean", "validade", "quantidade", "saldo", "nome", "descricao", "marca", "id_produto", "lote")
+_PALAVRA = re.compile(r"\w+")
+# Índices de palavras: marca e nome (nome ou descrição, conforme a origem do lote)
+CAMPOS_TEXTO = {"marca": ("marca",), "nome": ("nome", "descricao")}
+
+
+def _palavras(texto):
+    return _PALAVRA.findall(str(texto or "").lower())
+
+
+# Todo trecho de uma palavra é o começo de um dos seus sufixos: buscar por prefixo na lista ordenada
+# de sufixos acha as palavras que contêm o trecho sem percorrer o vocabulário
+def _sufixos(palavra):
+    return [(palavra[i:], palavra) for i in range(len(palavra))]
+
+
+def _palavras_do_lote(lote):
+    return {(indice, palavra) for indice, campos in CAMPOS_TEXTO.items()
+            for campo in campos for palavra in _palavras(getattr(lote, campo))}
+
+
+# 📦 Um lote do galpão em memória (__slots__: sem dict por instância)
+class Lote:
+    __slots__ = CAMPOS + ("extras",)
+
+    def __init__(self, registro):
+        for campo in CAMPOS:
+            setattr(self, campo, registro.get(campo))
+        self.ean = str(self.ean or "").strip()
+        self.validade = str(self.validade)[:10] if self.validade else None
+        extras = {k: v for k, v in registro.items() if k not in CAMPOS}
+        self.extras = extras or None
+
+    # Lotes sem validade vão para o fim, como no NULLS LAST do banco e do ndjson
+    def chave(self):
+        return self.validade is None, self.validade or "", self.id
+
+
+# 🧱 Monta as linhas no formato da tabela (colunas dos slots lidas de uma vez, o resto de "extras")
+def _montador(colunas):
+    nos_slots = tuple(c for c in colunas if c in CAMPOS)
+    fora = tuple(c for c in colunas if c not in CAMPOS)
+    ler = attrgetter(*nos_slots) if len(nos_slots) > 1 else (lambda lote: (getattr(lote, nos_slots[0]),))
+
+    def montar(lote):
+        linha = dict(zip(nos_slots, ler(lote)))
+        if fora:
+            extras = lote.extras or {}
+            for coluna in fora:
+                linha[coluna] = extras.get(coluna)
+        return linha
+
+    return montar
+
+
+# 🧠 Tabela de lotes residente, com índices por EAN, por validade (ordenado) e por palavras de marca/nome.
+# Escritas publicadas em eventos_estoque marcam o EAN como sujo; a leitura seguinte relê só esses EANs.
+class MotorEstoque:
+    def __init__(self):
+        self._trava = threading.RLock()
+        self._trava_carga = threading.Lock()  # uma só carga inicial, mesmo com várias leituras ao mesmo tempo
+        self._limpar()
+        self._montar = _montador(CAMPOS)
+        self._sujos = {}  # ean -> geração em que foi marcado
+        self._geracao = itertools.count(1)
+        self.carregado = False
+        self.recarregado_em = None
+        self._parar = threading.Event()
+
+    def _limpar(self):
+        self._lotes = {}  # id -> Lote
+        self._por_ean = {}  # ean -> {id}
+        self._por_validade = []  # [(validade, id)] ordenado
+        self._por_palavra = {campo: {} for campo in CAMPOS_TEXTO}  # campo -> palavra -> {id}
+        self._sufixos = {campo: [] for campo in CAMPOS_TEXTO}  # campo -> [(sufixo, palavra)] ordenado
+
+    # 🗂️ Índices
+    def _indexar(self, lote, ordenar=True):
+        self._lotes[lote.id] = lote
+        self._por_ean.setdefault(lote.ean, set()).add(lote.id)
+        if ordenar:
+            bisect.insort(self._por_validade, lote.chave())
+        else:
+            self._por_validade.append(lote.chave())
+        for campo, palavra in _palavras_do_lote(lote):
+            ids = self._por_palavra[campo].get(palavra)
+            if ids is None:
+                ids = self._por_palavra[campo][palavra] = set()
+                if ordenar:
+                    for sufixo in _sufixos(palavra):
+                        bisect.insort(self._sufixos[campo], sufixo)
+            ids.add(lote.id)
+
+    def _desindexar(self, lote):
+        del self._lotes[lote.id]
+        ids = self._por_ean.get(lote.ean)
+        if ids is not None:
+            ids.discard(lote.id)
+            if not ids:
+                del self._por_ean[lote.ean]
+        posicao = bisect.bisect_left(self._por_validade, lote.chave())
+        if posicao < len(self._por_validade) and self._por_validade[posicao] == lote.chave():
+            del self._por_validade[posicao]
+        for campo, palavra in _palavras_do_lote(lote):
+            ids = self._por_palavra[campo].get(palavra)
+            if ids is not None:
+                ids.discard(lote.id)
+                if not ids:
+                    del self._por_palavra[campo][palavra]
+                    sufixos = self._sufixos[campo]
+                    for sufixo in _sufixos(palavra):
+                        posicao = bisect.bisect_left(sufixos, sufixo)
+                        if posicao < len(sufixos) and sufixos[posicao] == sufixo:
+                            del sufixos[posicao]
+
+    def _carregar_linhas(self, linhas, ordenar=True):
+        for registro in linhas:
+            if registro.get("id") is None:
+                continue
+            if registro["id"] in self._lotes:
+                self._desindexar(self._lotes[registro["id"]])
+            self._indexar(Lote(registro), ordenar)
+
+    # 📣 Ouvinte de eventos_estoque: qualquer movimento no galpão suja o EAN
+    def aplicar_eventos(self, eventos):
+        self.marcar_alterados(e["ean"] for e in eventos if (e.get("local") or "galpao") == "galpao")
+
+    # ✏️ Para caminhos de escrita fora de eventos_estoque (ex.: correções direto na tabela)
+    def marcar_alterados(self, eans):
+        with self._trava:
+            geracao = next(self._geracao)
+            for ean in eans:
+                self._sujos[str(ean).strip()] = geracao
+
+    # 🔄 Relê da tabela só os EANs sujos (todos, ou só os pedidos) numa consulta in_ por bloco
+    def _sincronizar(self, eans=None):
+        with self._trava:
+            if not self._sujos:
+                return
+            alvo = {e: g for e, g in self._sujos.items() if eans is None or e in eans}
+        if not alvo:
+            return
+        linhas = buscar_por_valores(TABELA, "ean", list(alvo))
+        with self._trava:
+            for ean in alvo:
+                for id_lote in list(self._por_ean.get(ean, ())):
+                    self._desindexar(self._lotes[id_lote])
+            self._carregar_linhas(linhas)
+            for ean, geracao in alvo.items():
+                # Só limpa se ninguém sujou o EAN de novo durante a releitura
+                if self._sujos.get(ean) == geracao:
+                    del self._sujos[ean]
+
+    # 🔄 Recarga completa: lê a tabela em páginas e troca a estrutura de uma vez
+    def reconstruir(self):
+        with self._trava:
+            geracao_inicio = next(self._geracao)
+        novo = MotorEstoque()
+        inicio, colunas = 0, None
+        while True:
+            pagina = supabase.table(TABELA).select("*").order("id") \
+                .range(inicio, inicio + TAMANHO_PAGINA - 1).execute().data or []
+            if pagina and colunas is None:
+                colunas = tuple(pagina[0].keys())
+            novo._carregar_linhas(pagina, ordenar=False)
+            inicio += TAMANHO_PAGINA
+            if len(pagina) < TAMANHO_PAGINA:
+                break
+        novo._por_validade.sort()
+        novo._sufixos = {campo: sorted(sufixo for palavra in palavras for sufixo in _sufixos(palavra))
+                         for campo, palavras in novo._por_palavra.items()}
+
+        with self._trava:
+            self._lotes, self._por_ean = novo._lotes, novo._por_ean
+            self._por_validade, self._por_palavra = novo._por_validade, novo._por_palavra
+            self._sufixos = novo._sufixos
+            if colunas:
+                self._montar = _montador(colunas)
+            # O que foi sujo antes da leitura começar já está na recarga
+            self._sujos = {e: g for e, g in self._sujos.items() if g > geracao_inicio}
+            self.carregado = True
+            self.recarregado_em = datetime.now().isoformat()
+        print(f"🧠 Motor de estoque carregado com {len(novo._lotes)} lotes")
+        return len(novo._lotes)
+
+    def garantir_carregado(self):
+        if self.carregado:
+            return
+        with self._trava_carga:
+            if not self.carregado:
+                self.reconstruir()
+
+    # ⏰ Recarga periódica em uma thread de fundo
+    def iniciar_recarga(self, intervalo=INTERVALO_RECARGA):
+        def executar():
+            while not self._parar.is_set():
+                try:
+                    self.reconstruir()
+                except Exception as e:
+                    print(f"⚠️ Erro ao recarregar o motor de estoque: {e}")
+                self._parar.wait(intervalo)
+
+        self._parar.clear()
+        threading.Thread(target=executar, name="recarregar-motor-estoque", daemon=True).start()
+
+    def parar_recarga(self):
+        self._parar.set()
+
+    # 🔤 Palavras do índice que contêm o trecho: faixa da lista de sufixos que começa com ele
+    def _palavras_com(self, trecho, indice):
+        sufixos = self._sufixos[indice]
+        inicio = bisect.bisect_left(sufixos, (trecho,))
+        fim = bisect.bisect_left(sufixos, (trecho + "\U0010ffff",))
+        return {palavra for _, palavra in sufixos[inicio:fim]}
+
+    # 🔍 Ids que contêm o texto (como ilike '%texto%'): cada palavra da busca restringe pelo
+    # índice de sufixos, e o texto completo é conferido só nos candidatos
+    def _ids_texto(self, texto, indice):
+        campos = CAMPOS_TEXTO[indice]
+        texto = str(texto).strip().lower()
+        palavras = _palavras(texto)
+        if not palavras:
+            return {i for i, lote in self._lotes.items()
+                    if any(texto in str(getattr(lote, c) or "").lower() for c in campos)}
+        candidatos = None
+        for palavra in palavras:
+            ids = set()
+            for termo in self._palavras_com(palavra, indice):
+                ids |= self._por_palavra[indice][termo]
+            candidatos = ids if candidatos is None else candidatos & ids
+            if not candidatos:
+                return set()
+        if palavras == [texto]:
+            return candidatos  # uma palavra só: estar no índice já garante o trecho no campo
+        return {i for i in candidatos
+                if any(texto in str(getattr(self._lotes[i], c) or "").lower() for c in campos)}
+
+    def _filtrar(self, ean=None, marca=None, nome=None, validade=None, validade_de=None, validade_ate=None):
+        conjuntos = []
+        if ean:
+            conjuntos.append(self._por_ean.get(str(ean).strip(), set()))
+        if marca:
+            conjuntos.append(self._ids_texto(marca, "marca"))
+        if nome:
+            conjuntos.append(self._ids_texto(nome, "nome"))
+        if validade:
+            validade_de = validade_ate = str(validade)[:10]
+        if validade_de or validade_ate:
+            # Lotes sem validade (no fim do índice) ficam de fora, como no filtro do banco
+            inicio = bisect.bisect_left(self._por_validade, (False, validade_de)) if validade_de else 0
+            fim = bisect.bisect_right(self._por_validade, (False, validade_ate, float("inf"))) if validade_ate \
+                else bisect.bisect_left(self._por_validade, (True,))
+            conjuntos.append({i for *_, i in self._por_validade[inicio:fim]})
+        conjuntos = [c for c in conjuntos if c is not None]
+        if not conjuntos:
+            return None
+        conjuntos.sort(key=len)
+        return set.intersection(*conjuntos)
+
+    # 📋 Lotes filtrados em ordem de validade (e id), com paginação por cursor opcional
+    def consultar(self, ean=None, marca=None, nome=None, validade=None, validade_de=None, validade_ate=None,
+                  limite=None, cursor=None):
+        self.garantir_carregado()
+        self._sincronizar({str(ean).strip()} if ean else None)
+        with self._trava:
+            ids = self._filtrar(ean, marca, nome, validade, validade_de, validade_ate)
+            if ids is None:
+                chaves = self._por_validade
+            else:
+                chaves = sorted(self._lotes[i].chave() for i in ids)
+            inicio = 0
+            if cursor:
+                valor, id_registro = decodificar_cursor(cursor)
+                inicio = bisect.bisect_right(chaves, (valor is None, valor or "", id_registro))
+            fim = inicio + limite if limite else len(chaves)
+            selecionadas = chaves[inicio:fim]
+            dados = [self._montar(self._lotes[i]) for *_, i in selecionadas]
+            proximo = None
+            if limite and fim < len(chaves) and selecionadas:
+                sem_validade, validade, id_registro = selecionadas[-1]
+                proximo = codificar_cursor(None if sem_validade else validade, id_registro)
+        return dados, proximo
+
+    def por_ean(self, ean):
+        return self.consultar(ean=ean)[0]
+
+    def listar(self):
+        return self.consultar()[0]
+
+    def estatisticas(self):
+        with self._trava:
+            return {
+                "lotes": len(self._lotes),
+                "eans": len(self._por_ean),
+                "palavras": {campo: len(indice) for campo, indice in self._por_palavra.items()},
+                "eans_pendentes": len(self._sujos),
+                "recarregado_em": self.recarregado_em,
+            }
+
+
+motor_estoque = MotorEstoque()
+eventos_estoque.assinar(motor_estoque.aplicar_eventos)
@@ -1,6 +1,16 @@
-from config_supabase import supabase
+try:
+    from src.codigos.config_supabase import supabase
+    from src.codigos.eventos_estoque import publicar_movimento
+    from src.codigos.rollups_movimentacao import rollups
+    from src.codigos.paginacao import percorrer_sincrono
+    from src.codigos.exportacao import montar_filtros, escrever_xlsx
+except ImportError:  # scripts executados de dentro de src/codigos
+    from config_supabase import supabase
+    from eventos_estoque import publicar_movimento
+    from rollups_movimentacao import rollups
+    from paginacao import percorrer_sincrono
+    from exportacao import montar_filtros, escrever_xlsx
 from datetime import datetime
-import pandas as pd
 
 # 🔼 Entrada de produto
 def registrar_entrada(ean, quantidade, usuario=None):
@@ -28,6 +38,8 @@ def registrar_entrada(ean, quantidade, usuario=None):
             entrada["usuario"] = usuario
 
         supabase.table("movimentacoes").insert(entrada).execute()
+        publicar_movimento("entrada", ean, None, quantidade, momento=entrada["data_mov"], saldo=nova_quantidade,
+                           usuario_id=usuario)
         return f"Entrada registrada para {ean}. Nova quantidade: {nova_quantidade}"
 
     except Exception as e:
@@ -62,6 +74,8 @@ def registrar_saida(ean, quantidade, usuario=None):
             saida["usuario"] = usuario
 
         supabase.table("movimentacoes").insert(saida).execute()
+        publicar_movimento("saida", ean, None, quantidade, momento=saida["data_mov"], saldo=nova_quantidade,
+                           usuario_id=usuario)
         return f"Saída registrada para {ean}. Nova quantidade: {nova_quantidade}"
 
     except Exception as e:
@@ -97,12 +111,10 @@ def filtrar_movimentacoes(ean=None, tipo=None, data_inicio=None, data_fim=None):
 # 📈 Gerar dados para gráfico (ex: entrada/saída total)
 def gerar_dados_grafico():
     try:
-        movs = listar_movimentacoes()
-        if isinstance(movs, str):
-            return {"erro": movs}
-
-        entradas = sum(m["quantidade"] for m in movs if m["tipo"] == "entrada")
-        saidas = sum(m["quantidade"] for m in movs if m["tipo"] == "saida")
+        # Totais mantidos pelos rollups (todo o histórico, não só as últimas 100 linhas)
+        totais = rollups.totais_gerais()
+        entradas = totais["entrada"]
+        saidas = totais["saida"]
 
         return {
             "labels": ["Entrada", "Saída"],
@@ -117,13 +129,12 @@ def gerar_dados_grafico():
 
 # 🧾 Exportar movimentações (com opção de filtro)
 def exportar_movimentacoes_excel(nome_arquivo="movimentacoes.xlsx", ean=None, tipo=None, data_inicio=None, data_fim=None):
-    dados = filtrar_movimentacoes(ean, tipo, data_inicio, data_fim)
-    if isinstance(dados, str):
-        return dados
-
     try:
-        df = pd.DataFrame(dados)
-        df.to_excel(nome_arquivo, index=False)
-        return f"Movimentações exportadas para {nome_arquivo}"
+        # Páginas por cursor em (data_mov, id), na ordem da listagem, direto para a planilha
+        # write_only: memória constante
+        filtros = montar_filtros("data_mov", ean, tipo, data_inicio, data_fim)
+        linhas = percorrer_sincrono("movimentacoes", filtros, "data_mov", desc=True)
+        total = escrever_xlsx(linhas, nome_arquivo, "Movimentações")
+        return f"{total} movimentações exportadas para {nome_arquivo}"
     except Exception as e:
         return f"Erro na exportação: {str(e)}"
\ No newline at end of file
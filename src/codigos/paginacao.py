@@ -0,0 +1,101 @@
+import base64
+import json
+
+try:
+    from src.codigos import repositorio
+    from src.codigos.config_supabase import supabase
+except ImportError:  # scripts executados de dentro de src/codigos
+    import repositorio
+    from config_supabase import supabase
+
+# 📄 Paginação por cursor (keyset) sobre a ordenação existente + id como desempate.
+# NULL conta como o maior valor (padrão do Postgres: por último no asc, primeiro no desc)
+TAMANHO_PAGINA = 500
+LIMITE_MAXIMO = 5000
+
+
+def codificar_cursor(valor, id_registro):
+    texto = json.dumps([valor, id_registro], separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    try:
+        preenchido = cursor + "=" * (-len(cursor) % 4)
+        valor, id_registro = json.loads(base64.urlsafe_b64decode(preenchido.encode()))
+    except Exception:
+        raise ValueError("Cursor inválido")
+    if not isinstance(id_registro, int) or isinstance(valor, (list, dict)):
+        raise ValueError("Cursor inválido")
+    return valor, id_registro
+
+
+def _literal(valor):
+    return '"' + str(valor).replace('"', '\\"') + '"'
+
+
+# 🔑 Filtro "depois do cursor": (coluna > v) ou (coluna = v e id > i), invertido quando desc.
+# Valores NULL (ex.: saída sem data_saida) têm ramo próprio com is.null e o id como desempate
+def filtro_keyset(coluna, cursor, desc=False):
+    valor, id_registro = decodificar_cursor(cursor)
+    op = "lt" if desc else "gt"
+    if valor is None:
+        depois = f"and({coluna}.is.null,id.{op}.{id_registro})"
+        # desc: os NULL vêm primeiro, depois deles vem qualquer valor preenchido
+        return {"or": f"({coluna}.not.is.null,{depois})" if desc else f"({depois})"}
+    mesmo_valor = f"and({coluna}.eq.{_literal(valor)},id.{op}.{id_registro})"
+    if desc:
+        return {"or": f"({coluna}.lt.{_literal(valor)},{mesmo_valor})"}
+    return {"or": f"({coluna}.gt.{_literal(valor)},{mesmo_valor},{coluna}.is.null)"}
+
+
+def _ordem(coluna, desc):
+    direcao = "desc" if desc else "asc"
+    return f"{coluna}.{direcao},id.{direcao}"
+
+
+# 📑 Uma página a partir do cursor; devolve (linhas, próximo cursor ou None)
+async def buscar_pagina(tabela, filtros, coluna, desc=False, limite=TAMANHO_PAGINA, cursor=None, colunas="*"):
+    limite = max(1, min(int(limite), LIMITE_MAXIMO))
+    filtros = dict(filtros or {})
+    if cursor:
+        filtros.update(filtro_keyset(coluna, cursor, desc))
+    linhas = await repositorio.selecionar(tabela, colunas=colunas, filtros=filtros,
+                                          ordem=_ordem(coluna, desc), limite=limite)
+    proximo = None
+    if len(linhas) == limite:
+        ultima = linhas[-1]
+        proximo = codificar_cursor(ultima.get(coluna), ultima["id"])
+    return linhas, proximo
+
+
+# 🌊 Percorre todas as páginas em sequência (só uma página em memória por vez)
+async def percorrer(tabela, filtros, coluna, desc=False, tamanho_pagina=TAMANHO_PAGINA, colunas="*"):
+    cursor = None
+    while True:
+        linhas, cursor = await buscar_pagina(tabela, filtros, coluna, desc, tamanho_pagina, cursor, colunas)
+        for linha in linhas:
+            yield linha
+        if not cursor:
+            break
+
+
+# 🌊 Versão síncrona (scripts e threads), pelo cliente supabase-py com os mesmos filtros
+def percorrer_sincrono(tabela, filtros, coluna, desc=False, tamanho_pagina=TAMANHO_PAGINA, colunas="*"):
+    cursor = None
+    while True:
+        filtros_pagina = dict(filtros or {})
+        if cursor:
+            filtros_pagina.update(filtro_keyset(coluna, cursor, desc))
+        consulta = repositorio.aplicar_filtros(supabase.table(tabela).select(colunas), filtros_pagina)
+        linhas = consulta.order(coluna, desc=desc).order("id", desc=desc).limit(tamanho_pagina).execute().data or []
+        yield from linhas
+        if len(linhas) < tamanho_pagina:
+            break
+        cursor = codificar_cursor(linhas[-1].get(coluna), linhas[-1]["id"])
+
+
+# 📨 Linhas em NDJSON, enviadas conforme cada página chega
+async def gerar_ndjson(tabela, filtros, coluna, desc=False, tamanho_pagina=TAMANHO_PAGINA):
+    async for linha in percorrer(tabela, filtros, coluna, desc, tamanho_pagina):
+        yield json.dumps(linha, ensure_ascii=False, default=str) + "\n"
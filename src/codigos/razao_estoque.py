@@ -0,0 +1,158 @@
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+try:
+    from src.codigos.config_supabase import supabase
+    from src.codigos import eventos_estoque
+    from src.codigos.buffer_gravacao import BufferGravacao
+    from src.codigos.consultas_lote import inserir_em_lotes
+    from src.codigos.repositorio import eq, gte, lte
+    from src.codigos.paginacao import buscar_pagina, percorrer_sincrono
+except ImportError:  # scripts executados de dentro de src/codigos: só a gravação dos eventos no razão
+    from config_supabase import supabase
+    import eventos_estoque
+    from buffer_gravacao import BufferGravacao
+    from consultas_lote import inserir_em_lotes
+
+# 📒 Livro-razão do estoque: só INSERT, uma linha por variação de saldo (quantidade com sinal)
+TABELA = "razao_estoque"
+# 🏁 Saldo de abertura: o que já estava nas tabelas de estoque quando o razão começou a ser usado
+TABELA_ABERTURA = "razao_abertura"
+TIPO_ABERTURA = "abertura"
+MOMENTO_ABERTURA = "1970-01-01T00:00:00"  # antes de qualquer movimento: entra em todo replay
+LOCAIS = {"galpao": "estoque", "loja": "estoque_loja"}
+TAMANHO_PAGINA = 1000
+
+# Um lote que falha fica na fila até ser gravado: o razão não perde linhas
+razao = BufferGravacao(TABELA, reter_falhas=True)
+
+_trava_abertura = threading.Lock()
+_abertura_feita = False
+
+
+# 🔄 Converte eventos de movimentação nas linhas do razão
+def linhas_do_evento(evento):
+    base = {
+        "momento": evento["momento"],
+        "tipo": evento["tipo"],
+        "ean": evento["ean"],
+        "validade": str(evento["validade"])[:10] if evento.get("validade") else None,
+        "marca": evento.get("marca"),
+        "usuario_id": evento.get("usuario_id"),
+    }
+    quantidade = int(evento["quantidade"])
+    local = evento.get("local") or "galpao"
+    if evento["tipo"] == "saida":
+        return [{**base, "local": local, "quantidade": -quantidade}]
+    if evento["tipo"] == "transferencia":
+        return [{**base, "local": local, "quantidade": -quantidade},
+                {**base, "local": evento.get("destino", "loja"), "quantidade": quantidade}]
+    return [{**base, "local": local, "quantidade": quantidade}]
+
+
+# 📣 Ouvinte de eventos_estoque: cada movimentação vira linha(s) do razão, num único INSERT em lote.
+# A operação só termina depois da gravação (group commit com as operações simultâneas); por isso os
+# caminhos assíncronos publicam com repositorio.em_thread, sem travar o event loop
+def registrar_eventos(eventos):
+    razao.adicionar([linha for evento in eventos for linha in linhas_do_evento(evento)], aguardar=True)
+
+
+def _paginas(tabela, colunas="*"):
+    inicio = 0
+    while True:
+        pagina = supabase.table(tabela).select(colunas).order("id") \
+            .range(inicio, inicio + TAMANHO_PAGINA - 1).execute().data or []
+        yield from pagina
+        inicio += TAMANHO_PAGINA
+        if len(pagina) < TAMANHO_PAGINA:
+            break
+
+
+# 🏁 Grava o saldo de abertura uma única vez: para cada (ean, validade, local), o saldo atual das
+# tabelas de estoque menos o que o razão já registrou. Assim a soma do razão bate com as tabelas e o
+# estoque anterior ao razão aparece nos saldos históricos. Roda na subida da API (antes do
+# movimento do dia); movimentos gravados durante a leitura podem exigir um novo acerto de inventário.
+def garantir_abertura():
+    global _abertura_feita
+    if _abertura_feita:
+        return None
+    with _trava_abertura:
+        if _abertura_feita:
+            return None
+        if supabase.table(TABELA_ABERTURA).select("id").limit(1).execute().data:
+            _abertura_feita = True
+            return None
+        razao.descarregar()
+        diferencas = defaultdict(int)
+        marcas = {}
+        for local, tabela in LOCAIS.items():
+            for r in _paginas(tabela):
+                chave = (str(r.get("ean") or "").strip(), str(r["validade"])[:10] if r.get("validade") else None,
+                         local)
+                diferencas[chave] += int(r.get("quantidade") or r.get("saldo") or 0)
+                marcas.setdefault(chave, r.get("marca"))
+        for r in _paginas(TABELA, "id,ean,validade,local,quantidade"):
+            diferencas[(r["ean"], r["validade"], r["local"])] -= int(r["quantidade"] or 0)
+
+        linhas = [{"momento": MOMENTO_ABERTURA, "tipo": TIPO_ABERTURA, "ean": ean, "validade": validade,
+                   "local": local, "quantidade": quantidade, "marca": marcas.get((ean, validade, local)),
+                   "usuario_id": None}
+                  for (ean, validade, local), quantidade in sorted(diferencas.items(), key=str) if quantidade]
+        inserir_em_lotes(TABELA, linhas)
+        supabase.table(TABELA_ABERTURA).insert({"aberto_em": datetime.now().isoformat(),
+                                                "linhas": len(linhas)}).execute()
+        _abertura_feita = True
+    print(f"🏁 Saldo de abertura do razão gravado: {len(linhas)} lotes")
+    return {"linhas": len(linhas)}
+
+
+def _filtros(ean=None, validade=None, local=None, tipo=None):
+    filtros = {}
+    for coluna, valor in (("ean", ean), ("validade", validade), ("local", local), ("tipo", tipo)):
+        if valor:
+            filtros[coluna] = eq(valor)
+    return filtros
+
+
+# 📜 Histórico derivado do razão (mais recentes primeiro, paginado por cursor)
+async def historico(ean=None, validade=None, local=None, tipo=None, limite=500, cursor=None):
+    return await buscar_pagina(TABELA, _filtros(ean, validade, local, tipo), "id", desc=True,
+                               limite=limite, cursor=cursor)
+
+
+# ⚖️ Saldo derivado: soma das variações por (ean, validade, local)
+def saldos(ean=None, validade=None, local=None):
+    garantir_abertura()
+    razao.descarregar()
+    totais = defaultdict(int)
+    colunas = "id,ean,validade,local,quantidade"
+    for linha in percorrer_sincrono(TABELA, _filtros(ean, validade, local), "id", colunas=colunas):
+        totais[(linha["ean"], linha["validade"], linha["local"])] += int(linha["quantidade"] or 0)
+    chaves = sorted(totais, key=lambda c: (c[0], c[1] or "", c[2]))
+    return [{"ean": e, "validade": v, "local": l, "saldo": totais[(e, v, l)]} for e, v, l in chaves]
+
+
+# 📊 Produtividade derivada do razão (substitui a gravação à parte na tabela produtividade):
+# quantidade movimentada por usuário e tipo; a transferência conta uma vez, pelo destino
+def produtividade(usuario_id=None, inicio=None, fim=None):
+    razao.descarregar()
+    filtros = {"usuario_id": eq(usuario_id)} if usuario_id else {}
+    if inicio and fim:
+        filtros["and"] = f"(momento.gte.{inicio},momento.lte.{fim})"
+    elif inicio:
+        filtros["momento"] = gte(inicio)
+    elif fim:
+        filtros["momento"] = lte(fim)
+    totais = defaultdict(int)
+    colunas = "id,usuario_id,tipo,quantidade"
+    for linha in percorrer_sincrono(TABELA, filtros, "id", colunas=colunas):
+        quantidade = int(linha["quantidade"] or 0)
+        if linha["tipo"] == TIPO_ABERTURA or (linha["tipo"] == "transferencia" and quantidade < 0):
+            continue
+        totais[(linha["usuario_id"], linha["tipo"])] += abs(quantidade)
+    chaves = sorted(totais, key=lambda c: (str(c[0] or ""), c[1]))
+    return [{"usuario_id": u, "tipo": t, "quantidade": totais[(u, t)]} for u, t in chaves]
+
+
+eventos_estoque.assinar(registrar_eventos)
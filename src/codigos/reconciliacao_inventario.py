@@ -0,0 +1,190 @@
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from src.codigos.config_supabase import supabase
+from src.codigos.cache_catalogo import catalogo
+from src.codigos.baixa_atomica import ajustar_saldo
+from src.codigos.consultas_lote import buscar_por_valores, dividir_em_lotes, inserir_em_lotes, TAMANHO_CONSULTA
+from src.codigos.executor_lotes import executar_em_lotes
+from src.codigos.eventos_estoque import criar_evento, publicar_eventos
+
+TAMANHO_PAGINA = 1000
+
+# 📋 Onde estão as contagens e o saldo contábil de cada local
+LOCAIS = {
+    "galpao": {"contagens": "contagens", "quantidade": "quantidade", "saldo": "estoque", "pendentes": True},
+    "loja": {"contagens": "contagem_consolidada", "quantidade": "quantidade_total", "saldo": "estoque_loja",
+             "pendentes": False},
+}
+COLUNAS_RESULTADO = ["ean", "validade", "descricao", "marca", "quantidade_contada", "saldo_sistema",
+                     "divergencia", "preco", "impacto_valor", "status"]
+
+
+def _config(local):
+    if local not in LOCAIS:
+        raise ValueError(f"Local inválido: {local}. Use {' ou '.join(LOCAIS)}")
+    return LOCAIS[local]
+
+
+def _normalizar_chaves(df):
+    df["ean"] = df["ean"].astype(str).str.strip()
+    df["validade"] = df["validade"].astype(str).str[:10]
+    return df
+
+
+# 📥 Contagens ainda não ajustadas, em páginas; fica só a mais recente de cada (ean, validade)
+def _carregar_contagens(config):
+    linhas, inicio = [], 0
+    while True:
+        consulta = supabase.table(config["contagens"]).select("*")
+        if config["pendentes"]:
+            consulta = consulta.eq("ajustado", False)
+        pagina = consulta.range(inicio, inicio + TAMANHO_PAGINA - 1).execute().data or []
+        linhas.extend(pagina)
+        inicio += TAMANHO_PAGINA
+        if len(pagina) < TAMANHO_PAGINA:
+            break
+
+    contagens = pd.DataFrame(linhas)
+    if contagens.empty:
+        return pd.DataFrame(columns=["ean", "validade", "quantidade_contada"])
+    contagens = _normalizar_chaves(contagens)
+    if "data" in contagens.columns:
+        contagens = contagens.sort_values("data", ascending=False, na_position="last")
+    contagens = contagens.drop_duplicates(["ean", "validade"])
+    contagens["quantidade_contada"] = pd.to_numeric(contagens[config["quantidade"]], errors="coerce")
+    return contagens[["ean", "validade", "quantidade_contada"]]
+
+
+# 📦 Saldo contábil das mesmas chaves, em consultas in_ por EAN
+def _carregar_saldos(config, eans):
+    lotes = pd.DataFrame(buscar_por_valores(config["saldo"], "ean", eans))
+    if lotes.empty:
+        return lotes, pd.DataFrame(columns=["ean", "validade", "saldo_sistema"])
+    lotes = _normalizar_chaves(lotes)
+    lotes["quantidade"] = pd.to_numeric(lotes.get("quantidade"), errors="coerce").fillna(0).astype(int)
+    saldos = lotes.groupby(["ean", "validade"], as_index=False)["quantidade"].sum() \
+        .rename(columns={"quantidade": "saldo_sistema"})
+    return lotes, saldos
+
+
+def _catalogo(eans):
+    produtos = catalogo.obter_varios(eans)
+    return pd.DataFrame([
+        {"ean": ean, "descricao": (p or {}).get("descricao"), "marca": (p or {}).get("marca"),
+         "preco": (p or {}).get("preco"), "id_produto": (p or {}).get("id_produto")}
+        for ean, p in produtos.items()
+    ], columns=["ean", "descricao", "marca", "preco", "id_produto"])
+
+
+# ⚖️ Junta contagens e saldos por (ean, validade) e calcula divergência e impacto de uma vez
+def _reconciliar(local):
+    config = _config(local)
+    contagens = _carregar_contagens(config)
+    if contagens.empty:
+        return contagens.reindex(columns=COLUNAS_RESULTADO + ["id_produto"]), pd.DataFrame()
+    eans = contagens["ean"].unique().tolist()
+    lotes, saldos = _carregar_saldos(config, eans)
+
+    tabela = contagens.merge(saldos, on=["ean", "validade"], how="left") \
+        .merge(_catalogo(eans), on="ean", how="left")
+    tabela["divergencia"] = tabela["quantidade_contada"] - tabela["saldo_sistema"].fillna(0)
+    tabela["preco"] = pd.to_numeric(tabela["preco"], errors="coerce")
+    # Impacto em valor só quando o produto tem preço cadastrado
+    tabela["impacto_valor"] = (tabela["divergencia"] * tabela["preco"]).round(2)
+    tabela["status"] = np.select(
+        [tabela["quantidade_contada"].isna(), tabela["saldo_sistema"].isna(), tabela["divergencia"] == 0],
+        ["Pendente", "Sem estoque", "OK"],
+        default="Divergente",
+    )
+    return tabela.sort_values(["ean", "validade"]), lotes
+
+
+def _registros(tabela):
+    tabela = tabela.astype({c: "Int64" for c in ("quantidade_contada", "saldo_sistema", "divergencia")})
+    tabela = tabela.astype(object).where(tabela.notna(), None)
+    return tabela[COLUNAS_RESULTADO].to_dict("records")
+
+
+# 🔎 Relatório de divergências (sem alterar nada)
+def reconciliar_inventario(local="galpao", apenas_divergentes=False):
+    tabela, _ = _reconciliar(local)
+    divergentes = tabela[tabela["status"].isin(["Divergente", "Sem estoque"])] if not tabela.empty else tabela
+    return {
+        "local": local,
+        "resumo": {
+            "itens": int(len(tabela)),
+            "ok": int((tabela["status"] == "OK").sum()) if not tabela.empty else 0,
+            "divergentes": int(len(divergentes)),
+            "soma_divergencia": int(divergentes["divergencia"].sum()) if not divergentes.empty else 0,
+            "impacto_valor": round(float(divergentes["impacto_valor"].sum()), 2) if not divergentes.empty else 0.0,
+        },
+        "itens": _registros(divergentes if apenas_divergentes else tabela),
+    }
+
+
+# ✅ Aplica as contagens aprovadas: cada lote recebe a diferença (contado - saldo lido) por
+# compare-and-set, preservando as movimentações feitas depois da leitura; depois baixa as contagens
+def aplicar_ajustes(local="galpao", itens=None, usuario_id="sistema"):
+    config = _config(local)
+    tabela, lotes = _reconciliar(local)
+    if tabela.empty:
+        return {"local": local, "ajustados": 0, "criados": 0, "itens": [], "erros": []}
+    tabela = tabela[tabela["status"].isin(["Divergente", "Sem estoque"])]
+    if itens is not None:
+        aprovados = {(str(i["ean"]).strip(), str(i["validade"])[:10]) for i in itens}
+        tabela = tabela[[chave in aprovados for chave in zip(tabela["ean"], tabela["validade"])]]
+
+    # Lotes existentes: o primeiro lote da chave fica com a contagem, os demais zeram
+    ajustes, novos = [], []
+    if not lotes.empty:
+        alvo = lotes.merge(tabela[["ean", "validade", "quantidade_contada", "marca"]], on=["ean", "validade"],
+                           suffixes=("_lote", "")).sort_values("id")
+        primeiro = ~alvo.duplicated(["ean", "validade"])
+        contado = np.where(primeiro, alvo["quantidade_contada"], 0).astype(int)
+        ajustes = [{"id": int(r.id), "ean": r.ean, "validade": r.validade, "marca": None if pd.isna(r.marca) else r.marca,
+                    "saldo_lido": int(r.quantidade), "delta": int(c) - int(r.quantidade)}
+                   for r, c in zip(alvo.itertuples(), contado) if int(c) != int(r.quantidade)]
+    for r in tabela[tabela["status"] == "Sem estoque"].itertuples():
+        novos.append({"id_produto": None if pd.isna(r.id_produto) else int(r.id_produto), "ean": r.ean,
+                      "validade": r.validade, "quantidade": int(r.quantidade_contada),
+                      "descricao": r.descricao, "marca": r.marca})
+
+    resultado = executar_em_lotes(
+        ajustes,
+        lambda lote: [ajustar_saldo(lote[0]["id"], lote[0]["delta"], lote[0]["saldo_lido"], coluna="quantidade",
+                                    tabela=config["saldo"])],
+        tamanho=1, tentativas=1, descricao="ajustes de inventário", idempotente=False,
+    )
+    erros = [f"Lote {ajustes[i]['id']} ({ajustes[i]['ean']} {ajustes[i]['validade']}): {mensagem}"
+             for i, mensagem in resultado["falhas"]]
+    inserir_em_lotes(config["saldo"], novos)
+
+    # Contagens resolvidas (todas as chaves sem erro): uma operação por validade com os EANs em in_
+    com_erro = {(ajustes[i]["ean"], ajustes[i]["validade"]) for i, _ in resultado["falhas"]}
+    eans_por_validade = defaultdict(list)
+    for ean, validade in zip(tabela["ean"], tabela["validade"]):
+        if (ean, validade) not in com_erro:
+            eans_por_validade[validade].append(ean)
+    for validade, eans in eans_por_validade.items():
+        for lote in dividir_em_lotes(eans, TAMANHO_CONSULTA):
+            consulta = supabase.table(config["contagens"])
+            if config["pendentes"]:
+                consulta = consulta.update({"ajustado": True})
+            else:
+                consulta = consulta.delete()
+            consulta.eq("validade", validade).in_("ean", lote).execute()
+
+    agora = datetime.now().isoformat()
+    aplicados = [ajustes[i] for i, _ in resultado["ok"]]
+    publicar_eventos(
+        [criar_evento("ajuste", a["ean"], a["validade"], a["delta"], a["marca"], local=local, momento=agora,
+                      usuario_id=usuario_id) for a in aplicados]
+        + [criar_evento("ajuste", n["ean"], n["validade"], n["quantidade"], n["marca"], local=local, momento=agora,
+                        usuario_id=usuario_id) for n in novos]
+    )
+    return {"local": local, "ajustados": len(tabela) - len(novos) - len(com_erro), "criados": len(novos),
+            "itens": _registros(tabela), "erros": erros}
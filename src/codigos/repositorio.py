@@ -0,0 +1,185 @@
+import asyncio
+import time
+import httpx
+
+try:
+    from src.codigos.config_supabase import SUPABASE_URL, SUPABASE_KEY, BACKEND, supabase
+    from src.codigos.instrumentacao import registrar_consulta
+except ImportError:  # scripts executados de dentro de src/codigos
+    from config_supabase import SUPABASE_URL, SUPABASE_KEY, BACKEND, supabase
+    from instrumentacao import registrar_consulta
+
+# 🔌 Pool de conexões HTTP reaproveitadas (keep-alive) para o PostgREST do Supabase
+LIMITES = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=30)
+TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+
+_cliente = None
+
+
+class ErroRepositorio(Exception):
+    pass
+
+
+def _obter_cliente():
+    global _cliente
+    if _cliente is None or _cliente.is_closed:
+        _cliente = httpx.AsyncClient(
+            base_url=f"{SUPABASE_URL}/rest/v1",
+            headers={
+                "apikey": SUPABASE_KEY,
+                "Authorization": f"Bearer {SUPABASE_KEY}",
+                "Content-Type": "application/json",
+            },
+            limits=LIMITES,
+            timeout=TIMEOUT,
+        )
+    return _cliente
+
+
+# 🔒 Fecha o pool (chamado no desligamento da API)
+async def fechar():
+    global _cliente
+    if _cliente is not None:
+        await _cliente.aclose()
+        _cliente = None
+
+
+# 🧩 Aplica filtros no formato PostgREST a um construtor de consultas (SQLite ou supabase-py)
+def aplicar_filtros(consulta, filtros):
+    for coluna, expressao in filtros.items():
+        if coluna == "or":
+            consulta = consulta.or_(expressao[1:-1])
+            continue
+        if coluna == "and":
+            consulta = consulta.or_(f"and{expressao}")
+            continue
+        operador, valor = expressao.split(".", 1)
+        if operador == "ilike":
+            consulta = consulta.ilike(coluna, valor.replace("*", "%"))
+        elif operador == "in":
+            consulta = consulta.in_(coluna, [v.strip('"') for v in valor.strip("()").split(",") if v])
+        else:
+            consulta = getattr(consulta, operador)(coluna, valor)
+    return consulta
+
+
+# 🗄️ Backend local: traduz a requisição PostgREST para o cliente SQLite (fora do event loop)
+def _requisitar_local(metodo, caminho, params=None, json=None):
+    params = dict(params or {})
+    tabela = caminho.strip("/")
+    if tabela.startswith("rpc/"):
+        raise ErroRepositorio(f"RPC {tabela[4:]} não disponível no backend local")
+    consulta = supabase.table(tabela)
+    if metodo == "GET":
+        consulta = consulta.select(params.pop("select", "*"))
+        for criterio in filter(None, params.pop("order", "").split(",")):
+            coluna, _, direcao = criterio.partition(".")
+            consulta = consulta.order(coluna, desc=direcao == "desc")
+        limite, deslocamento = params.pop("limit", None), int(params.pop("offset", 0) or 0)
+        if limite is not None:
+            consulta = consulta.range(deslocamento, deslocamento + int(limite) - 1)
+        return aplicar_filtros(consulta, params).execute().data
+    if metodo == "PATCH":
+        return aplicar_filtros(consulta.update(json), params).execute().data
+    if metodo == "DELETE":
+        return aplicar_filtros(consulta.delete(), params).execute().data
+    if "on_conflict" in params:
+        return consulta.upsert(json, on_conflict=params["on_conflict"]).execute().data
+    return consulta.insert(json).execute().data
+
+
+_OPERACOES = {"GET": "select", "POST": "insert", "PATCH": "update", "DELETE": "delete"}
+
+
+async def _requisitar(metodo, caminho, params=None, json=None, prefer=None):
+    if BACKEND == "sqlite":
+        # O cliente local já é instrumentado em config_supabase
+        return await asyncio.to_thread(_requisitar_local, metodo, caminho, params, json)
+    tabela = caminho.strip("/")
+    operacao = "upsert" if params and "on_conflict" in params else _OPERACOES.get(metodo, metodo.lower())
+    inicio = time.perf_counter()
+    try:
+        headers = {"Prefer": prefer} if prefer else None
+        resposta = await _obter_cliente().request(metodo, caminho, params=params, json=json, headers=headers)
+        if resposta.status_code >= 400:
+            raise ErroRepositorio(f"{resposta.status_code} {metodo} {caminho}: {resposta.text}")
+        return resposta.json() if resposta.content else []
+    finally:
+        registrar_consulta(tabela, operacao, time.perf_counter() - inicio)
+
+
+# 🧩 Filtros no formato do PostgREST, ex.: {"ean": eq("789..."), "marca": ilike("nestle")}
+def eq(valor):
+    return f"eq.{valor}"
+
+
+def ilike(valor):
+    return f"ilike.*{valor}*"
+
+
+def gt(valor):
+    return f"gt.{valor}"
+
+
+def gte(valor):
+    return f"gte.{valor}"
+
+
+def lte(valor):
+    return f"lte.{valor}"
+
+
+def in_(valores):
+    return "in.(" + ",".join(f'"{v}"' for v in valores) + ")"
+
+
+# 🔍 SELECT
+async def selecionar(tabela, colunas="*", filtros=None, ordem=None, limite=None, deslocamento=None):
+    params = {"select": colunas, **(filtros or {})}
+    if ordem:
+        params["order"] = ordem
+    if limite is not None:
+        params["limit"] = limite
+    if deslocamento:
+        params["offset"] = deslocamento
+    return await _requisitar("GET", f"/{tabela}", params=params)
+
+
+# 📥 INSERT (um registro ou lista)
+async def inserir(tabela, registros):
+    return await _requisitar("POST", f"/{tabela}", json=registros, prefer="return=representation")
+
+
+# ✏️ UPDATE filtrado
+async def atualizar(tabela, valores, filtros):
+    return await _requisitar("PATCH", f"/{tabela}", params=filtros, json=valores, prefer="return=representation")
+
+
+# 🗑️ DELETE filtrado
+async def remover(tabela, filtros):
+    return await _requisitar("DELETE", f"/{tabela}", params=filtros, prefer="return=representation")
+
+
+# 🔁 UPSERT pela chave informada
+async def upsert(tabela, registros, on_conflict="id"):
+    return await _requisitar(
+        "POST", f"/{tabela}",
+        params={"on_conflict": on_conflict},
+        json=registros,
+        prefer="resolution=merge-duplicates,return=representation",
+    )
+
+
+# ⚙️ Função do banco (RPC)
+async def rpc(funcao, parametros=None):
+    return await _requisitar("POST", f"/rpc/{funcao}", json=parametros or {})
+
+
+# 🔀 Executa consultas independentes ao mesmo tempo
+async def em_paralelo(*consultas):
+    return await asyncio.gather(*consultas)
+
+
+# 🧵 Para o que ainda é síncrono (supabase.auth, importadores): roda fora do event loop
+async def em_thread(funcao, *args, **kwargs):
+    return await asyncio.to_thread(funcao, *args, **kwargs)
@@ -0,0 +1,174 @@
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+try:
+    from src.codigos.config_supabase import supabase
+    from src.codigos.cache_catalogo import catalogo
+    from src.codigos import eventos_estoque
+except ImportError:  # scripts executados de dentro de src/codigos
+    from config_supabase import supabase
+    from cache_catalogo import catalogo
+    import eventos_estoque
+
+TAMANHO_PAGINA = 1000
+
+# Históricos usados na reconstrução: (tabela, coluna de data, tipo fixo ou None = coluna "tipo")
+FONTES_HISTORICO = [
+    ("entrada", ("timestamp",), "entrada"),
+    ("saida", ("data_saida", "timestamp"), "saida"),
+    ("movimentacoes", ("data_mov",), None),
+]
+
+DIRECOES = ("entrada", "saida")
+
+
+def _novo_contador():
+    return {"entrada": 0, "saida": 0}
+
+
+def _periodos(momento):
+    dia = str(momento)[:10]
+    return dia, dia[:7]
+
+
+# 📈 Totais diários e mensais por EAN, marca e direção, mantidos em memória
+class RollupMovimentacao:
+    def __init__(self):
+        self._trava = threading.RLock()
+        self._trava_reconstrucao = threading.Lock()
+        self._pendentes = None  # eventos recebidos durante uma reconstrução (reaplicados antes da troca)
+        self._corte = None  # momento que separa o que vem dos históricos do que vem dos eventos pendentes
+        self._limpar()
+        self.reconstruido_em = None
+
+    def _limpar(self):
+        self._geral = _novo_contador()
+        # granularidade -> período -> contador / chave -> contador
+        self._total = {"dia": defaultdict(_novo_contador), "mes": defaultdict(_novo_contador)}
+        self._por_ean = {"dia": defaultdict(lambda: defaultdict(_novo_contador)),
+                         "mes": defaultdict(lambda: defaultdict(_novo_contador))}
+        self._por_marca = {"dia": defaultdict(lambda: defaultdict(_novo_contador)),
+                           "mes": defaultdict(lambda: defaultdict(_novo_contador))}
+
+    def _somar(self, direcao, ean, marca, quantidade, momento):
+        if direcao not in DIRECOES or not momento:
+            return
+        dia, mes = _periodos(momento)
+        self._geral[direcao] += quantidade
+        for granularidade, periodo in (("dia", dia), ("mes", mes)):
+            self._total[granularidade][periodo][direcao] += quantidade
+            self._por_ean[granularidade][periodo][ean][direcao] += quantidade
+            self._por_marca[granularidade][periodo][marca or "Marca desconhecida"][direcao] += quantidade
+
+    # 📣 Ouvinte de eventos_estoque: cada entrada/saída gravada atualiza os totais
+    def aplicar_eventos(self, eventos):
+        with self._trava:
+            if self._pendentes is not None:
+                self._pendentes.extend(eventos)
+            for evento in eventos:
+                # Transferência para a loja é registrada como saída do galpão
+                self._somar("saida" if evento["tipo"] == "transferencia" else evento["tipo"], evento["ean"], evento.get("marca"),
+                            int(evento["quantidade"]), evento["momento"])
+
+    # 🔄 Refaz todos os totais a partir dos históricos (sob demanda ou na subida da API).
+    # Um só corte de tempo, marcado junto com o início da coleta dos eventos, divide o trabalho:
+    # dos históricos entram as linhas com data até o corte, dos eventos guardados durante a
+    # leitura só os de momento depois dele. Cada movimentação é contada uma vez (a linha do
+    # histórico e o evento carregam o mesmo momento)
+    def reconstruir(self):
+        with self._trava_reconstrucao:
+            with self._trava:
+                self._pendentes = []
+                self._corte = datetime.now().isoformat()
+            try:
+                return self._reconstruir()
+            finally:
+                with self._trava:
+                    self._pendentes = None
+                    self._corte = None
+
+    def _reconstruir(self):
+        novo = RollupMovimentacao.__new__(RollupMovimentacao)
+        novo._trava = threading.RLock()
+        novo._pendentes = None
+        novo._limpar()
+        corte = self._corte
+        linhas = 0
+        for tabela, colunas_data, tipo_fixo in FONTES_HISTORICO:
+            inicio = 0
+            while True:
+                pagina = supabase.table(tabela).select("*").order("id") \
+                    .range(inicio, inicio + TAMANHO_PAGINA - 1).execute().data or []
+                sem_marca = [r["ean"] for r in pagina if not r.get("marca")]
+                marcas = {ean: (p or {}).get("marca") for ean, p in catalogo.obter_varios(sem_marca).items()}
+                for r in pagina:
+                    momento = next((r[c] for c in colunas_data if r.get(c)), None)
+                    if momento is None or str(momento) > corte:
+                        continue  # depois do corte: chega pelos eventos pendentes
+                    ean = str(r.get("ean", "")).strip()
+                    novo._somar(tipo_fixo or r.get("tipo"), ean, r.get("marca") or marcas.get(ean),
+                                int(r.get("quantidade") or 0), momento)
+                linhas += len(pagina)
+                inicio += TAMANHO_PAGINA
+                if len(pagina) < TAMANHO_PAGINA:
+                    break
+        with self._trava:
+            novo.aplicar_eventos([e for e in self._pendentes if str(e["momento"]) > corte])
+            self._geral, self._total = novo._geral, novo._total
+            self._por_ean, self._por_marca = novo._por_ean, novo._por_marca
+            self.reconstruido_em = datetime.now().isoformat()
+        print(f"📈 Rollups de movimentação reconstruídos a partir de {linhas} registros")
+        return linhas
+
+    def totais_gerais(self):
+        with self._trava:
+            return dict(self._geral)
+
+    # 📊 Série por período: custo proporcional ao tamanho do intervalo, não ao histórico
+    def serie(self, inicio, fim, granularidade="dia", ean=None, marca=None):
+        if granularidade not in ("dia", "mes"):
+            raise ValueError("Granularidade deve ser 'dia' ou 'mes'")
+        inicio = date.fromisoformat(str(inicio)[:10])
+        fim = date.fromisoformat(str(fim)[:10])
+        if fim < inicio:
+            raise ValueError("Data final anterior à inicial")
+
+        periodos = []
+        atual = inicio
+        while atual <= fim:
+            if granularidade == "dia":
+                periodos.append(atual.isoformat())
+                atual += timedelta(days=1)
+            else:
+                periodos.append(atual.isoformat()[:7])
+                atual = (atual.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+        with self._trava:
+            if ean:
+                fonte = self._por_ean[granularidade]
+                chave = str(ean).strip()
+            elif marca:
+                fonte = self._por_marca[granularidade]
+                chave = marca
+            else:
+                fonte = self._total[granularidade]
+                chave = None
+            valores = []
+            for periodo in periodos:
+                contador = fonte.get(periodo)
+                if contador is not None and chave is not None:
+                    contador = contador.get(chave)
+                valores.append(dict(contador) if contador else _novo_contador())
+
+        return {
+            "labels": periodos,
+            "entradas": [v["entrada"] for v in valores],
+            "saidas": [v["saida"] for v in valores],
+            "total_entradas": sum(v["entrada"] for v in valores),
+            "total_saidas": sum(v["saida"] for v in valores),
+        }
+
+
+rollups = RollupMovimentacao()
+eventos_estoque.assinar(rollups.aplicar_eventos)
@@ -0,0 +1,162 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+
+from src.codigos import repositorio
+from src.codigos.repositorio import gt, in_
+from src.codigos.cache_catalogo import catalogo
+from src.codigos.consultas_lote import dividir_em_lotes, TAMANHO_CONSULTA
+from src.codigos.baixa_atomica import ajustar_saldo_async, SaldoInsuficiente, ConflitoConcorrencia
+from src.codigos.alocacao_fefo import planejar, EstoqueInsuficiente
+from src.codigos.eventos_estoque import criar_evento, publicar_eventos
+
+MODOS = ("tudo_ou_nada", "parcial")
+# 🔀 Baixas simultâneas por lista (uma por lote distinto)
+LIMITE_CONCORRENCIA = 20
+
+
+# 🔍 Todos os lotes com saldo dos produtos da lista, em consultas in_ paralelas
+async def _carregar_lotes(ids_produto):
+    consultas = [
+        repositorio.selecionar("estoque", filtros={"id_produto": in_(lote), "quantidade": gt(0)},
+                               ordem="validade.asc,id.asc")
+        for lote in dividir_em_lotes(sorted(ids_produto), TAMANHO_CONSULTA)
+    ]
+    lotes = defaultdict(list)
+    for resultado in await repositorio.em_paralelo(*consultas):
+        for lote in resultado:
+            lotes[lote["id_produto"]].append(lote)
+    return lotes
+
+
+# 🧮 Planeja cada linha sobre saldos de trabalho: linhas do mesmo lote não contam o saldo duas vezes
+def _planejar_linhas(itens, produtos, lotes_por_produto):
+    saldos = {l["id"]: int(l.get("quantidade") or 0) for ls in lotes_por_produto.values() for l in ls}
+    planos, erros = {}, []
+    for numero, item in enumerate(itens, start=1):
+        ean = str(item["ean"]).strip()
+        produto = produtos.get(ean)
+        if item["quantidade"] <= 0:
+            erros.append({"linha": numero, "ean": ean, "erro": "Quantidade deve ser maior que zero"})
+            continue
+        if not produto:
+            erros.append({"linha": numero, "ean": ean, "erro": "Produto não encontrado"})
+            continue
+        lotes = [{**l, "quantidade": saldos[l["id"]]} for l in lotes_por_produto.get(produto["id_produto"], [])]
+        if item.get("validade"):
+            lotes = [l for l in lotes if str(l.get("validade"))[:10] == str(item["validade"])[:10]]
+            if not lotes:
+                erros.append({"linha": numero, "ean": ean, "erro": "Estoque com essa validade não encontrado"})
+                continue
+        try:
+            # Validade informada é escolha explícita; sem ela vale o FEFO sem vencidos
+            plano = planejar(lotes, item["quantidade"], permitir_vencidos=bool(item.get("validade")))
+        except EstoqueInsuficiente as e:
+            erros.append({"linha": numero, "ean": ean, "erro": str(e)})
+            continue
+        for parte in plano:
+            saldos[parte["id_estoque"]] -= parte["quantidade"]
+        planos[numero] = (item, produto, plano)
+    return planos, erros
+
+
+async def _desfazer(aplicadas):
+    await repositorio.em_paralelo(*(
+        ajustar_saldo_async(id_estoque, quantidade, saldo, coluna="quantidade")
+        for id_estoque, (quantidade, saldo) in aplicadas.items()
+    ))
+
+
+# 📤 Lista de separação inteira em poucas idas ao banco
+async def registrar_saidas_em_lote(itens, modo="tudo_ou_nada", usuario_id="sistema"):
+    if modo not in MODOS:
+        raise ValueError(f"Modo inválido: {modo}. Use {' ou '.join(MODOS)}")
+
+    produtos = await repositorio.em_thread(catalogo.obter_varios, [i["ean"] for i in itens])
+    ids_produto = {p["id_produto"] for p in produtos.values() if p}
+    lotes_por_produto = await _carregar_lotes(ids_produto) if ids_produto else {}
+    planos, erros = _planejar_linhas(itens, produtos, lotes_por_produto)
+
+    if erros and modo == "tudo_ou_nada":
+        return {"modo": modo, "sucesso": False, "linhas_processadas": 0, "erros": erros, "saidas": []}
+
+    # ⚛️ Uma baixa compare-and-set por lote, somando todas as linhas que usam o lote
+    saldo_lido = {l["id"]: int(l.get("quantidade") or 0) for ls in lotes_por_produto.values() for l in ls}
+    total_por_lote = defaultdict(int)
+    linhas_por_lote = defaultdict(list)
+    for numero, (_, _, plano) in planos.items():
+        for parte in plano:
+            total_por_lote[parte["id_estoque"]] += parte["quantidade"]
+            linhas_por_lote[parte["id_estoque"]].append(numero)
+
+    semaforo = asyncio.Semaphore(LIMITE_CONCORRENCIA)
+
+    async def baixar(id_estoque, quantidade):
+        async with semaforo:
+            try:
+                return await ajustar_saldo_async(id_estoque, -quantidade, saldo_lido[id_estoque], coluna="quantidade")
+            except (SaldoInsuficiente, ConflitoConcorrencia) as e:
+                return e
+
+    ids_lote = list(total_por_lote)
+    resultados = await repositorio.em_paralelo(*(baixar(i, total_por_lote[i]) for i in ids_lote))
+    aplicadas = {i: (total_por_lote[i], r) for i, r in zip(ids_lote, resultados) if not isinstance(r, Exception)}
+    falhas = {i: r for i, r in zip(ids_lote, resultados) if isinstance(r, Exception)}
+
+    if falhas:
+        if modo == "tudo_ou_nada":
+            await _desfazer(aplicadas)
+            erros = [{"linha": n, "ean": planos[n][0]["ean"], "erro": f"Saldo alterado por outra operação: {e}"}
+                     for i, e in falhas.items() for n in linhas_por_lote[i]]
+            return {"modo": modo, "sucesso": False, "linhas_processadas": 0, "erros": erros, "saidas": []}
+        # Parcial: linhas que dependem de um lote que falhou saem inteiras, devolvendo os outros lotes delas
+        perdidas = {n for i in falhas for n in linhas_por_lote[i]}
+        devolver = defaultdict(int)
+        for numero in perdidas:
+            for parte in planos[numero][2]:
+                if parte["id_estoque"] in aplicadas:
+                    devolver[parte["id_estoque"]] += parte["quantidade"]
+        await repositorio.em_paralelo(*(
+            ajustar_saldo_async(i, qtd, aplicadas[i][1], coluna="quantidade") for i, qtd in devolver.items()
+        ))
+        for i, qtd in devolver.items():
+            aplicadas[i] = (aplicadas[i][0] - qtd, aplicadas[i][1] + qtd)
+        for numero in sorted(perdidas):
+            erros.append({"linha": numero, "ean": planos[numero][0]["ean"],
+                          "erro": "Saldo alterado por outra operação, tente novamente"})
+            del planos[numero]
+
+    agora = datetime.now().isoformat()
+    registros, eventos, saidas = [], [], []
+    for numero, (item, produto, plano) in sorted(planos.items()):
+        for parte in plano:
+            registros.append({
+                "id_produto": produto["id_produto"],
+                "id_estoque": parte["id_estoque"],
+                "ean": produto["ean"],
+                "quantidade": parte["quantidade"],
+                "validade": parte["validade"],
+                "lote": item.get("lote"),
+                "data_saida": agora,
+                "usuario_id": usuario_id,
+            })
+            eventos.append(criar_evento("saida", produto["ean"], parte["validade"], parte["quantidade"],
+                                        parte["marca"] or produto.get("marca"), momento=agora,
+                                        usuario_id=usuario_id))
+        saidas.append({"linha": numero, "ean": produto["ean"], "quantidade": item["quantidade"],
+                       "alocacao": [{"id_estoque": p["id_estoque"], "validade": p["validade"],
+                                     "quantidade": p["quantidade"]} for p in plano]})
+
+    try:
+        # Um único INSERT: o histórico da lista entra inteiro ou não entra
+        if registros:
+            await repositorio.inserir("saida", registros)
+    except Exception:
+        # ↩️ Sem histórico, as baixas são desfeitas para o saldo continuar consistente
+        await _desfazer({i: v for i, v in aplicadas.items() if v[0]})
+        raise
+
+    # 📣 Os ouvintes (razão, índices) gravam de forma síncrona: fora do event loop
+    await repositorio.em_thread(publicar_eventos, eventos)
+    erros.sort(key=lambda e: e["linha"])
+    return {"modo": modo, "sucesso": not erros, "linhas_processadas": len(saidas), "erros": erros, "saidas": saidas}
@@ -0,0 +1,191 @@
+import os
+import threading
+from datetime import datetime
+
+from src.codigos.config_supabase import supabase
+from src.codigos.cache_catalogo import catalogo
+from src.codigos import eventos_estoque
+from src.codigos.consultas_lote import buscar_por_valores
+
+TAMANHO_PAGINA = 1000
+# 🔁 Intervalo da reconciliação completa com as tabelas (segundos)
+INTERVALO_RECONCILIACAO = float(os.getenv("ESTOQUE_RECONCILIACAO_S", "900"))
+LOCAIS = {"galpao": "estoque", "loja": "estoque_loja"}
+
+
+def _novo_saldo():
+    return {"galpao": 0, "loja": 0}
+
+
+# 🏬 Saldos do galpão e da loja por (ean, validade) e totais gerais, mantidos em memória
+class SaldoConsolidado:
+    def __init__(self):
+        self._trava = threading.RLock()
+        self._trava_reconstrucao = threading.Lock()
+        self._pendentes = None  # EANs movimentados durante uma reconstrução (relidos antes da troca)
+        self._saldos = {}  # (ean, validade) -> {"galpao", "loja"}
+        self._produtos = {}  # ean -> {"nome", "marca"}
+        self._totais = _novo_saldo()
+        self.carregado = False
+        self.reconciliado_em = None
+        self.ultimas_divergencias = 0
+        self._parar = threading.Event()
+
+    def _somar(self, local, ean, validade, quantidade, marca=None, nome=None):
+        chave = (ean, str(validade)[:10] if validade else None)
+        saldo = self._saldos.setdefault(chave, _novo_saldo())
+        saldo[local] += quantidade
+        self._totais[local] += quantidade
+        info = self._produtos.setdefault(ean, {"nome": None, "marca": None})
+        info["nome"] = info["nome"] or nome
+        info["marca"] = info["marca"] or marca
+        if not saldo["galpao"] and not saldo["loja"]:
+            del self._saldos[chave]
+
+    # 📣 Ouvinte de eventos_estoque: entradas, saídas, ajustes e transferências galpão → loja
+    def aplicar_eventos(self, eventos):
+        with self._trava:
+            for e in eventos:
+                local = e.get("local") or "galpao"
+                if local not in LOCAIS:
+                    continue
+                if self._pendentes is not None:
+                    self._pendentes.add(e["ean"])
+                quantidade = int(e["quantidade"])
+                if e["tipo"] == "entrada" or e["tipo"] == "ajuste":
+                    self._somar(local, e["ean"], e["validade"], quantidade, e.get("marca"), e.get("nome"))
+                elif e["tipo"] == "saida":
+                    self._somar(local, e["ean"], e["validade"], -quantidade, e.get("marca"), e.get("nome"))
+                elif e["tipo"] == "transferencia":
+                    destino = e.get("destino", "loja")
+                    self._somar(local, e["ean"], e["validade"], -quantidade, e.get("marca"), e.get("nome"))
+                    self._somar(destino, e["ean"], e["validade"], quantidade, e.get("marca"), e.get("nome"))
+
+    def _carregar_linha(self, local, r):
+        quantidade = int(r.get("quantidade") or r.get("saldo") or 0)
+        if quantidade:
+            self._somar(local, str(r.get("ean", "")).strip(), r.get("validade"), quantidade,
+                        r.get("marca"), r.get("nome") or r.get("descricao"))
+
+    def _remover_ean(self, ean):
+        for chave in [c for c in self._saldos if c[0] == ean]:
+            saldo = self._saldos[chave]
+            for local in LOCAIS:
+                if saldo[local]:
+                    self._somar(local, ean, chave[1], -saldo[local])
+
+    def _ler_local(self, local, novo):
+        inicio = 0
+        while True:
+            pagina = supabase.table(LOCAIS[local]).select("*").order("id") \
+                .range(inicio, inicio + TAMANHO_PAGINA - 1).execute().data or []
+            for r in pagina:
+                novo._carregar_linha(local, r)
+            inicio += TAMANHO_PAGINA
+            if len(pagina) < TAMANHO_PAGINA:
+                break
+
+    # 🔄 Reconciliação completa: relê galpão e loja, conta divergências e troca o retrato
+    def reconstruir(self):
+        with self._trava_reconstrucao:
+            with self._trava:
+                self._pendentes = set()
+            try:
+                return self._reconstruir()
+            finally:
+                with self._trava:
+                    self._pendentes = None
+
+    def _reconstruir(self):
+        novo = SaldoConsolidado()
+        for local in LOCAIS:
+            self._ler_local(local, novo)
+        sem_nome = [ean for ean, info in novo._produtos.items() if not info["nome"] or not info["marca"]]
+        for ean, produto in catalogo.obter_varios(sem_nome).items():
+            if produto:
+                info = novo._produtos[ean]
+                info["nome"] = info["nome"] or produto.get("descricao")
+                info["marca"] = info["marca"] or produto.get("marca")
+
+        with self._trava:
+            # 🔁 EANs movimentados durante a leitura: relidos antes da troca (os eventos esperam a
+            # trava, então nenhum se perde nem conta em dobro)
+            if self._pendentes:
+                for ean in self._pendentes:
+                    novo._remover_ean(ean)
+                for local, tabela in LOCAIS.items():
+                    for r in buscar_por_valores(tabela, "ean", self._pendentes):
+                        novo._carregar_linha(local, r)
+            divergencias = 0
+            if self.carregado:
+                chaves = set(self._saldos) | set(novo._saldos)
+                divergencias = sum(1 for c in chaves if self._saldos.get(c) != novo._saldos.get(c))
+            self._saldos, self._produtos, self._totais = novo._saldos, novo._produtos, novo._totais
+            self.carregado = True
+            self.reconciliado_em = datetime.now().isoformat()
+            self.ultimas_divergencias = divergencias
+        if divergencias:
+            print(f"⚠️ Saldo consolidado: {divergencias} lotes divergentes corrigidos na reconciliação")
+        print(f"🏬 Saldo consolidado reconstruído com {len(novo._saldos)} lotes")
+        return {"lotes": len(novo._saldos), "divergencias": divergencias}
+
+    def garantir_carregado(self):
+        if not self.carregado:
+            self.reconstruir()
+
+    # ⏰ Reconciliação periódica em uma thread de fundo
+    def iniciar_reconciliacao(self, intervalo=INTERVALO_RECONCILIACAO):
+        def executar():
+            while not self._parar.is_set():
+                try:
+                    self.reconstruir()
+                except Exception as e:
+                    print(f"⚠️ Erro na reconciliação do saldo consolidado: {e}")
+                self._parar.wait(intervalo)
+
+        self._parar.clear()
+        threading.Thread(target=executar, name="reconciliar-saldos", daemon=True).start()
+
+    def parar_reconciliacao(self):
+        self._parar.set()
+
+    # 🔍 Consulta filtrada (ean/marca/nome) direto do retrato, sem ir ao banco
+    def consultar(self, ean=None, marca=None, nome=None, limite=None, deslocamento=0):
+        ean = (ean or "").strip()
+        marca = (marca or "").strip().lower()
+        nome = (nome or "").strip().lower()
+        with self._trava:
+            linhas = []
+            filtrado = _novo_saldo()
+            for (ean_lote, validade), saldo in sorted(self._saldos.items(), key=lambda i: (i[0][0], i[0][1] or "")):
+                info = self._produtos.get(ean_lote, {})
+                if ean and ean not in ean_lote:
+                    continue
+                if marca and marca not in (info.get("marca") or "").lower():
+                    continue
+                if nome and nome not in (info.get("nome") or "").lower():
+                    continue
+                filtrado["galpao"] += saldo["galpao"]
+                filtrado["loja"] += saldo["loja"]
+                linhas.append({
+                    "ean": ean_lote,
+                    "nome": info.get("nome"),
+                    "marca": info.get("marca"),
+                    "validade": validade,
+                    "saldo_galpao": saldo["galpao"],
+                    "saldo_loja": saldo["loja"],
+                })
+            totais = dict(self._totais)
+
+        pagina = linhas[deslocamento:deslocamento + limite] if limite else linhas[deslocamento:]
+        return {
+            "dados": pagina,
+            "total_linhas": len(linhas),
+            "totais_filtrados": {"galpao": filtrado["galpao"], "loja": filtrado["loja"]},
+            "totais_gerais": totais,
+            "reconciliado_em": self.reconciliado_em,
+        }
+
+
+saldo_consolidado = SaldoConsolidado()
+eventos_estoque.assinar(saldo_consolidado.aplicar_eventos)
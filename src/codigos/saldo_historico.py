@@ -0,0 +1,220 @@
+import os
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from src.codigos.config_supabase import supabase
+from src.codigos import eventos_estoque
+from src.codigos.consultas_lote import inserir_em_lotes
+from src.codigos.paginacao import percorrer_sincrono
+from src.codigos.razao_estoque import TABELA as TABELA_RAZAO, garantir_abertura, razao
+from src.codigos.repositorio import eq
+
+# 📸 Checkpoints do razão: o saldo de cada (ean, validade, local) no início de um dia.
+# Um saldo histórico = leitura do checkpoint anterior + replay curto do razão até o momento pedido.
+# O primeiro checkpoint parte do saldo de abertura do razão (retrato das tabelas de estoque).
+TABELA_CHECKPOINTS = "razao_checkpoint"
+TABELA_SALDOS = "razao_checkpoint_saldo"
+# ⏰ De quanto em quanto tempo a thread confere se o checkpoint do dia já existe (segundos)
+INTERVALO_CHECKPOINT = float(os.getenv("ESTOQUE_CHECKPOINT_S", "3600"))
+
+_trava = threading.Lock()
+_ultimo_checkpoint = None  # data (texto) do checkpoint mais recente, para detectar lançamentos retroativos
+_conferido_ate = None  # maior id do razão já conferido contra os checkpoints (linhas tardias)
+_parar = threading.Event()
+
+
+def _texto_data(valor):
+    return valor.isoformat() if isinstance(valor, (date, datetime)) else str(valor)
+
+
+# 🕰️ Limite superior do replay: uma data vale até o fim do dia; um horário vale até ele mesmo
+def _limite(momento):
+    momento = _texto_data(momento).strip().replace(" ", "T")
+    if len(momento) == 10:
+        fim = (date.fromisoformat(momento) + timedelta(days=1)).isoformat()
+        return "lt", fim
+    datetime.fromisoformat(momento)  # valida o formato (ValueError sobe para quem chamou)
+    return "lte", momento
+
+
+def _filtros(ean=None, validade=None, local=None):
+    filtros = {}
+    for coluna, valor in (("ean", ean), ("validade", validade), ("local", local)):
+        if valor:
+            filtros[coluna] = eq(valor)
+    return filtros
+
+
+# 🔎 Checkpoint mais recente que começa até o limite (estrito=True: antes do limite)
+def _checkpoint_ate(limite, estrito=False):
+    consulta = supabase.table(TABELA_CHECKPOINTS).select("*")
+    consulta = consulta.lt("data", limite) if estrito else consulta.lte("data", limite)
+    res = consulta.order("data", desc=True).limit(1).execute()
+    return res.data[0] if res.data else None
+
+
+def _somar_checkpoint(saldos, checkpoint, filtros):
+    colunas = "id,ean,validade,local,saldo"
+    for linha in percorrer_sincrono(TABELA_SALDOS, {**filtros, "data": eq(checkpoint["data"])}, "id",
+                                    colunas=colunas):
+        saldos[(linha["ean"], linha["validade"], linha["local"])] += int(linha["saldo"] or 0)
+
+
+# ▶️ Soma as linhas do razão com momento em [inicio, fim) ou [inicio, fim]
+def _replay(saldos, filtros, inicio, operador, fim):
+    filtros = dict(filtros)
+    if inicio:
+        filtros["and"] = f"(momento.gte.{inicio},momento.{operador}.{fim})"
+    else:
+        filtros["momento"] = f"{operador}.{fim}"
+    linhas = 0
+    colunas = "id,ean,validade,local,quantidade"
+    for linha in percorrer_sincrono(TABELA_RAZAO, filtros, "id", colunas=colunas):
+        saldos[(linha["ean"], linha["validade"], linha["local"])] += int(linha["quantidade"] or 0)
+        linhas += 1
+    return linhas
+
+
+def _ordenar(saldos):
+    chaves = sorted((c for c, s in saldos.items() if s), key=lambda c: (c[0], c[1] or "", c[2]))
+    return [{"ean": e, "validade": v, "local": l, "saldo": saldos[(e, v, l)]} for e, v, l in chaves]
+
+
+# ⚖️ Saldo em um momento passado. Sem filtros devolve o retrato completo de todos os SKUs.
+def saldo_em(momento, ean=None, validade=None, local=None):
+    operador, fim = _limite(momento)
+    garantir_abertura()
+    verificar_tardios()
+    filtros = _filtros(ean, validade, local)
+    checkpoint = _checkpoint_ate(fim, estrito=operador == "lt")
+    saldos = defaultdict(int)
+    if checkpoint:
+        _somar_checkpoint(saldos, checkpoint, filtros)
+    linhas_replay = _replay(saldos, filtros, checkpoint["data"] if checkpoint else None, operador, fim)
+    return {
+        "momento": _texto_data(momento),
+        "checkpoint": checkpoint["data"] if checkpoint else None,
+        "linhas_replay": linhas_replay,
+        "saldos": _ordenar(saldos),
+    }
+
+
+# 📸 Grava o checkpoint do início do dia: checkpoint anterior + razão desde ele (idempotente)
+def gerar_checkpoint(dia=None):
+    global _ultimo_checkpoint
+    dia = _texto_data(dia or date.today())[:10]
+    garantir_abertura()
+    razao.descarregar()
+    ultimo_id = _maior_id_razao()
+    anterior = _checkpoint_ate(dia, estrito=True)
+    saldos = defaultdict(int)
+    if anterior:
+        _somar_checkpoint(saldos, anterior, {})
+    linhas_replay = _replay(saldos, {}, anterior["data"] if anterior else None, "lt", dia)
+
+    # O marcador sai primeiro e volta por último: ninguém lê um checkpoint pela metade
+    supabase.table(TABELA_CHECKPOINTS).delete().eq("data", dia).execute()
+    supabase.table(TABELA_SALDOS).delete().eq("data", dia).execute()
+    registros = [{**linha, "data": dia} for linha in _ordenar(saldos)]
+    inserir_em_lotes(TABELA_SALDOS, registros)
+    supabase.table(TABELA_CHECKPOINTS).insert({
+        "data": dia,
+        "gerado_em": datetime.now().isoformat(),
+        "linhas": len(registros),
+        "ultimo_id": ultimo_id,
+    }).execute()
+    with _trava:
+        _ultimo_checkpoint = max(_ultimo_checkpoint or dia, dia)
+    print(f"📸 Checkpoint do razão em {dia}: {len(registros)} saldos ({linhas_replay} linhas de replay)")
+    return {"data": dia, "linhas": len(registros), "linhas_replay": linhas_replay,
+            "base": anterior["data"] if anterior else None}
+
+
+# 🗑️ Remove checkpoints posteriores a um lançamento retroativo (ficaram desatualizados)
+def invalidar_checkpoints(desde):
+    global _ultimo_checkpoint
+    desde = _texto_data(desde)[:10]
+    supabase.table(TABELA_CHECKPOINTS).delete().gt("data", desde).execute()
+    supabase.table(TABELA_SALDOS).delete().gt("data", desde).execute()
+    with _trava:
+        if _ultimo_checkpoint and _ultimo_checkpoint > desde:
+            _ultimo_checkpoint = None
+    print(f"⚠️ Lançamento retroativo em {desde}: checkpoints posteriores removidos")
+
+
+# 📣 Ouvinte de eventos_estoque: movimento com data anterior ao último checkpoint o invalida
+def verificar_retroativos(eventos):
+    with _trava:
+        ultimo = _ultimo_checkpoint
+    if not ultimo:
+        return
+    mais_antigo = min((str(e["momento"])[:10] for e in eventos if e.get("momento")), default=None)
+    if mais_antigo and mais_antigo < ultimo:
+        threading.Thread(target=invalidar_checkpoints, args=(mais_antigo,), name="invalidar-checkpoints",
+                         daemon=True).start()
+
+
+def _maior_id_razao():
+    res = supabase.table(TABELA_RAZAO).select("id").order("id", desc=True).limit(1).execute()
+    return res.data[0]["id"] if res.data else 0
+
+
+# 🕵️ Linhas que chegaram ao razão depois de um checkpoint mas com momento anterior a ele (qualquer
+# gravador, com ou sem evento no processo): id > ultimo_id do checkpoint e momento < data dele.
+# Só as linhas novas desde a última conferência são lidas, e só as com momento antigo
+def verificar_tardios():
+    global _conferido_ate
+    razao.descarregar()
+    checkpoints = supabase.table(TABELA_CHECKPOINTS).select("data,ultimo_id").execute().data or []
+    topo = _maior_id_razao()
+    if not checkpoints:
+        _conferido_ate = topo
+        return None
+    desde = _conferido_ate if _conferido_ate is not None else min(int(c["ultimo_id"] or 0) for c in checkpoints)
+    filtros = {"id": f"gt.{desde}", "momento": f"lt.{max(c['data'] for c in checkpoints)}"}
+    mais_antigo = None
+    for linha in percorrer_sincrono(TABELA_RAZAO, filtros, "id", colunas="id,momento"):
+        momento = str(linha["momento"])
+        if any(linha["id"] > int(c["ultimo_id"] or 0) and momento < c["data"] for c in checkpoints):
+            mais_antigo = min(mais_antigo or momento, momento)
+    if mais_antigo:
+        invalidar_checkpoints(mais_antigo)
+    _conferido_ate = topo
+    return mais_antigo
+
+
+def _carregar_ultimo():
+    global _ultimo_checkpoint
+    res = supabase.table(TABELA_CHECKPOINTS).select("data").order("data", desc=True).limit(1).execute()
+    with _trava:
+        _ultimo_checkpoint = res.data[0]["data"] if res.data else None
+    return _ultimo_checkpoint
+
+
+def listar_checkpoints():
+    return supabase.table(TABELA_CHECKPOINTS).select("*").order("data", desc=True).execute().data or []
+
+
+# ⏰ Thread de fundo: garante o checkpoint de cada dia
+def iniciar_checkpoints(intervalo=INTERVALO_CHECKPOINT):
+    def executar():
+        while not _parar.is_set():
+            try:
+                verificar_tardios()
+                hoje = date.today().isoformat()
+                if _carregar_ultimo() != hoje:
+                    gerar_checkpoint(hoje)
+            except Exception as e:
+                print(f"⚠️ Erro ao gerar checkpoint do razão: {e}")
+            _parar.wait(intervalo)
+
+    _parar.clear()
+    threading.Thread(target=executar, name="checkpoints-razao", daemon=True).start()
+
+
+def parar_checkpoints():
+    _parar.set()
+
+
+eventos_estoque.assinar(verificar_retroativos)
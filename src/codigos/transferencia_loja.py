@@ -0,0 +1,96 @@
+from datetime import datetime
+
+from src.codigos import repositorio
+from src.codigos.repositorio import eq
+from src.codigos.cache_catalogo import catalogo
+from src.codigos.baixa_atomica import ajustar_saldo_async, ConflitoConcorrencia
+from src.codigos.alocacao_fefo import ProdutoNaoEncontrado
+from src.codigos.eventos_estoque import publicar_movimento
+
+
+# 🔁 Rodadas da devolução ao galpão quando a transferência falha (cada uma relê o saldo)
+MAX_DEVOLUCOES = 5
+
+
+class LoteNaoEncontrado(Exception):
+    pass
+
+
+# ↩️ Devolve ao lote o que foi baixado, sempre a partir do saldo atual (não do saldo lido antes);
+# um conflito de concorrência só adia a devolução para a próxima rodada
+async def _devolver(id_estoque, quantidade):
+    for _ in range(MAX_DEVOLUCOES):
+        atual = await repositorio.selecionar("estoque", colunas="quantidade", filtros={"id": eq(id_estoque)})
+        if not atual:
+            break
+        try:
+            return await ajustar_saldo_async(id_estoque, quantidade, atual[0]["quantidade"], coluna="quantidade")
+        except ConflitoConcorrencia:
+            continue
+    print(f"❌ Não foi possível devolver {quantidade} ao lote {id_estoque} do galpão; acerte pelo inventário")
+
+
+# 🔁 Galpão → loja no servidor: baixa o lote do galpão, grava a saída e soma na loja
+async def transferir_para_loja(ean, validade, quantidade, usuario_id="sistema", lote=None):
+    if quantidade <= 0:
+        raise ValueError("Quantidade deve ser maior que zero")
+    produto = await repositorio.em_thread(catalogo.obter, ean)
+    if not produto:
+        raise ProdutoNaoEncontrado("Produto não encontrado.")
+    id_produto = produto["id_produto"]
+    validade = str(validade)[:10]
+
+    galpao, loja = await repositorio.em_paralelo(
+        repositorio.selecionar("estoque", filtros={"id_produto": eq(id_produto), "validade": eq(validade)}, limite=1),
+        repositorio.selecionar("estoque_loja", filtros={"id_produto": eq(id_produto), "validade": eq(validade)},
+                               limite=1),
+    )
+    if not galpao:
+        raise LoteNaoEncontrado("Estoque com essa validade não encontrado.")
+
+    # ⚛️ SaldoInsuficiente/ConflitoConcorrencia sobem para quem chamou
+    saldo_galpao = await ajustar_saldo_async(galpao[0]["id"], -quantidade, galpao[0]["quantidade"],
+                                             coluna="quantidade")
+    agora = datetime.now().isoformat()
+    saida = None
+    try:
+        saida = await repositorio.inserir("saida", {
+            "id_produto": id_produto,
+            "id_estoque": galpao[0]["id"],
+            "ean": ean,
+            "quantidade": quantidade,
+            "validade": validade,
+            "lote": lote,
+            "data_saida": agora,
+            "usuario_id": usuario_id,
+        })
+        if loja:
+            saldo_loja = await ajustar_saldo_async(loja[0]["id"], quantidade, loja[0]["quantidade"],
+                                                   coluna="quantidade", tabela="estoque_loja")
+        else:
+            await repositorio.inserir("estoque_loja", {
+                "id_produto": id_produto,
+                "ean": ean,
+                "nome": produto.get("descricao"),
+                "marca": produto.get("marca"),
+                "validade": validade,
+                "quantidade": quantidade,
+                "lote": lote,
+                "data_entrada": agora,
+            })
+            saldo_loja = quantidade
+    except Exception:
+        # ↩️ A loja não recebeu: apaga a saída já gravada e devolve ao galpão (o erro original sobe)
+        try:
+            if saida:
+                await repositorio.remover("saida", {"id": eq(saida[0]["id"])})
+        except Exception as erro:
+            print(f"❌ Saída {saida[0]['id']} da transferência que falhou não foi apagada: {erro}")
+        await _devolver(galpao[0]["id"], quantidade)
+        raise
+
+    # 📣 Os ouvintes (razão, índices) gravam de forma síncrona: fora do event loop
+    await repositorio.em_thread(publicar_movimento, "transferencia", ean, validade, quantidade, produto.get("marca"),
+                                local="galpao", momento=agora, destino="loja", nome=produto.get("descricao"),
+                                usuario_id=usuario_id)
+    return {"saldo_galpao": saldo_galpao, "saldo_loja": saldo_loja}
@@ -0,0 +1,230 @@
+from collections import Counter
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.codigos.cache_catalogo import catalogo
+except ImportError:  # scripts executados de dentro de src/codigos
+    from cache_catalogo import catalogo
+
+# ⚖️ Pesos do dígito verificador GTIN-13 (posições 1 a 12)
+PESOS_GTIN13 = np.array([1, 3] * 6)
+
+# 📋 Regras de cada importador
+PERFIS = {
+    # api.importar_planilha: entradas somadas por (ean, validade); EAN novo é aceito
+    "entrada": {"obrigatorios": ("ean", "validade", "quantidade"), "chave": ("ean", "validade"),
+                "duplicado": "aviso", "catalogo": "aviso"},
+    # importar_planilha.importar_estoque_excel
+    "estoque": {"obrigatorios": ("ean", "validade", "quantidade"), "chave": ("ean", "validade"),
+                "duplicado": "aviso", "catalogo": "aviso"},
+    # importar_estoque_loja_excel.importar_estoque_excel: o produto precisa estar cadastrado
+    "estoque_loja": {"obrigatorios": ("ean", "validade", "quantidade"), "chave": ("ean", "validade"),
+                     "duplicado": "aviso", "catalogo": "obrigatorio"},
+    # importar_cadastro.importar_cadastro_excel: EAN repetido no arquivo é erro; já cadastrado é ignorado
+    "cadastro": {"obrigatorios": ("ean", "marca", "descricao"), "chave": ("ean",),
+                 "duplicado": "erro", "catalogo": "novo"},
+}
+
+
+# ✅ Dígito verificador GTIN-13 de um EAN (uso unitário)
+def ean_valido(ean):
+    return bool(gtin13_valido(pd.Series([ean]))[0])
+
+
+# ✅ Dígito verificador GTIN-13 da coluna inteira, sem laço por linha
+def gtin13_valido(eans):
+    eans = eans.astype(str).str.strip()
+    formato = eans.str.fullmatch(r"\d{13}").to_numpy(dtype=bool)
+    valido = np.zeros(len(eans), dtype=bool)
+    if formato.any():
+        texto = "".join(eans[formato]).encode("ascii")
+        digitos = (np.frombuffer(texto, dtype=np.uint8) - ord("0")).reshape(-1, 13).astype(np.int64)
+        verificador = (10 - (digitos[:, :12] @ PESOS_GTIN13) % 10) % 10
+        valido[formato] = verificador == digitos[:, 12]
+    return valido
+
+
+def _coluna(df, nome):
+    if nome in df.columns:
+        return df[nome]
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+
+def _texto(serie):
+    return serie.where(serie.notna(), "").astype(str).str.strip()
+
+
+# 🔢 EAN lido como número pelo Excel/pandas ("7891234567895.0") volta a ser texto de dígitos
+def normalizar_eans(serie):
+    return _texto(serie).str.replace(r"^(\d+)\.0+$", r"\1", regex=True)
+
+
+# 📅 Datas da coluna inteira: ISO (aaaa-mm-dd) primeiro; o resto como dia/mês/ano
+def converter_datas(serie):
+    datas = pd.to_datetime(serie, errors="coerce", format="ISO8601")
+    resto = datas.isna() & serie.notna()
+    if resto.any():
+        datas[resto] = pd.to_datetime(serie[resto].astype(str), errors="coerce", format="mixed", dayfirst=True)
+    return datas
+
+
+# 🔍 Validação vetorizada de uma planilha; guarda estado entre blocos (duplicados no arquivo todo)
+class ValidadorPlanilha:
+    """
+    validar(df, linha_inicial) -> (validos, erros). `validos` traz as colunas normalizadas
+    (ean, validade, quantidade, descricao, marca, id_produto) e `linha`; `erros` é a lista
+    de (linha, mensagem). Avisos (duplicados somados, EAN fora do catálogo, lote vencido)
+    não barram a linha e ficam no relatório. O dígito verificador GTIN-13 só é exigido de EAN
+    que ainda não está no catálogo.
+    """
+
+    def __init__(self, perfil, exigir_gtin=True, hoje=None):
+        if perfil not in PERFIS:
+            raise ValueError(f"Perfil de validação inválido: {perfil}")
+        self.perfil = perfil
+        self.regras = PERFIS[perfil]
+        self.exigir_gtin = exigir_gtin
+        self.hoje = pd.Timestamp(hoje or date.today())
+        self._vistos = set()
+        self.linhas = 0
+        self.validas = 0
+        self.ja_cadastrados = 0
+        self.erros = []
+        self.avisos = []
+        self.motivos = Counter()
+
+    def _erro(self, erros, linhas, motivo, detalhe=None):
+        for linha in linhas:
+            erros.append((linha, detalhe(linha) if detalhe else motivo))
+        if len(linhas):
+            self.motivos[motivo] += len(linhas)
+
+    def _aviso(self, linhas, mensagem):
+        self.avisos.extend((linha, mensagem) for linha in linhas)
+
+    def validar(self, df, linha_inicial=1):
+        df = df.copy()
+        df.columns = [str(col).lower().strip() for col in df.columns]
+        df.index = pd.RangeIndex(linha_inicial, linha_inicial + len(df))
+        self.linhas += len(df)
+        obrigatorios = self.regras["obrigatorios"]
+
+        ean = normalizar_eans(_coluna(df, "ean"))
+        descricao = _texto(_coluna(df, "descricao"))
+        marca = _texto(_coluna(df, "marca"))
+        validade_raw = _coluna(df, "validade")
+        quantidade_raw = _coluna(df, "quantidade")
+
+        # 1️⃣ Campos obrigatórios
+        presentes = {"ean": ean != "", "descricao": descricao != "", "marca": marca != "",
+                     "validade": _texto(validade_raw) != "", "quantidade": _texto(quantidade_raw) != ""}
+        invalida = ~np.logical_and.reduce([presentes[c].to_numpy() for c in obrigatorios])
+        erros = []
+        self._erro(erros, df.index[invalida], "Campos obrigatórios ausentes")
+
+        # 2️⃣ Catálogo: uma consulta por conjunto de EANs (o cache busca só os que faltam)
+        produtos = catalogo.obter_varios(set(ean[~invalida])) if (~invalida).any() else {}
+        no_catalogo = ean.map(lambda e: produtos.get(e) is not None).to_numpy(dtype=bool)
+        modo = self.regras["catalogo"]
+
+        # 3️⃣ GTIN-13 (dígito verificador) só para EAN novo: o que já está no catálogo é confiável,
+        # e onde o produto precisa estar cadastrado quem decide é o catálogo
+        if self.exigir_gtin and modo != "obrigatorio":
+            gtin_ruim = ~invalida & ~no_catalogo & ~gtin13_valido(ean)
+            self._erro(erros, df.index[gtin_ruim], "EAN inválido (GTIN-13)",
+                       lambda linha: f"EAN inválido (GTIN-13): {ean[linha]}")
+            invalida |= gtin_ruim
+
+        # 4️⃣ Quantidade inteira e positiva; validade como data (dia/mês/ano ou ISO)
+        if "quantidade" in obrigatorios:
+            numero = pd.to_numeric(quantidade_raw, errors="coerce")
+            inteira = numero.notna() & np.isfinite(numero.fillna(0)) & (numero == numero.round())
+            qtd_ruim = ~invalida & ~(inteira & (numero > 0)).to_numpy()
+            self._erro(erros, df.index[qtd_ruim], "Quantidade inválida ou zero")
+            invalida |= qtd_ruim
+            quantidade = numero.where(inteira, 0).fillna(0).astype("int64")
+        else:
+            quantidade = pd.Series(0, index=df.index, dtype="int64")
+
+        if "validade" in obrigatorios:
+            validade = converter_datas(validade_raw)
+            data_ruim = ~invalida & validade.isna().to_numpy()
+            self._erro(erros, df.index[data_ruim], "Data de validade inválida",
+                       lambda linha: f"Data de validade inválida: {validade_raw[linha]}")
+            invalida |= data_ruim
+            vencidos = ~invalida & (validade < self.hoje).to_numpy()
+            self._aviso(df.index[vencidos], "Validade já vencida")
+            validade_txt = validade.dt.strftime("%Y-%m-%d")
+        else:
+            validade_txt = pd.Series(None, index=df.index, dtype=object)
+
+        # 5️⃣ Duplicados no arquivo (também entre blocos)
+        chave = ean + "|" + validade_txt.fillna("") if "validade" in self.regras["chave"] else ean
+        candidatas = chave[~invalida]
+        repetida = np.zeros(len(df), dtype=bool)
+        repetida[~invalida] = (candidatas.duplicated() | candidatas.isin(self._vistos)).to_numpy()
+        self._vistos.update(candidatas)
+        if self.regras["duplicado"] == "erro":
+            self._erro(erros, df.index[repetida], "Repetido no arquivo")
+            invalida |= repetida
+        else:
+            self._aviso(df.index[repetida], "Linha repetida no arquivo (mesmo EAN e validade)")
+
+        # 6️⃣ Regra do catálogo de cada perfil
+        id_produto = pd.Series([(produtos.get(e) or {}).get("id_produto") for e in ean], index=df.index, dtype=object)
+        if modo == "obrigatorio":
+            fora = ~invalida & ~no_catalogo
+            self._erro(erros, df.index[fora], "Produto não cadastrado",
+                       lambda linha: f"Produto com EAN {ean[linha]} não encontrado na tabela 'produto'")
+            invalida |= fora
+        elif modo == "novo":
+            ja = ~invalida & no_catalogo
+            self.ja_cadastrados += int(ja.sum())
+            invalida |= ja
+        else:
+            self._aviso(df.index[~invalida & ~no_catalogo], "EAN fora do catálogo de produtos")
+
+        ok = ~invalida
+        validos = pd.DataFrame({
+            "ean": ean[ok],
+            "validade": validade_txt[ok],
+            "quantidade": quantidade[ok],
+            "descricao": descricao[ok],
+            "marca": marca[ok],
+            "id_produto": id_produto[ok],
+            "linha": df.index[ok],
+        })
+        for coluna in df.columns:
+            if coluna not in validos.columns and coluna not in ("ean", "validade", "quantidade"):
+                validos[coluna] = df.loc[ok, coluna]
+        self.validas += int(ok.sum())
+        self.erros.extend(erros)
+        return validos, sorted(erros)
+
+    # 📋 Relatório completo (modo simulação ou depois de importar)
+    def relatorio(self):
+        return {
+            "perfil": self.perfil,
+            "linhas": self.linhas,
+            "validas": self.validas,
+            "invalidas": self.linhas - self.validas - self.ja_cadastrados,
+            "ja_cadastrados": self.ja_cadastrados,
+            "erros_por_motivo": dict(self.motivos),
+            "erros": [f"Linha {linha}: {mensagem}" for linha, mensagem in sorted(self.erros)],
+            "avisos": [f"Linha {linha}: {mensagem}" for linha, mensagem in sorted(self.avisos)],
+        }
+
+
+# 🧪 Simulação (dry-run): valida todos os blocos e devolve o relatório sem gravar nada
+def simular_importacao(blocos, perfil, job=None):
+    validador = ValidadorPlanilha(perfil)
+    if job:
+        blocos = job.acompanhar(blocos)
+    for linha_inicial, bloco in blocos:
+        validos, erros = validador.validar(bloco, linha_inicial)
+        if job:
+            job.registrar_bloco(len(bloco), len(validos), [f"Linha {l}: {m}" for l, m in erros])
+    return {"simulacao": True, **validador.relatorio()}
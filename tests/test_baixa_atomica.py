@@ -0,0 +1,78 @@
+import os
+import tempfile
+import threading
+
+# 🗄️ Banco SQLite descartável: precisa estar definido antes de importar config_supabase
+os.environ["ESTOQUE_BACKEND"] = "sqlite"
+os.environ.setdefault("ESTOQUE_SQLITE", os.path.join(tempfile.mkdtemp(), "teste_baixa.db"))
+
+import pytest
+
+from src.codigos.config_supabase import supabase
+from src.codigos import baixa_atomica
+from src.codigos.baixa_atomica import ConflitoConcorrencia, SaldoInsuficiente, ajustar_saldo
+
+THREADS = 16
+BAIXAS_POR_THREAD = 10
+
+
+@pytest.fixture
+def lote():
+    registro = supabase.table("estoque").insert({
+        "ean": "7891000315507", "validade": "2027-01-01", "quantidade": 100,
+    }).execute().data[0]
+    yield registro
+    supabase.table("estoque").delete().eq("id", registro["id"]).execute()
+
+
+def _saldo(id_estoque):
+    return supabase.table("estoque").select("quantidade").eq("id", id_estoque).execute().data[0]["quantidade"]
+
+
+# ⚛️ N threads baixando o mesmo lote: nenhuma baixa se perde e nada é vendido além do saldo
+def test_baixas_concorrentes_nao_perdem_nem_vendem_alem_do_saldo(lote, monkeypatch):
+    monkeypatch.setattr(baixa_atomica, "MAX_TENTATIVAS", 1000)  # sem desistência por conflito
+    resultados = {"ok": 0, "insuficiente": 0}
+    trava = threading.Lock()
+    largada = threading.Barrier(THREADS)
+
+    def baixar():
+        largada.wait()
+        for _ in range(BAIXAS_POR_THREAD):
+            try:
+                ajustar_saldo(lote["id"], -1, lote["quantidade"], coluna="quantidade")
+                chave = "ok"
+            except SaldoInsuficiente:
+                chave = "insuficiente"
+            with trava:
+                resultados[chave] += 1
+
+    threads = [threading.Thread(target=baixar) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert resultados["ok"] == 100
+    assert resultados["insuficiente"] == THREADS * BAIXAS_POR_THREAD - 100
+    assert _saldo(lote["id"]) == 0
+
+
+def test_baixa_maior_que_o_saldo_e_recusada(lote):
+    with pytest.raises(SaldoInsuficiente) as erro:
+        ajustar_saldo(lote["id"], -101, lote["quantidade"], coluna="quantidade")
+    assert erro.value.disponivel == 100
+    assert _saldo(lote["id"]) == 100
+
+
+# 🔁 Saldo lido desatualizado: o compare-and-set relê e aplica sobre o saldo atual
+def test_saldo_lido_desatualizado_e_relido(lote):
+    supabase.table("estoque").update({"quantidade": 40}).eq("id", lote["id"]).execute()
+    assert ajustar_saldo(lote["id"], -5, lote["quantidade"], coluna="quantidade") == 35
+    assert _saldo(lote["id"]) == 35
+
+
+def test_lote_removido_vira_conflito(lote):
+    supabase.table("estoque").delete().eq("id", lote["id"]).execute()
+    with pytest.raises(ConflitoConcorrencia):
+        ajustar_saldo(lote["id"], -1, 100, coluna="quantidade")